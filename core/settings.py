@@ -31,6 +31,32 @@ WEBXPAY_RETURN_URL = env("WEBXPAY_RETURN_URL")
 WEBXPAY_MERCHANT_ID = env("WEBXPAY_MERCHANT_ID")
 WEBXPAY_SECRET = env("WEBXPAY_SECRET")
 WEBXPAY_PRODUCT_ID = "PRD-0000886"
+# Server-side transaction status API (used by reconciliation), called with the API username/password
+WEBXPAY_STATUS_URL = env("WEBXPAY_STATUS_URL", default="")
+
+
+# "sync" serves payments.views (gunicorn sync workers, core.wsgi); "async" serves payments.async_views
+# for create/callback/contact and should run under an ASGI server (core.asgi)
+PAYMENT_VIEWS_MODE = env('PAYMENT_VIEWS_MODE', default='sync')
+
+
+# Payment gateways (payments.gateway): providers are built once per process and picked per donation,
+# by appeal first, then by currency, else "default"
+PAYMENT_GATEWAYS = {
+    'default': {'BACKEND': 'payments.gateway.WebXPayProvider'},
+}
+PAYMENT_GATEWAY_BY_CURRENCY = {}
+PAYMENT_GATEWAY_BY_APPEAL = {}
+# Pooled keep-alive HTTP session for gateway API calls: (connect, read) timeouts and connections per host
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = env.float('PAYMENT_GATEWAY_CONNECT_TIMEOUT', default=3.05)
+PAYMENT_GATEWAY_READ_TIMEOUT = env.float('PAYMENT_GATEWAY_READ_TIMEOUT', default=10)
+PAYMENT_GATEWAY_POOL_SIZE = env.int('PAYMENT_GATEWAY_POOL_SIZE', default=10)
+
+# Reconciliation of Pending payments whose callback never arrived (`manage.py reconcile_payments`)
+RECONCILE_PENDING_AFTER_MINUTES = env.int('RECONCILE_PENDING_AFTER_MINUTES', default=30)
+RECONCILE_ABANDON_AFTER_HOURS = env.int('RECONCILE_ABANDON_AFTER_HOURS', default=24)
+RECONCILE_BATCH_SIZE = env.int('RECONCILE_BATCH_SIZE', default=200)
+RECONCILE_WORKERS = env.int('RECONCILE_WORKERS', default=8)
 
 
 # Installed apps
@@ -60,8 +86,18 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Read-your-writes for the analytics database router
+    'payments.routers.PrimaryPinningMiddleware',
+    # Opt-in: removes itself at startup unless PROFILING_ENABLED
+    'payments.profiling.ProfilingMiddleware',
 ]
 
+# Under ASGI one sync-only middleware turns the whole chain into a thread hop per request, and
+# WhiteNoise is sync-only: in async mode serve STATIC_ROOT from the reverse proxy / CDN instead.
+# Every other middleware above is sync and async capable.
+if PAYMENT_VIEWS_MODE == 'async':
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 # Allow port 3000 (where your HTML is running)
 CORS_ALLOWED_ORIGINS = [
     "http://47.131.0.234",
@@ -92,8 +128,14 @@ TEMPLATES = [
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         # Use os.path.join to make the path compatible with any OS
         'DIRS': [os.path.join(BASE_DIR, 'static')], 
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compile templates once per worker (payments.apps also pre-renders the email/success chrome)
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -111,6 +153,19 @@ WSGI_APPLICATION = 'core.wsgi.application'
 
 # Database
 
+# Connections persist for DB_CONN_MAX_AGE seconds (health checked before reuse) instead of one per request.
+# DB_POOL switches to Django's psycopg pool instead: it needs `psycopg[binary,pool]` in place of
+# psycopg2-binary, and is the better fit under ASGI, where persistent connections are not reused.
+# Each worker process holds up to DB_POOL_MAX_SIZE connections: keep workers x max size under max_connections.
+DB_POOL = env.bool('DB_POOL', default=False)
+DB_OPTIONS = {}
+if DB_POOL:
+    DB_OPTIONS['pool'] = {
+        'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+        'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+        'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+    }
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -119,9 +174,133 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        # The pool manages connection lifetime itself
+        'CONN_MAX_AGE': 0 if DB_POOL else env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': env.bool('DB_CONN_HEALTH_CHECKS', default=True),
+        'OPTIONS': DB_OPTIONS,
+    }
+}
+
+# Optional read database for the dashboard, exports and admin lists (payments.routers): usually a streaming
+# replica of default. Payment writes, and the reads of the payment flow, always stay on default.
+DB_ANALYTICS_ALIAS = env('DB_ANALYTICS_ALIAS', default='analytics')
+if env('DB_ANALYTICS_HOST', default=''):
+    DATABASES[DB_ANALYTICS_ALIAS] = {
+        **DATABASES['default'],
+        'NAME': env('DB_ANALYTICS_NAME', default=DATABASES['default']['NAME']),
+        'HOST': env('DB_ANALYTICS_HOST'),
+        'PORT': env('DB_ANALYTICS_PORT', default=DATABASES['default']['PORT']),
+        'OPTIONS': {**DB_OPTIONS},
+        # Tests read it through the default test database
+        'TEST': {'MIRROR': 'default'},
     }
+
+# Reads fall back to default while the replica is further behind than this (checked every
+# DB_ANALYTICS_LAG_CHECK_SECONDS per worker), and for this long after a client's own write
+DB_ANALYTICS_MAX_LAG_SECONDS = env.int('DB_ANALYTICS_MAX_LAG_SECONDS', default=10)
+DB_ANALYTICS_LAG_CHECK_SECONDS = env.int('DB_ANALYTICS_LAG_CHECK_SECONDS', default=5)
+
+DATABASE_ROUTERS = ['payments.routers.AnalyticsRouter']
+
+
+# Cache (set CACHE_URL to a shared backend, e.g. redis://, so invalidation reaches every worker)
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
 }
 
+# Seconds the aggregated dashboard_stats payload is served from cache
+DASHBOARD_STATS_CACHE_TTL = env.int('DASHBOARD_STATS_CACHE_TTL', default=30)
+# "payments" scans Payment, "rollup" reads DonationDailyRollup (see `manage.py rebuild_donation_rollup`)
+DASHBOARD_STATS_SOURCE = env('DASHBOARD_STATS_SOURCE', default='payments')
+
+
+# Trend charts (/payments/api/analytics/): buckets ending more than ANALYTICS_SETTLE_HOURS ago are
+# cached without expiry (ANALYTICS_REPLICA_CACHE_TTL seconds when read from a possibly lagging
+# analytics database), later ones for ANALYTICS_OPEN_CACHE_TTL seconds
+ANALYTICS_SETTLE_HOURS = env.int('ANALYTICS_SETTLE_HOURS', default=48)
+ANALYTICS_OPEN_CACHE_TTL = env.int('ANALYTICS_OPEN_CACHE_TTL', default=60)
+ANALYTICS_REPLICA_CACHE_TTL = env.int('ANALYTICS_REPLICA_CACHE_TTL', default=600)
+ANALYTICS_MAX_BUCKETS = env.int('ANALYTICS_MAX_BUCKETS', default=1000)
+
+
+# Dashboard list endpoints (keyset pages; ?stream=1 streams in chunks of DASHBOARD_STREAM_CHUNK_SIZE rows)
+DASHBOARD_PAGE_SIZE = env.int('DASHBOARD_PAGE_SIZE', default=100)
+DASHBOARD_MAX_PAGE_SIZE = env.int('DASHBOARD_MAX_PAGE_SIZE', default=1000)
+DASHBOARD_STREAM_CHUNK_SIZE = env.int('DASHBOARD_STREAM_CHUNK_SIZE', default=2000)
+
+# Admin changelists for payments and messages (payments.changelist): estimated counts for unfiltered tables
+# of ADMIN_ESTIMATED_COUNT_MIN rows or more (PostgreSQL), cached filter choices and keyset paging
+ADMIN_PERFORMANCE_MODE = env.bool('ADMIN_PERFORMANCE_MODE', default=True)
+ADMIN_ESTIMATED_COUNT_MIN = env.int('ADMIN_ESTIMATED_COUNT_MIN', default=100_000)
+ADMIN_FILTER_CHOICES_TTL = env.int('ADMIN_FILTER_CHOICES_TTL', default=3600)
+ADMIN_PAGE_CURSOR_TTL = env.int('ADMIN_PAGE_CURSOR_TTL', default=600)
+
+
+# Donor search: "auto" uses pg_trgm on PostgreSQL and an in-process trigram index elsewhere
+PAYMENT_SEARCH_BACKEND = env('PAYMENT_SEARCH_BACKEND', default='auto')
+# The in-process index (SQLite / development): seconds a worker keeps it, and how often it checks the
+# shared cache for a change published by another worker
+PAYMENT_SEARCH_INDEX_TTL = env.int('PAYMENT_SEARCH_INDEX_TTL', default=300)
+PAYMENT_SEARCH_INDEX_CHECK_SECONDS = env.int('PAYMENT_SEARCH_INDEX_CHECK_SECONDS', default=5)
+
+
+# PDF reports: rows fetched per DB round-trip, and bytes kept in memory before spooling to disk
+REPORT_CHUNK_SIZE = env.int('REPORT_CHUNK_SIZE', default=2000)
+REPORT_SPOOL_MAX_BYTES = env.int('REPORT_SPOOL_MAX_BYTES', default=5 * 1024 * 1024)
+
+# Background report jobs (`manage.py run_report_jobs`): where artefacts are kept and how often progress is saved
+REPORT_ARTEFACT_DIR = env('REPORT_ARTEFACT_DIR', default=os.path.join(BASE_DIR, 'media', 'reports'))
+REPORT_PROGRESS_EVERY = env.int('REPORT_PROGRESS_EVERY', default=1000)
+# Seconds a job may stay Running before another worker re-queues it: longer than the slowest export
+REPORT_JOB_STALE_SECONDS = env.int('REPORT_JOB_STALE_SECONDS', default=3600)
+
+
+# Offline donation imports (payments.imports, `manage.py import_donations`): rows per bulk_create and
+# transaction, bad rows kept on an ImportJob, the status of rows without one, and where uploads wait
+IMPORT_BATCH_SIZE = env.int('IMPORT_BATCH_SIZE', default=2000)
+IMPORT_MAX_REPORTED_ERRORS = env.int('IMPORT_MAX_REPORTED_ERRORS', default=1000)
+IMPORT_DEFAULT_STATUS = env('IMPORT_DEFAULT_STATUS', default='Success')
+IMPORT_UPLOAD_DIR = env('IMPORT_UPLOAD_DIR', default=os.path.join(BASE_DIR, 'media', 'imports'))
+
+
+# Request profiling (payments.profiling): per-view timings and query counts at /payments/api/profiling/.
+# A PROFILING_CPROFILE_SAMPLE_RATE fraction of requests runs under cProfile; the slowest are kept.
+PROFILING_ENABLED = env.bool('PROFILING_ENABLED', default=False)
+PROFILING_CPROFILE_SAMPLE_RATE = env.float('PROFILING_CPROFILE_SAMPLE_RATE', default=0.0)
+PROFILING_KEEP_SLOWEST = env.int('PROFILING_KEEP_SLOWEST', default=10)
+
+
+# Settled payments older than this many months (current month included) are moved to PaymentArchive
+# by `manage.py archive_payments`; dashboards then only scan the recent rows
+PAYMENT_ARCHIVE_AFTER_MONTHS = env.int('PAYMENT_ARCHIVE_AFTER_MONTHS', default=12)
+
+
+# Exchange rates (payments.fx): seconds a worker keeps its in-memory rate table, and how often it
+# checks the shared cache for a newer version published by another worker
+FX_RATE_CACHE_TTL = env.int('FX_RATE_CACHE_TTL', default=300)
+FX_RATE_VERSION_CHECK_SECONDS = env.int('FX_RATE_VERSION_CHECK_SECONDS', default=5)
+
+
+# Throttling of the public create/ and contact/ POSTs (payments.throttle): token buckets in the cache,
+# one per client IP and one per submitted email, holding CAPACITY requests and refilling PER_MINUTE.
+# Set THROTTLE_TRUST_X_FORWARDED_FOR only behind a proxy that overwrites the header.
+THROTTLE_ENABLED = env.bool('THROTTLE_ENABLED', default=True)
+THROTTLE_TRUST_X_FORWARDED_FOR = env.bool('THROTTLE_TRUST_X_FORWARDED_FOR', default=False)
+THROTTLE_RATES = {
+    "create_payment": {
+        "CAPACITY": env.int('THROTTLE_PAYMENT_CAPACITY', default=10),
+        "PER_MINUTE": env.int('THROTTLE_PAYMENT_PER_MINUTE', default=5),
+    },
+    "contact": {
+        "CAPACITY": env.int('THROTTLE_CONTACT_CAPACITY', default=5),
+        "PER_MINUTE": env.int('THROTTLE_CONTACT_PER_MINUTE', default=2),
+    },
+}
+# A checkout repeated within this many seconds (same email, amount, currency, appeal) while the first
+# is still Pending gets the first one's gateway params instead of a new Payment; 0 disables
+PAYMENT_COALESCE_SECONDS = env.int('PAYMENT_COALESCE_SECONDS', default=120)
+
 
 # Language & timezone
 
@@ -158,4 +337,12 @@ EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
-AUTH_USER_MODEL = 'users.CustomUser'
\ No newline at end of file
+AUTH_USER_MODEL = 'users.CustomUser'
+
+# Email outbox (thank-you emails are queued and sent by `manage.py dispatch_emails`)
+EMAIL_OUTBOX_BATCH_SIZE = env.int('EMAIL_OUTBOX_BATCH_SIZE', default=50)
+EMAIL_OUTBOX_MAX_ATTEMPTS = env.int('EMAIL_OUTBOX_MAX_ATTEMPTS', default=5)
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = env.int('EMAIL_OUTBOX_RETRY_BASE_SECONDS', default=60)
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = env.int('EMAIL_OUTBOX_RETRY_MAX_SECONDS', default=3600)
+# Seconds a dispatcher may hold emails it claimed before another one sends them
+EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS = env.int('EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS', default=600)
@@ -1,28 +1,119 @@
+from django.conf import settings
 from django.contrib import admin
-from .models import Payment, FailedPayment, ContactMessage
+from .changelist import CachedValuesFieldListFilter, ColumnsChangeList, KeysetPaginator
+from .models import Payment, PaymentArchive, FailedPayment, ContactMessage, EmailOutbox, ReportJob, ImportJob, ExchangeRate
+from .routers import analytics_reads
+from .search import filter_search
+
+
+class AnalyticsReadsAdmin(admin.ModelAdmin):
+    """Changelist pages read from the analytics database (see payments.routers); actions (POST) stay on default."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "GET":
+            return super().changelist_view(request, extra_context)
+        with analytics_reads():
+            response = super().changelist_view(request, extra_context)
+            # The result page is only fetched while the template renders
+            if hasattr(response, "render"):
+                response.render()
+        return response
+
+
+class PerformanceAdmin(AnalyticsReadsAdmin):
+    """
+    ADMIN_PERFORMANCE_MODE (see payments.changelist): no unfiltered COUNT(*) next to the result count,
+    estimated counts and keyset pages, and only the displayed columns are loaded.
+    """
+    # No related column is displayed: never join
+    list_select_related = ()
+
+    @property
+    def show_full_result_count(self):
+        return not settings.ADMIN_PERFORMANCE_MODE
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if settings.ADMIN_PERFORMANCE_MODE:
+            return KeysetPaginator(queryset, per_page, orphans, allow_empty_first_page)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_changelist(self, request, **kwargs):
+        return ColumnsChangeList if settings.ADMIN_PERFORMANCE_MODE else super().get_changelist(request, **kwargs)
+
 
 @admin.register(Payment)
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(PerformanceAdmin):
     # Fields to show in the list
     list_display = ('transaction_id', 'first_name', 'amount', 'donate_to', 'status', 'created_at')
     
-    # Filters on the right sidebar
-    list_filter = ('status', 'donate_to', 'country', 'created_at')
+    # Filters on the right sidebar (distinct values cached, see payments.changelist)
+    list_filter = (
+        ('status', CachedValuesFieldListFilter),
+        ('donate_to', CachedValuesFieldListFilter),
+        ('country', CachedValuesFieldListFilter),
+        'created_at',
+    )
     
-    # Search box functionality
+    # Search box functionality (served by payments.search instead of per-column LIKE)
     search_fields = ('transaction_id', 'first_name', 'last_name', 'email')
     
     # Make the list ordered by newest first
     ordering = ('-created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        return filter_search(queryset, search_term), False
+
+@admin.register(PaymentArchive)
+class PaymentArchiveAdmin(PaymentAdmin):
+    """Settled payments moved out of Payment by `manage.py archive_payments`: listed and searched like them, never edited."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(FailedPayment)
-class FailedPaymentAdmin(admin.ModelAdmin):
+class FailedPaymentAdmin(PerformanceAdmin):
     list_display = ('transaction_id', 'first_name', 'email', 'amount', 'created_at')
+    ordering = ('-created_at',)
     search_fields = ('transaction_id', 'email')
     readonly_fields = ('created_at',)
 
 @admin.register(ContactMessage)
-class ContactMessageAdmin(admin.ModelAdmin):
+class ContactMessageAdmin(PerformanceAdmin):
     list_display = ('name', 'email', 'phone', 'created_at')
+    ordering = ('-created_at',)
     search_fields = ('name', 'email')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    readonly_fields = ('created_at',)
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'format', 'status', 'progress', 'total_rows', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'format')
+    readonly_fields = ('cache_key', 'fingerprint', 'file_path', 'error', 'created_at', 'started_at', 'finished_at')
+
+
+@admin.register(ImportJob)
+class ImportJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'original_name', 'status', 'rows', 'imported', 'rejected', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'format')
+    readonly_fields = ('file_path', 'errors', 'error', 'created_at', 'started_at', 'finished_at')
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ('currency', 'rate', 'effective_from', 'created_at')
+    list_filter = ('currency',)
+    ordering = ('currency', '-effective_from')
@@ -0,0 +1,153 @@
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .archive import add_months, history
+from .routers import read_alias
+from .stats import day_start
+
+ANALYTICS_CACHE_PREFIX = "payments:analytics"
+ANALYTICS_VERSION_CACHE_KEY = "payments:analytics_version"
+
+BUCKETS = {"day": TruncDay, "week": TruncWeek, "month": TruncMonth}
+GROUPS = ("donate_to", "country", "donation_option")
+# Dates a series may cover: a month of days is cached as one chunk, and day_start() converts to UTC,
+# so a month either side of the range must still be a valid date
+FIRST_DATE = date.min + timedelta(days=62)
+LAST_DATE = date.max - timedelta(days=62)
+
+
+def bucket_start(value, bucket):
+    """The first date of the bucket holding `value` (weeks start on Monday, like TruncWeek)."""
+    if bucket == "week":
+        return value - timedelta(days=value.weekday())
+    if bucket == "month":
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value, bucket):
+    if bucket == "week":
+        return value + timedelta(days=7)
+    if bucket == "month":
+        return add_months(value, 1)
+    return value + timedelta(days=1)
+
+
+def bucket_count(start, end, bucket):
+    """len(bucket_dates(start, end, bucket)), without building the list."""
+    if bucket == "week":
+        return (bucket_start(end, bucket) - bucket_start(start, bucket)).days // 7 + 1
+    if bucket == "month":
+        return (end.year - start.year) * 12 + end.month - start.month + 1
+    return (end - start).days + 1
+
+
+def bucket_dates(start, end, bucket):
+    """Start dates of every bucket touching [start, end]: the range is widened to whole buckets."""
+    dates = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        dates.append(current)
+        current = next_bucket(current, bucket)
+    return dates
+
+
+def is_closed(end, now=None):
+    """
+    A period ending before now - ANALYTICS_SETTLE_HOURS only changes through a very late success,
+    which bumps the version (see invalidate_analytics), so it is cached without expiry.
+    """
+    return end <= (now or timezone.now()) - timedelta(hours=settings.ANALYTICS_SETTLE_HOURS)
+
+
+def _version():
+    version = cache.get(ANALYTICS_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(ANALYTICS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(ANALYTICS_VERSION_CACHE_KEY)
+    return version
+
+
+def invalidate_analytics():
+    """Drops every cached bucket (by moving to a new version); called when a closed period changes."""
+    cache.set(ANALYTICS_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def query_buckets(start, end, bucket, group_by=None):
+    """
+    Successful donations created in [start, end) (dates) as {bucket date: {group: [count, total]}},
+    bucketed by the database over a plain created_at range on the hot table and the archive.
+    """
+    fields = ["period"] + ([group_by] if group_by else [])
+    results = {}
+    for queryset in history(status="Success", created_at__gte=day_start(start), created_at__lt=day_start(end)):
+        rows = queryset.annotate(period=BUCKETS[bucket]("created_at")).values(*fields).annotate(
+            count=Count("id"), total=Sum("amount"),
+        ).order_by()
+        for row in rows:
+            period = timezone.localtime(row["period"]).date()
+            group = results.setdefault(period, {}).setdefault(row.get(group_by, ""), [0, Decimal("0")])
+            group[0] += row["count"]
+            group[1] += row["total"] or 0
+    return results
+
+
+def chunk_start(value, bucket):
+    """Buckets are cached in chunks: a calendar month of days, or each week / month on its own."""
+    return value.replace(day=1) if bucket == "day" else value
+
+
+def chunk_buckets(chunk, bucket):
+    """Start dates of the buckets cached under `chunk`."""
+    if bucket != "day":
+        return [chunk]
+    return [chunk + timedelta(days=i) for i in range((add_months(chunk, 1) - chunk).days)]
+
+
+def bucket_series(start, end, bucket="day", group_by=None, now=None):
+    """
+    Count and LKR total of successful donations per bucket from `start` to `end` (dates, inclusive),
+    optionally split by one of GROUPS. Buckets are cached a chunk at a time: chunks whose last bucket
+    is closed without expiry (or ANALYTICS_REPLICA_CACHE_TTL when read from the analytics database),
+    the others for ANALYTICS_OPEN_CACHE_TTL seconds. Only the span of uncached chunks is queried.
+    """
+    dates = bucket_dates(start, end, bucket)
+    prefix = f"{ANALYTICS_CACHE_PREFIX}:{_version()}:{bucket}:{group_by or '-'}"
+    chunks = {chunk: chunk_buckets(chunk, bucket) for chunk in sorted({chunk_start(date, bucket) for date in dates})}
+    keys = {chunk: f"{prefix}:{chunk.isoformat()}" for chunk in chunks}
+    cached = cache.get_many(keys.values())
+
+    missing = [chunk for chunk in chunks if keys[chunk] not in cached]
+    if missing:
+        queried = query_buckets(chunks[missing[0]][0], next_bucket(chunks[missing[-1]][-1], bucket), bucket, group_by)
+        closed, open_ = {}, {}
+        for chunk in missing:
+            value = {date: sorted(queried.get(date, {}).items()) for date in chunks[chunk]}
+            cached[keys[chunk]] = value
+            target = closed if is_closed(day_start(next_bucket(chunks[chunk][-1], bucket)), now) else open_
+            target[keys[chunk]] = value
+        # A replica may not have the late success that invalidated these yet: let them expire
+        cache.set_many(closed, None if read_alias() is None else settings.ANALYTICS_REPLICA_CACHE_TTL)
+        cache.set_many(open_, settings.ANALYTICS_OPEN_CACHE_TTL)
+
+    series = []
+    for date in dates:
+        groups = cached[keys[chunk_start(date, bucket)]][date]
+        point = {
+            "period": date.isoformat(),
+            "count": sum(count for _, (count, _) in groups),
+            "total": float(sum((total for _, (_, total) in groups), Decimal("0"))),
+        }
+        if group_by:
+            point["groups"] = [
+                {group_by: group, "count": count, "total": float(total)} for group, (count, total) in groups
+            ]
+        series.append(point)
+    return series
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'payments'
+
+    def ready(self):
+        # Compile the email / success page templates once at worker startup
+        from payments.rendering import warm_render_cache
+        warm_render_cache()
+        # Payment gateway providers are singletons, built here rather than per request
+        from payments.gateway import get_gateways
+        get_gateways()
+        # Connects the signal receivers that keep the in-process search index, rate table, admin filter choices
+        # and report artefacts current
+        import payments.search  # noqa: F401
+        import payments.fx  # noqa: F401
+        import payments.changelist  # noqa: F401
+        import payments.report_jobs  # noqa: F401
@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Payment, PaymentArchive, CallbackEvent, EmailOutbox
+from .stats import month_start, invalidate_dashboard_stats
+
+ARCHIVE_TOTALS_CACHE_KEY = "payments:archive_totals"
+# Pending payments stay hot so late callbacks and reconciliation can still settle them
+SETTLED_STATUSES = ("Success", "Failed")
+
+
+# Unified reads over the hot table and the archive
+
+def history(**lookups):
+    """(hot, archived) querysets with the same filters."""
+    return Payment.objects.filter(**lookups), PaymentArchive.objects.filter(**lookups)
+
+
+def history_values(*fields, order_by=None, **lookups):
+    """values_list(*fields) over both tables as one UNION ALL query, optionally ordered by one of `fields`."""
+    hot, archived = history(**lookups)
+    combined = hot.values_list(*fields).order_by().union(archived.values_list(*fields).order_by(), all=True)
+    return combined.order_by(order_by) if order_by else combined
+
+
+def history_count(**lookups):
+    return sum(queryset.count() for queryset in history(**lookups))
+
+
+def history_summary(**lookups):
+    """(count, amount total, highest id) over both tables."""
+    count, total, last = 0, 0, 0
+    for queryset in history(**lookups):
+        summary = queryset.aggregate(n=Count("id"), total=Sum("amount"), last=Max("id"))
+        count += summary["n"]
+        total += summary["total"] or 0
+        last = max(last, summary["last"] or 0)
+    return count, total, last
+
+
+def archived_totals():
+    """
+    Per (status, donate_to, currency) count, LKR value and original-currency value of the archive.
+    Archived months never change, so this is cached until the next archive run: it is always read from
+    default, as a lagging analytics database could still miss the run that invalidated it.
+    """
+    totals = cache.get(ARCHIVE_TOTALS_CACHE_KEY)
+    if totals is None:
+        totals = list(
+            PaymentArchive.objects.using("default").values("status", "donate_to", "currency").annotate(
+                count=Count("id"), value=Sum("amount"), original=Sum(Coalesce("original_amount", "amount")),
+            ).order_by()
+        )
+        cache.set(ARCHIVE_TOTALS_CACHE_KEY, totals, None)
+    return totals
+
+
+def invalidate_archived_totals():
+    cache.delete(ARCHIVE_TOTALS_CACHE_KEY)
+
+
+# Moving closed-out months
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return value.replace(year=value.year + month // 12, month=month % 12 + 1)
+
+
+def archive_horizon(months=None, now=None):
+    """Start of the oldest month kept hot: everything before it is a closed-out period."""
+    months = max(1, months or settings.PAYMENT_ARCHIVE_AFTER_MONTHS)
+    return add_months(month_start(now), -months)
+
+
+def move_period(start, end):
+    """
+    Moves settled payments created in [start, end) into PaymentArchive with one INSERT ... SELECT
+    and one DELETE in a single transaction (a single DELETE ... RETURNING statement on PostgreSQL).
+    Returns the number of rows moved.
+    """
+    columns = ", ".join(connection.ops.quote_name(f.column) for f in PaymentArchive._meta.concrete_fields)
+    hot = connection.ops.quote_name(Payment._meta.db_table)
+    cold = connection.ops.quote_name(PaymentArchive._meta.db_table)
+    where = "created_at >= %s AND created_at < %s AND status IN (%s, %s)"
+    params = [
+        connection.ops.adapt_datetimefield_value(start),
+        connection.ops.adapt_datetimefield_value(end),
+        *SETTLED_STATUSES,
+    ]
+    moving = {"payment__created_at__gte": start, "payment__created_at__lt": end, "payment__status__in": SETTLED_STATUSES}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Rows pointing at the moved payments: idempotency records go, sent emails keep their content
+        CallbackEvent.objects.filter(**moving).delete()
+        EmailOutbox.objects.filter(**moving).update(payment=None)
+        if connection.vendor == "postgresql":
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {hot} WHERE {where} RETURNING {columns}) "
+                f"INSERT INTO {cold} ({columns}) SELECT {columns} FROM moved",
+                params,
+            )
+            return cursor.rowcount
+        cursor.execute(f"INSERT INTO {cold} ({columns}) SELECT {columns} FROM {hot} WHERE {where}", params)
+        moved = cursor.rowcount
+        cursor.execute(f"DELETE FROM {hot} WHERE {where}", params)
+        return moved
+
+
+def archive_closed_periods(months=None, now=None):
+    """
+    Moves every closed-out month (older than PAYMENT_ARCHIVE_AFTER_MONTHS) to the archive,
+    one transaction per month, oldest first. Returns [(month start, rows moved)].
+    """
+    horizon = archive_horizon(months, now)
+    oldest = (
+        Payment.objects.filter(status__in=SETTLED_STATUSES, created_at__lt=horizon)
+        .order_by("created_at").values_list("created_at", flat=True).first()
+    )
+    moved = []
+    if oldest is None:
+        return moved
+    period = month_start(oldest)
+    while period < horizon:
+        end = add_months(period, 1)
+        moved.append((period, move_period(period, end)))
+        period = end
+
+    invalidate_archived_totals()
+    invalidate_dashboard_stats()
+    # The in-process search index still lists the moved rows
+    from .search import reset_ngram_index
+    reset_ngram_index()
+    from .report_jobs import invalidate_report_artefacts
+    invalidate_report_artefacts()
+    # Both admin changelists list different statuses, appeals and countries now
+    from .changelist import invalidate_filter_choices
+    invalidate_filter_choices()
+    return moved
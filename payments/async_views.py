@@ -0,0 +1,78 @@
+"""
+Async variants of the public payment views, served when PAYMENT_VIEWS_MODE = "async" and the
+site runs under ASGI (core.asgi). Same requests and responses as payments.views; the ORM calls
+are async, and the blocking parts (RSA encryption, callback transactions) run in worker threads.
+"""
+import logging
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .callbacks import aapply_callback
+from .gateway import select_gateway
+from .models import Payment, ContactMessage
+from .throttle import throttle, coalesce_key, coalesced_params, remember_params
+from .views import _payment_fields, _callback_params, _callback_response, _contact_fields
+from . import fx
+
+logger = logging.getLogger(__name__)
+
+
+@csrf_exempt
+@throttle("create_payment")
+async def create_payment(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    try:
+        # Rates come from the in-memory table; only a reload touches the DB (in a thread)
+        await fx.arefresh()
+        fields = _payment_fields(request.POST, refresh=False)
+
+        key = coalesce_key(fields)
+        payment_data = await sync_to_async(coalesced_params)(key, fields)
+        if payment_data is not None:
+            return JsonResponse(payment_data)
+
+        payment = await Payment.objects.acreate(**fields)
+
+        gateway = select_gateway(currency=payment.currency, appeal=payment.donate_to)
+        formatted_lkr = f"{payment.amount:.2f}"
+        # RSA encryption is CPU bound: keep it off the event loop
+        payment_data = await sync_to_async(gateway.get_payment_params, thread_sensitive=False)(payment, formatted_lkr)
+        await sync_to_async(remember_params, thread_sensitive=False)(key, payment, payment_data, fields)
+
+        return JsonResponse(payment_data)
+
+    except Exception as e:
+        logger.exception("Create payment error")
+        return JsonResponse({"error": str(e)}, status=500)
+
+
+@csrf_exempt
+async def payment_callback(request):
+    transaction_id, status_code = _callback_params(request)
+
+    try:
+        payment = await Payment.by_transaction_id(transaction_id).aget()
+        await aapply_callback(payment, status_code)
+        return _callback_response(payment, status_code)
+
+    except Payment.DoesNotExist:
+        return HttpResponse("Transaction not found.", status=404)
+    except Exception as e:
+        logger.error(f"Callback error: {e}")
+        return HttpResponse("A system error occurred.", status=500)
+
+
+@csrf_exempt
+@throttle("contact")
+async def contact_us_view(request):
+    if request.method == "POST":
+        try:
+            await ContactMessage.objects.acreate(**_contact_fields(request.POST))
+            return JsonResponse({"status": "success"})
+        except Exception as e:
+            return JsonResponse({"status": "error", "message": str(e)}, status=500)
+    return JsonResponse({"status": "error", "message": "Method not allowed"}, status=405)
@@ -0,0 +1,107 @@
+import functools
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .analytics import is_closed, invalidate_analytics
+from .changelist import refresh_filter_choices
+from .models import Payment, CallbackEvent
+from .outbox import send_thank_you_email
+from .rollup import add_to_rollup
+from .stats import invalidate_dashboard_stats
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_STATUS_CODE = "00"
+
+# Statuses a payment may leave for each target status. A late success after a failed
+# notification is still honoured; nothing ever leaves Success.
+ALLOWED_TRANSITIONS = {
+    "Success": ("Pending", "Failed"),
+    "Failed": ("Pending",),
+}
+
+
+def transition(payment, new_status):
+    """
+    Single conditional UPDATE ... WHERE status IN (...) touching only the status column.
+    Returns True when this call changed the row, so callers run side effects exactly once.
+    """
+    changed = Payment.objects.filter(pk=payment.pk, status__in=ALLOWED_TRANSITIONS[new_status]).update(status=new_status)
+    if changed:
+        payment.status = new_status
+        # update() skips the post_save receiver that keeps the admin status filter current
+        transaction.on_commit(functools.partial(refresh_filter_choices, payment))
+    return bool(changed)
+
+
+def on_payment_success(payment):
+    """Side effects of the first Success transition. Runs inside the transition's transaction."""
+    # The outbox row commits together with the status change; a rendering error must not undo the payment
+    try:
+        with transaction.atomic():
+            send_thank_you_email(payment, payment.amount)
+    except Exception as e:
+        logger.error(f"Email failure: {e}")
+    # The rollup can be rebuilt, so a failure here is logged rather than failing the callback
+    try:
+        with transaction.atomic():
+            add_to_rollup(payment)
+    except Exception as e:
+        logger.error(f"Rollup update failed for {payment.transaction_id} (run rebuild_donation_rollup): {e}")
+    transaction.on_commit(invalidate_dashboard_stats)
+    # A very late success changes a period the analytics API caches without expiry
+    if is_closed(payment.created_at):
+        transaction.on_commit(invalidate_analytics)
+
+
+def record_callback(payment, status_code):
+    """Returns (event, first_delivery) for the idempotency record of this callback."""
+    key = f"{payment.transaction_id}:{status_code or ''}"
+    event, created = CallbackEvent.objects.get_or_create(
+        idempotency_key=key, defaults={"payment": payment, "status_code": status_code or ""}
+    )
+    if not created:
+        CallbackEvent.objects.filter(pk=event.pk).update(deliveries=F("deliveries") + 1)
+    return event, created
+
+
+def apply_callback(payment, status_code):
+    """
+    Applies a WebXPay callback idempotently. Returns True if this delivery changed the payment;
+    duplicates return False and trigger no side effects.
+    """
+    new_status = "Success" if status_code == SUCCESS_STATUS_CODE else "Failed"
+    with transaction.atomic():
+        event, first_delivery = record_callback(payment, status_code)
+        changed = transition(payment, new_status)
+        if changed:
+            CallbackEvent.objects.filter(pk=event.pk).update(applied=True)
+            if new_status == "Success":
+                on_payment_success(payment)
+    if not changed:
+        logger.info(f"Duplicate callback for {payment.transaction_id} ({status_code}), payment is {payment.status}")
+    return changed
+
+
+async def aapply_callback(payment, status_code):
+    """
+    apply_callback for async views. A delivery that cannot change the payment (the common duplicate
+    of browser return + server notification) is recorded with the async ORM alone; a real
+    transition needs a transaction, so it runs apply_callback in a thread.
+    """
+    new_status = "Success" if status_code == SUCCESS_STATUS_CODE else "Failed"
+    if payment.status in ALLOWED_TRANSITIONS[new_status]:
+        return await sync_to_async(apply_callback)(payment, status_code)
+
+    key = f"{payment.transaction_id}:{status_code or ''}"
+    if not await CallbackEvent.objects.filter(idempotency_key=key).aupdate(deliveries=F("deliveries") + 1):
+        try:
+            await CallbackEvent.objects.acreate(idempotency_key=key, payment=payment, status_code=status_code or "")
+        except IntegrityError:
+            # A concurrent delivery created it first
+            await CallbackEvent.objects.filter(idempotency_key=key).aupdate(deliveries=F("deliveries") + 1)
+    logger.info(f"Duplicate callback for {payment.transaction_id} ({status_code}), payment is {payment.status}")
+    return False
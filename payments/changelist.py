@@ -0,0 +1,139 @@
+"""
+ADMIN_PERFORMANCE_MODE pieces for the payment and message changelists (see payments.admin.PerformanceAdmin):
+an estimated row count, cached filter choices, keyset paging and a column-limited queryset.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.admin import AllValuesFieldListFilter
+from django.contrib.admin.views.main import ChangeList
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.functional import cached_property
+
+from .models import FailedPayment, Payment, PaymentArchive
+
+CHOICES_CACHE_PREFIX = "payments:admin_choices"
+CURSOR_CACHE_PREFIX = "payments:admin_cursor"
+
+# Payment / PaymentArchive columns whose filter choices are cached (CachedValuesFieldListFilter)
+CACHED_CHOICE_FIELDS = ("status", "donate_to", "country")
+# Orderings the keyset pages can follow (the changelist adds the pk tiebreaker)
+KEYSET_ORDERINGS = (("-created_at", "-pk"), ("-created_at", "-id"))
+
+
+def estimated_count(queryset):
+    """
+    pg_class.reltuples (as of the last ANALYZE) for an unfiltered queryset on PostgreSQL, when it is
+    at least ADMIN_ESTIMATED_COUNT_MIN; None when an exact COUNT(*) is needed.
+    """
+    conn = connections[queryset.db]
+    if conn.vendor != "postgresql" or queryset.query.where:
+        return None
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+    # -1 until the table has been analysed
+    if row is None or row[0] < settings.ADMIN_ESTIMATED_COUNT_MIN:
+        return None
+    return row[0]
+
+
+class KeysetPaginator(Paginator):
+    """
+    Changelist paginator. Newest-first pages start from the (created_at, id) of the previous page's last row,
+    remembered for ADMIN_PAGE_CURSOR_TTL seconds, so paging through a large table is a range scan per page;
+    only a page jumped to directly (or another sort order) is read with OFFSET.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        return super().count if estimate is None else estimate
+
+    @cached_property
+    def _keyset(self):
+        # The changelist can repeat the default ordering field
+        return tuple(dict.fromkeys(self.object_list.query.order_by)) in KEYSET_ORDERINGS
+
+    def _cursor_key(self, number):
+        query = hashlib.sha256(f"{self.object_list.db}|{self.object_list.query}|{self.per_page}".encode()).hexdigest()
+        return f"{CURSOR_CACHE_PREFIX}:{query}:{number}"
+
+    def page(self, number):
+        number = self.validate_number(number)
+        cursor = cache.get(self._cursor_key(number)) if self._keyset and number > 1 else None
+        if cursor:
+            created_at, pk = cursor
+            rows = self.object_list.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk))
+            rows = rows[:self.per_page]
+        else:
+            bottom = (number - 1) * self.per_page
+            rows = self.object_list[bottom:bottom + self.per_page]
+
+        # Evaluated here (the queryset keeps its results) to remember where the next page starts
+        if self._keyset and len(rows) == self.per_page:
+            last = rows[len(rows) - 1]
+            cache.set(self._cursor_key(number + 1), (last.created_at, last.pk), settings.ADMIN_PAGE_CURSOR_TTL)
+        return self._get_page(rows, number, self)
+
+
+def _choices_key(model, field_name):
+    return f"{CHOICES_CACHE_PREFIX}:{model._meta.label_lower}:{field_name}"
+
+
+def invalidate_filter_choices():
+    """Drops the cached choices; called after writes that skip save() (bulk imports, archiving)."""
+    cache.delete_many([_choices_key(model, name) for model in (Payment, PaymentArchive) for name in CACHED_CHOICE_FIELDS])
+
+
+class CachedValuesFieldListFilter(AllValuesFieldListFilter):
+    """
+    AllValuesFieldListFilter whose distinct values are cached for ADMIN_FILTER_CHOICES_TTL seconds instead of
+    a SELECT DISTINCT per changelist load. A saved payment with a new value drops its field's entry.
+    """
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        super().__init__(field, request, params, model, model_admin, field_path)
+        if settings.ADMIN_PERFORMANCE_MODE and field_path in CACHED_CHOICE_FIELDS:
+            key = _choices_key(model, field_path)
+            choices = cache.get(key)
+            if choices is None:
+                choices = list(self.lookup_choices)
+                cache.set(key, choices, settings.ADMIN_FILTER_CHOICES_TTL)
+            self.lookup_choices = choices
+
+
+def refresh_filter_choices(*payments):
+    """
+    Drops the cached choices of each field where one of `payments` has a value not listed yet. Called on
+    save and, on commit, by the writers that skip save() (callbacks.transition, reconcile.apply_batch).
+    """
+    keys = {_choices_key(Payment, name): name for name in CACHED_CHOICE_FIELDS}
+    stale = [
+        key for key, choices in cache.get_many(keys).items()
+        if any(getattr(payment, keys[key]) not in choices for payment in payments)
+    ]
+    if stale:
+        cache.delete_many(stale)
+
+
+@receiver(post_save, sender=Payment, dispatch_uid="payments_admin_choices_save")
+@receiver(post_save, sender=FailedPayment, dispatch_uid="payments_admin_choices_save_failed")
+def _refresh_filter_choices(sender, instance, **kwargs):
+    refresh_filter_choices(instance)
+
+
+class ColumnsChangeList(ChangeList):
+    """Loads only the columns the changelist displays (plus the pk and ordering fields)."""
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        fields = {f.name for f in self.model._meta.concrete_fields}
+        displayed = [name for name in self.list_display if name in fields]
+        ordering = [name.lstrip("-") for name in queryset.query.order_by if name.lstrip("-") in fields]
+        return queryset.only(*displayed, *ordering)
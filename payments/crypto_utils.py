@@ -1,6 +1,8 @@
 import os
+import time
 import base64
 import logging
+import threading
 from Crypto.PublicKey import RSA
 from Crypto.Cipher import PKCS1_v1_5
 from django.conf import settings
@@ -8,6 +10,85 @@ from django.conf import settings
 # Initialize logger to catch errors in gunicorn_error.log
 logger = logging.getLogger(__name__)
 
+DEFAULT_KEY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crypto", "public_key.pem")
+
+# Parsed key + cipher, shared by every request handled in this worker process.
+# Keyed on (path, mtime) so a rotated key file is picked up without a restart. The entry is an
+# immutable (path, mtime, cipher) tuple replaced as a whole, so a reader that checks one reference
+# uses the cipher that belongs to it, even while another thread swaps in a rotated key.
+_cipher_lock = threading.Lock()
+_cipher_entry = None
+
+# Timing counters (per worker) exposed through get_crypto_stats()
+_stats_lock = threading.Lock()
+_stats = {"key_loads": 0, "key_load_seconds": 0.0, "encrypts": 0, "encrypt_seconds": 0.0}
+
+
+def get_key_file():
+    """Path of the WebXPay public key, overridable with WEBXPAY_PUBLIC_KEY_FILE."""
+    return getattr(settings, "WEBXPAY_PUBLIC_KEY_FILE", None) or DEFAULT_KEY_FILE
+
+
+def _record(counter, seconds):
+    with _stats_lock:
+        _stats[counter + "s"] += 1
+        _stats[counter + "_seconds"] += seconds
+
+
+def get_cipher():
+    """
+    Returns the PKCS#1 v1.5 cipher for the WebXPay public key.
+    The PEM file is parsed once per worker and only re-read when its mtime changes.
+    """
+    key_file = get_key_file()
+    try:
+        mtime = os.stat(key_file).st_mtime_ns
+    except FileNotFoundError:
+        logger.error(f"Encryption Error: Public key not found at {key_file}")
+        raise FileNotFoundError(f"Public key not found at {key_file}")
+
+    global _cipher_entry
+    entry = _cipher_entry
+    if entry is not None and entry[:2] == (key_file, mtime):
+        return entry[2]
+
+    with _cipher_lock:
+        # Another thread may have loaded it while we waited for the lock
+        entry = _cipher_entry
+        if entry is not None and entry[:2] == (key_file, mtime):
+            return entry[2]
+
+        started = time.perf_counter()
+        with open(key_file, "rb") as f:
+            public_key = RSA.import_key(f.read())
+        cipher = PKCS1_v1_5.new(public_key)
+        _record("key_load", time.perf_counter() - started)
+
+        if entry is not None:
+            logger.info(f"WebXPay public key reloaded from {key_file}")
+        _cipher_entry = (key_file, mtime, cipher)
+        return cipher
+
+
+def clear_key_cache():
+    """Drops the cached key so the next call re-reads the PEM file."""
+    global _cipher_entry
+    with _cipher_lock:
+        _cipher_entry = None
+
+
+def get_crypto_stats():
+    """Snapshot of the key load / encrypt counters for this worker."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_crypto_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0 if name in ("key_loads", "encrypts") else 0.0
+
+
 def encrypt_payment(transaction_id: str, amount: str):
     """
     Encrypts the transaction ID and amount using RSA PKCS#1 v1.5.
@@ -18,26 +99,18 @@ def encrypt_payment(transaction_id: str, amount: str):
         # WebXPay typically expects the format: transaction_id|amount
         plaintext = f"{transaction_id}|{amount}"
 
-        # 2. Locate the public key file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        key_file = os.path.join(current_dir, "crypto", "public_key.pem")
-
-        if not os.path.exists(key_file):
-            logger.error(f"Encryption Error: Public key not found at {key_file}")
-            raise FileNotFoundError(f"Public key not found at {key_file}")
-
-        # 3. Import the RSA Key
-        with open(key_file, "rb") as f:
-            public_key = RSA.import_key(f.read())
+        # 2. Get the cached cipher (parses the public key only on first use / rotation)
+        cipher = get_cipher()
 
-        # 4. Perform RSA Encryption
-        cipher = PKCS1_v1_5.new(public_key)
+        # 3. Perform RSA Encryption
+        started = time.perf_counter()
         encrypted_bytes = cipher.encrypt(plaintext.encode("utf-8"))
-        
-        # 5. Convert to Base64 string
+        _record("encrypt", time.perf_counter() - started)
+
+        # 4. Convert to Base64 string
         encrypted_b64 = base64.b64encode(encrypted_bytes).decode("ascii")
 
-        # 6. CRITICAL: Return the value to views.py
+        # 5. CRITICAL: Return the value to views.py
         return encrypted_b64
 
     except Exception as e:
@@ -1,64 +1,45 @@
-import io
-from django.db.models import Sum, Count, Q
+import os
+import tempfile
+from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
-from django.http import JsonResponse, FileResponse
+from django.utils.dateparse import parse_date
+from django.http import JsonResponse, FileResponse, Http404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 
-# PDF Generation imports
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-
 # Import models from your payments app
-from .models import Payment, FailedPayment, ContactMessage
+from .analytics import BUCKETS, FIRST_DATE, GROUPS, LAST_DATE, bucket_count, bucket_series
+from .archive import history
+from .imports import format_for, queue_upload
+from .models import FailedPayment, ContactMessage, ReportJob, ImportJob
+from .pagination import list_response
+from .profiling import registry as profiling_registry
+from .report_jobs import request_report
+from .reports import build_donation_report
+from .routers import use_analytics_db
+from .search import filter_search, ranked_search
+from .throttle import counters as throttle_counters
+from .stats import get_dashboard_stats, STATS_SOURCES
 
 User = get_user_model()
 
 @login_required
+@use_analytics_db
 def dashboard_stats(request):
-    """Main Dashboard Stats for Summary Cards and Analytics"""
-    today = timezone.now().date()
-    
-    # Financial Stats based on the Payment model
-    total_collections = Payment.objects.filter(status="Success").aggregate(Sum('amount'))['amount__sum'] or 0
-    month_donations = Payment.objects.filter(
-        status="Success", 
-        created_at__month=today.month,
-        created_at__year=today.year
-    ).aggregate(Sum('amount'))['amount__sum'] or 0
-    
-    # New counters for Dashboard Cards
-    failed_count = FailedPayment.objects.count()
-    message_count = ContactMessage.objects.count()
-
-    # Pie Chart Data (Categories based on 'donate_to' field)
-    category_data = list(Payment.objects.filter(status="Success").values('donate_to').annotate(
-        value=Sum('amount')
-    ))
-
-    # Recent Activity (Latest 10 successful donations)
-    recent_activity = list(Payment.objects.filter(status="Success").order_by('-created_at')[:10].values(
-        'created_at', 'first_name', 'donate_to', 'amount', 'transaction_id'
-    ))
-
-    return JsonResponse({
-        "summary": {
-            "total": float(total_collections),
-            "month": float(month_donations),
-            "failed_total": failed_count,
-            "new_messages": message_count
-        },
-        "pie_chart": category_data,
-        "recent": recent_activity
-    })
+    """Main Dashboard Stats for Summary Cards and Analytics (cached, see payments.stats; ?source=rollup)"""
+    source = request.GET.get('source')
+    if source and source not in STATS_SOURCES:
+        return JsonResponse({"error": f"Unknown source: {source}"}, status=400)
+    return JsonResponse(get_dashboard_stats(source))
 
 @login_required
+@use_analytics_db
 def donations_list(request):
-    """Full donations table with search and filtering"""
-    queryset = Payment.objects.all().order_by('-created_at')
-
+    """Full donations table, archived months included, with search and filtering (keyset paginated, ?stream=1 for everything)"""
     # Filtering Logic based on GET parameters
     name = request.GET.get('name')
     country = request.GET.get('country')
@@ -66,75 +47,214 @@ def donations_list(request):
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
 
-    if name:
-        queryset = queryset.filter(Q(first_name__icontains=name) | Q(last_name__icontains=name))
-    if country:
-        queryset = queryset.filter(country__icontains=country)
-    if category:
-        queryset = queryset.filter(donate_to=category)
-    if start_date and end_date:
-        queryset = queryset.filter(created_at__date__range=[start_date, end_date])
+    querysets = []
+    for queryset in history():
+        if name:
+            # Donor search over name, email, phone and transaction ID (see payments.search)
+            queryset = filter_search(queryset, name)
+        if country:
+            queryset = queryset.filter(country__icontains=country)
+        if category:
+            queryset = queryset.filter(donate_to=category)
+        if start_date and end_date:
+            queryset = queryset.filter(created_at__date__range=[start_date, end_date])
+        querysets.append(queryset)
 
-    donations = list(queryset.values(
+    return list_response(request, tuple(querysets), (
         'transaction_id', 'first_name', 'last_name', 'email', 'phone',
         'amount', 'country', 'donate_to', 'status', 'created_at'
+    ), "donations")
+
+@login_required
+@use_analytics_db
+def search_donations(request):
+    """Ranked donor search (?q=, ?limit=) over name, email, phone and transaction ID"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 50)), 200))
+    except ValueError:
+        limit = 50
+    results = ranked_search(request.GET.get('q', ''), limit, fields=(
+        'transaction_id', 'first_name', 'last_name', 'email', 'phone',
+        'amount', 'donate_to', 'status', 'created_at'
     ))
-    return JsonResponse({"donations": donations})
+    return JsonResponse({"results": results})
 
 @login_required
+@use_analytics_db
 def failed_donations_list(request):
     """Display items from the FailedPayment model"""
-    failed = list(FailedPayment.objects.all().order_by('-created_at').values(
+    return list_response(request, FailedPayment.objects.all(), (
         'transaction_id', 'first_name', 'email', 'amount', 'donate_to', 'created_at'
-    ))
-    return JsonResponse({"failed_payments": failed})
+    ), "failed_payments")
 
 @login_required
+@use_analytics_db
 def contact_messages_list(request):
     """Display items from the ContactMessage model"""
-    messages = list(ContactMessage.objects.all().order_by('-created_at').values(
+    return list_response(request, ContactMessage.objects.all(), (
         'name', 'email', 'phone', 'message', 'created_at'
-    ))
-    return JsonResponse({"messages": messages})
+    ), "messages")
+
+def _parse_date_param(request, name, params=None):
+    value = (request.GET if params is None else params).get(name)
+    if not value:
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
 
 @login_required
+@use_analytics_db
 def export_donations_pdf(request):
-    """Generate professional PDF report"""
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    
-    # Header Design
-    p.setFont("Helvetica-Bold", 16)
-    p.drawString(100, 750, "CEYLON BAITHULMAL FUND - DONATION REPORT")
-    p.setFont("Helvetica", 10)
-    p.drawString(100, 735, f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M')}")
-    p.line(100, 730, 550, 730)
-
-    donations = Payment.objects.filter(status="Success").order_by('-created_at')
-    
-    y = 700
-    p.setFont("Helvetica-Bold", 9)
-    p.drawString(100, y, "Date")
-    p.drawString(180, y, "Donor Name")
-    p.drawString(350, y, "Category")
-    p.drawString(480, y, "Amount")
-    
-    p.setFont("Helvetica", 8)
-    for d in donations:
-        y -= 20
-        if y < 50:
-            p.showPage()
-            y = 750
-        p.drawString(100, y, d.created_at.strftime('%Y-%m-%d'))
-        p.drawString(180, y, f"{d.first_name} {d.last_name}")
-        p.drawString(350, y, d.donate_to)
-        p.drawString(480, y, f"{d.amount:.2f}")
-
-    p.showPage()
-    p.save()
+    """Generate professional PDF report (?start_date=, ?end_date=, ?category= filters)"""
+    try:
+        start_date = _parse_date_param(request, 'start_date')
+        end_date = _parse_date_param(request, 'end_date')
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+    # Spooled file: small reports stay in memory, large ones roll over to disk
+    buffer = tempfile.SpooledTemporaryFile(max_size=settings.REPORT_SPOOL_MAX_BYTES)
+    build_donation_report(buffer, start_date, end_date, request.GET.get('category') or None)
     buffer.seek(0)
     return FileResponse(buffer, as_attachment=True, filename='Baithulmal_Donation_Report.pdf')
 
+@login_required
+@use_analytics_db
+def donation_analytics(request):
+    """Donation count and total per day/week/month (?start=, ?end=, ?bucket=, ?group_by=) for the trend charts"""
+    bucket = request.GET.get('bucket', 'day')
+    group_by = request.GET.get('group_by') or None
+    if bucket not in BUCKETS:
+        return JsonResponse({"error": f"bucket must be one of: {', '.join(BUCKETS)}"}, status=400)
+    if group_by and group_by not in GROUPS:
+        return JsonResponse({"error": f"group_by must be one of: {', '.join(GROUPS)}"}, status=400)
+    try:
+        end = _parse_date_param(request, 'end') or timezone.localdate()
+        start = _parse_date_param(request, 'start') or max(end, FIRST_DATE) - timedelta(days=29)
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
+    if not (FIRST_DATE <= start <= LAST_DATE and FIRST_DATE <= end <= LAST_DATE):
+        return JsonResponse({"error": f"Dates must be between {FIRST_DATE} and {LAST_DATE}"}, status=400)
+    if start > end:
+        return JsonResponse({"error": "start must not be after end"}, status=400)
+    if bucket_count(start, end, bucket) > settings.ANALYTICS_MAX_BUCKETS:
+        return JsonResponse({"error": f"At most {settings.ANALYTICS_MAX_BUCKETS} buckets per request"}, status=400)
+
+    return JsonResponse({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "bucket": bucket,
+        "group_by": group_by,
+        "series": bucket_series(start, end, bucket, group_by),
+    })
+
+def _job_payload(job):
+    payload = {
+        "job_id": job.pk,
+        "format": job.format,
+        "filters": job.filters,
+        "status": job.status,
+        "progress": job.progress,
+        "total_rows": job.total_rows,
+        "percent": job.percent,
+    }
+    if job.status == ReportJob.STATUS_DONE:
+        payload["download_url"] = reverse("download_report_job", args=[job.pk])
+    elif job.status == ReportJob.STATUS_FAILED:
+        payload["error"] = job.error
+    return payload
+
+@login_required
+def request_report_job(request):
+    """Queue (or reuse) a background export: POST format=pdf|csv|csv.gz plus the report filters"""
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+
+    report_format = request.POST.get("format", ReportJob.FORMAT_PDF)
+    if report_format not in dict(ReportJob.FORMAT_CHOICES):
+        return JsonResponse({"error": f"Unknown format: {report_format}"}, status=400)
+    try:
+        filters = {
+            "start_date": _parse_date_param(request, 'start_date', request.POST),
+            "end_date": _parse_date_param(request, 'end_date', request.POST),
+            "category": request.POST.get('category'),
+        }
+    except ValueError:
+        return JsonResponse({"error": "Dates must be YYYY-MM-DD"}, status=400)
+
+    job = request_report(report_format, filters, request.user)
+    return JsonResponse(_job_payload(job), status=200 if job.status == ReportJob.STATUS_DONE else 202)
+
+@login_required
+def report_job_status(request, job_id):
+    """Progress polling for a report job"""
+    return JsonResponse(_job_payload(get_object_or_404(ReportJob, pk=job_id)))
+
+@login_required
+def download_report_job(request, job_id):
+    """Serve a finished report artefact from disk"""
+    job = get_object_or_404(ReportJob, pk=job_id, status=ReportJob.STATUS_DONE)
+    if not os.path.exists(job.file_path):
+        raise Http404("Report file no longer available")
+    filename = f"Baithulmal_Donation_Report.{job.format}"
+    return FileResponse(open(job.file_path, "rb"), as_attachment=True, filename=filename)
+
+def _import_payload(job):
+    payload = {
+        "job_id": job.pk,
+        "file": job.original_name,
+        "status": job.status,
+        "rows": job.rows,
+        "imported": job.imported,
+        "rejected": job.rejected,
+        "status_url": reverse("import_job_status", args=[job.pk]),
+    }
+    if job.status == ImportJob.STATUS_DONE:
+        payload["errors"] = job.errors
+    elif job.status == ImportJob.STATUS_FAILED:
+        payload["error"] = job.error
+    return payload
+
+@staff_member_required
+def upload_donations(request):
+    """Queue a CSV / JSON Lines file of offline donations (POST file=...) for `import_donations --jobs`"""
+    if request.method != "POST":
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    uploaded = request.FILES.get('file')
+    if uploaded is None:
+        return JsonResponse({"error": "No file uploaded"}, status=400)
+    file_format = request.POST.get('format') or format_for(uploaded.name or "")
+    if file_format not in dict(ImportJob.FORMAT_CHOICES):
+        return JsonResponse({"error": "Upload a .csv or .jsonl file"}, status=400)
+    job = queue_upload(uploaded, file_format, request.user)
+    return JsonResponse(_import_payload(job), status=202)
+
+@staff_member_required
+def import_job_status(request, job_id):
+    return JsonResponse(_import_payload(get_object_or_404(ImportJob, pk=job_id)))
+
+@staff_member_required
+def profiling_report(request):
+    """This worker's request timings, query counts, spans and slowest cProfile samples (POST clears them)"""
+    if request.method == "POST":
+        profiling_registry.reset()
+    report = profiling_registry.snapshot()
+    report["enabled"] = settings.PROFILING_ENABLED
+    report["pid"] = os.getpid()
+    return JsonResponse(report)
+
+@staff_member_required
+def throttle_report(request):
+    """This worker's throttle and duplicate checkout counts (POST clears them)"""
+    if request.method == "POST":
+        throttle_counters.reset()
+    report = throttle_counters.snapshot()
+    report["enabled"] = settings.THROTTLE_ENABLED
+    report["pid"] = os.getpid()
+    return JsonResponse(report)
+
 @login_required
 def manage_users(request):
     """List all admin users from Custom User Model"""
@@ -0,0 +1,88 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+        with self.server.lock:
+            self.server.requests.append({"path": self.path, "auth": self.headers.get("Authorization"), "form": form})
+            status_code = self.server.statuses.get(form.get("order_id"))
+
+        if status_code is None:
+            self._reply(404, {"error": "Unknown order"})
+        else:
+            self._reply(200, {"order_id": form["order_id"], "status_code": status_code})
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGatewayServer:
+    """
+    Local stand-in for the WebXPay status API, for tests and local runs:
+
+        with FakeGatewayServer({"<transaction id>": "00"}) as gateway:
+            settings.WEBXPAY_STATUS_URL = gateway.status_url
+
+    `statuses` maps order_id to the status code returned; unknown orders get a 404.
+    """
+
+    def __init__(self, statuses=None, host="127.0.0.1", port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.statuses = dict(statuses or {})
+        self.httpd.requests = []
+        self.httpd.connections = 0
+        self.thread = None
+
+    @property
+    def status_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/status"
+
+    @property
+    def statuses(self):
+        return self.httpd.statuses
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    @property
+    def connections(self):
+        return self.httpd.connections
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,149 @@
+import bisect
+import threading
+import time
+import uuid
+from collections import namedtuple
+from decimal import Decimal, ROUND_HALF_UP
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import ExchangeRate
+
+BASE_CURRENCY = "LKR"
+CENT = Decimal("0.01")
+FX_VERSION_CACHE_KEY = "payments:fx_rates_version"
+
+Rate = namedtuple("Rate", "id currency rate effective_from")
+
+
+class UnknownCurrency(ValueError):
+    pass
+
+
+class RateTable:
+    """
+    Every ExchangeRate row held in process memory, so conversions on the request path never
+    query the database once warm. The table reloads after FX_RATE_CACHE_TTL seconds, or sooner
+    when another worker bumps the shared version in the Django cache (checked at most every
+    FX_RATE_VERSION_CHECK_SECONDS).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rates = {}  # currency -> (sorted effective_from list, Rate list in the same order)
+        self.version = None
+        self.loaded_at = None
+        self.checked_at = None
+        self.loads = 0
+
+    def load(self):
+        # Read the version first: a bump that races the query makes the next check reload again
+        version = cache.get(FX_VERSION_CACHE_KEY)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.add(FX_VERSION_CACHE_KEY, version, None)
+            version = cache.get(FX_VERSION_CACHE_KEY, version)
+        rates = {}
+        for row in ExchangeRate.objects.order_by("currency", "effective_from").values_list(
+            "id", "currency", "rate", "effective_from"
+        ):
+            starts, versions = rates.setdefault(row[1], ([], []))
+            starts.append(row[3])
+            versions.append(Rate(*row))
+        self.rates = rates
+        self.version = version
+        self.loaded_at = self.checked_at = time.monotonic()
+        self.loads += 1
+
+    def clear(self):
+        with self.lock:
+            self.loaded_at = None
+
+    def needs_reload(self):
+        """True when the table is cold, past its TTL, or another worker published a new version."""
+        now = time.monotonic()
+        if self.loaded_at is None or now - self.loaded_at >= settings.FX_RATE_CACHE_TTL:
+            return True
+        if now - self.checked_at >= settings.FX_RATE_VERSION_CHECK_SECONDS:
+            self.checked_at = now
+            return cache.get(FX_VERSION_CACHE_KEY) != self.version
+        return False
+
+    def refresh(self):
+        with self.lock:
+            if self.needs_reload():
+                self.load()
+
+    def reload(self):
+        with self.lock:
+            self.load()
+
+    def currencies(self, refresh=True):
+        if refresh:
+            self.refresh()
+        return {BASE_CURRENCY, *self.rates}
+
+    def rate_for(self, currency, at=None, refresh=True):
+        """
+        The Rate in force for `currency` at `at` (default now). LKR itself has no row: rate 1, id None.
+        refresh=False uses the table as loaded (async views refresh it beforehand with arefresh()).
+        """
+        currency = currency.upper()
+        if currency == BASE_CURRENCY:
+            return Rate(None, BASE_CURRENCY, Decimal(1), None)
+        if refresh:
+            self.refresh()
+        try:
+            starts, versions = self.rates[currency]
+        except KeyError:
+            raise UnknownCurrency(currency) from None
+        i = bisect.bisect_right(starts, at or timezone.now())
+        if not i:
+            raise UnknownCurrency(f"No {currency} rate in effect at {at}")
+        return versions[i - 1]
+
+
+rates = RateTable()
+
+
+def supports(currency, refresh=True, at=None):
+    """True when `currency` has a rate in effect at `at` (default now); a currency with only future rates is not supported yet."""
+    try:
+        rates.rate_for(currency, at, refresh)
+    except UnknownCurrency:
+        return False
+    return True
+
+
+def convert_to_lkr(amount, currency, at=None, refresh=True):
+    """
+    Returns (lkr_amount, rate). The donor amount is rounded to cents first and the product is
+    rounded once, half up, so the stored pair always reproduces the stored LKR amount.
+    """
+    rate = rates.rate_for(currency, at, refresh)
+    original = Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+    return (original * rate.rate).quantize(CENT, rounding=ROUND_HALF_UP), rate
+
+
+async def arefresh():
+    """For async views: a reload (the only DB access) runs in a worker thread, lookups then use refresh=False."""
+    if rates.needs_reload():
+        await sync_to_async(rates.reload)()
+
+
+def invalidate_rates():
+    """New version for every worker's RateTable; this process reloads on its next lookup."""
+    cache.set(FX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+    rates.clear()
+
+
+@receiver(post_save, sender=ExchangeRate, dispatch_uid="payments_fx_rate_saved")
+@receiver(post_delete, sender=ExchangeRate, dispatch_uid="payments_fx_rate_deleted")
+def _exchange_rate_changed(sender, **kwargs):
+    transaction.on_commit(invalidate_rates)
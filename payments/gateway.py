@@ -1,17 +1,48 @@
+import threading
 from abc import ABC, abstractmethod
+
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
 from payments.crypto_utils import encrypt_payment
+from payments.profiling import span
+
+
+class GatewayError(Exception):
+    """A provider's server-side API could not be reached or gave an unusable answer."""
+
+
+class StatusQueryUnsupported(GatewayError):
+    """The provider has no server-side status API (see PaymentGateway.supports_status_query)."""
+
 
 class PaymentGateway(ABC):
+    # Providers that implement query_status set this, so reconciliation skips the others up front
+    supports_status_query = False
+
+    def __init__(self, name="default", **options):
+        self.name = name
+        self.options = options
+
     @abstractmethod
     def get_payment_params(self, payment, formatted_amount):
         pass
 
+    def query_status(self, transaction_id):
+        """Gateway status code for a transaction ("00" is success), or None if the gateway has no record of it."""
+        raise StatusQueryUnsupported(f"{type(self).__name__} has no status API")
+
+
 class WebXPayProvider(PaymentGateway):
+    supports_status_query = True
+
     def get_payment_params(self, payment, formatted_amount):
         # All WebXPay-specific knowledge is isolated here
-        encrypted_payment = encrypt_payment(str(payment.transaction_id), formatted_amount)
-        
+        with span("encrypt_payment"):
+            encrypted_payment = encrypt_payment(str(payment.transaction_id), formatted_amount)
+
         return {
             "payment_url": settings.WEBXPAY_URL,
             "params": {
@@ -31,3 +62,120 @@ class WebXPayProvider(PaymentGateway):
                 "cms": "Django"
             }
         }
+
+    def query_status(self, transaction_id):
+        url = self.options.get("STATUS_URL") or settings.WEBXPAY_STATUS_URL
+        if not url:
+            raise GatewayError("WEBXPAY_STATUS_URL is not configured")
+        auth = (
+            self.options.get("API_USERNAME", settings.WEBXPAY_API_USERNAME),
+            self.options.get("API_PASSWORD", settings.WEBXPAY_API_PASSWORD),
+        )
+        import requests
+
+        with span("gateway_status"):
+            try:
+                response = http_session().post(
+                    url, auth=auth, timeout=http_timeout(),
+                    data={"merchant_id": settings.WEBXPAY_MERCHANT_ID, "order_id": str(transaction_id)},
+                )
+            except requests.RequestException as e:
+                raise GatewayError(f"Status query for {transaction_id} failed: {e}") from e
+
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            raise GatewayError(f"Status query for {transaction_id} returned HTTP {response.status_code}")
+        try:
+            return response.json().get("status_code")
+        except ValueError as e:
+            raise GatewayError(f"Status query for {transaction_id} returned invalid JSON") from e
+
+
+# Shared keep-alive HTTP session for server-side gateway calls
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def http_timeout():
+    """(connect, read) seconds for gateway API calls."""
+    return (settings.PAYMENT_GATEWAY_CONNECT_TIMEOUT, settings.PAYMENT_GATEWAY_READ_TIMEOUT)
+
+
+def http_session():
+    """
+    One pooled requests.Session per process, so status queries reuse open connections.
+    requests is imported here: only the reconciler calls gateways server-side, web workers never do.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_maxsize=settings.PAYMENT_GATEWAY_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+# Registry: one provider instance per PAYMENT_GATEWAYS entry, built once per process
+
+_gateways = None
+_gateways_lock = threading.Lock()
+
+
+def build_gateways():
+    return {
+        name: import_string(config["BACKEND"])(name, **config.get("OPTIONS", {}))
+        for name, config in settings.PAYMENT_GATEWAYS.items()
+    }
+
+
+def get_gateways():
+    global _gateways
+    if _gateways is None:
+        with _gateways_lock:
+            if _gateways is None:
+                _gateways = build_gateways()
+    return _gateways
+
+
+def get_gateway(name="default"):
+    try:
+        return get_gateways()[name]
+    except KeyError:
+        raise GatewayError(f"Unknown payment gateway: {name}") from None
+
+
+def select_gateway(currency=None, appeal=None):
+    """
+    Provider for a donation: PAYMENT_GATEWAY_BY_APPEAL wins over PAYMENT_GATEWAY_BY_CURRENCY,
+    anything unmapped goes to the "default" gateway.
+    """
+    name = (
+        settings.PAYMENT_GATEWAY_BY_APPEAL.get(appeal)
+        or settings.PAYMENT_GATEWAY_BY_CURRENCY.get(currency)
+        or "default"
+    )
+    return get_gateway(name)
+
+
+def reset_gateways():
+    global _gateways, _session
+    with _gateways_lock:
+        _gateways = None
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+
+
+@receiver(setting_changed, dispatch_uid="payments_gateway_reset")
+def _gateway_settings_changed(sender, setting, **kwargs):
+    if setting.startswith(("PAYMENT_GATEWAY", "WEBXPAY_")):
+        reset_gateways()
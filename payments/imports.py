@@ -0,0 +1,317 @@
+"""
+Bulk import of offline donations (bank transfers, cash at the office) from CSV or JSON Lines.
+
+Rows are read as a stream, normalised like a web checkout (payments.views._payment_fields: phone
+digits, LKR conversion at the donation date) and written with bulk_create, one transaction per
+batch, so a file of any size runs in bounded memory and a bad row never aborts the import.
+
+Columns: first_name, last_name, email, phone, amount, currency (LKR if missing), donate_to, country,
+donation_option, address_line_one, address_line_two, city, message, created_at (or date),
+status (Success or Failed, IMPORT_DEFAULT_STATUS if missing) and reference (kept as transaction_id; re-imports skip it).
+"""
+import csv
+import json
+import logging
+import os
+import uuid
+from decimal import InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import fx
+from .analytics import invalidate_analytics
+from .archive import history_values
+from .changelist import invalidate_filter_choices
+from .models import Payment, ImportJob
+from .rollup import rebuild_rollup
+from .search import build_search_text, reset_ngram_index
+from .stats import day_start, invalidate_dashboard_stats
+from .synthetic import explicit_created_at
+from .views import _payment_fields
+
+logger = logging.getLogger(__name__)
+
+# Offline donations are settled: a Pending row would be picked up by reconcile and abandoned
+STATUSES = ("Success", "Failed")
+EXTRA_FIELDS = ("address_line_one", "address_line_two", "city", "message")
+
+
+class RowError(ValueError):
+    pass
+
+
+def format_for(filename):
+    """ImportJob format from a file name (.csv, .jsonl / .ndjson), else None."""
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return ImportJob.FORMAT_CSV
+    if name.endswith((".jsonl", ".ndjson")):
+        return ImportJob.FORMAT_JSONL
+    return None
+
+
+def read_rows(stream, file_format):
+    """Yields (line number, row dict or RowError) from a text stream, one line at a time."""
+    if file_format == ImportJob.FORMAT_CSV:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key.strip().lower(): (value or "").strip() for key, value in row.items() if key}
+        return
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, RowError(f"Invalid JSON: {e}")
+            continue
+        if not isinstance(row, dict):
+            yield line_no, RowError("Each line must be a JSON object")
+            continue
+        yield line_no, {str(key).lower(): "" if value is None else str(value).strip() for key, value in row.items()}
+
+
+def _created_at(row, now):
+    raw = row.get("created_at") or row.get("date")
+    if not raw:
+        return now
+    value = parse_datetime(raw)
+    if value is None:
+        day = parse_date(raw)
+        if day is None:
+            raise RowError(f"Unreadable date: {raw}")
+        value = day_start(day)
+    elif timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    if value > now:
+        raise RowError(f"Date is in the future: {raw}")
+    return value
+
+
+def row_to_payment(row, now=None):
+    """An unsaved Payment for one import row; raises RowError with the reason for a bad row."""
+    now = now or timezone.now()
+    created_at = _created_at(row, now)
+
+    status = (row.get("status") or settings.IMPORT_DEFAULT_STATUS).capitalize()
+    if status == "Pending":
+        raise RowError("Pending rows cannot be imported: use Success or Failed")
+    if status not in STATUSES:
+        raise RowError(f"Unknown status: {row['status']}")
+    email = row.get("email", "")
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise RowError(f"Invalid email: {email}") from None
+
+    # Unlike the checkout form, an unknown currency is an error rather than LKR
+    currency = (row.get("currency") or row.get("currency_preference") or fx.BASE_CURRENCY).upper()
+    if not fx.supports(currency, at=created_at):
+        raise RowError(f"No exchange rate for {currency}")
+    try:
+        fields = _payment_fields(dict(row, currency_preference=currency), at=created_at)
+    except InvalidOperation:
+        raise RowError(f"Invalid amount: {row.get('amount')!r}") from None
+    except fx.UnknownCurrency as e:
+        raise RowError(str(e)) from None
+    if fields["amount"] <= 0:
+        raise RowError(f"Amount must be positive: {row.get('amount')}")
+
+    fields.update({name: row.get(name, "") for name in EXTRA_FIELDS})
+    fields.update(status=status, created_at=created_at, transaction_id=row.get("reference") or str(uuid.uuid4()))
+    payment = Payment(**fields)
+    # bulk_create skips Payment.save()
+    payment.search_text = build_search_text(payment)
+    check_column_limits(payment)
+    return payment
+
+
+def check_column_limits(payment):
+    """
+    Runs each column's validators (max_length, max_digits) so a value the database would refuse
+    rejects its own row rather than the bulk_create of its whole batch.
+    """
+    for field in Payment._meta.concrete_fields:
+        try:
+            field.run_validators(getattr(payment, field.attname))
+        except ValidationError as e:
+            raise RowError(f"Invalid {field.name}: {' '.join(e.messages)}") from None
+
+
+class ImportResult:
+    """Counts plus the first IMPORT_MAX_REPORTED_ERRORS bad rows; `on_error` sees every one."""
+
+    def __init__(self, on_error=None):
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.on_error = on_error
+        self.first_success = self.last_success = None
+
+    def reject(self, line_no, error):
+        self.rejected += 1
+        entry = {"line": line_no, "error": str(error)}
+        if len(self.errors) < settings.IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append(entry)
+        if self.on_error:
+            self.on_error(entry)
+
+    def as_dict(self):
+        return {"rows": self.rows, "imported": self.imported, "rejected": self.rejected, "errors": self.errors}
+
+
+def write_batch(batch, result):
+    """
+    One transaction: drops references that are already imported (hot table or archive) or repeated
+    in the batch, then one bulk_create. If the database refuses the batch, its rows are written one
+    at a time so only the rows at fault are rejected.
+    """
+    references = [payment.transaction_id for _, payment in batch]
+    with transaction.atomic():
+        seen = {reference for (reference,) in history_values("transaction_id", transaction_id__in=references)}
+        payments = []
+        for line_no, payment in batch:
+            if payment.transaction_id in seen:
+                result.reject(line_no, f"Reference already imported: {payment.transaction_id}")
+                continue
+            seen.add(payment.transaction_id)
+            payments.append((line_no, payment))
+        try:
+            with transaction.atomic():
+                Payment.objects.bulk_create([payment for _, payment in payments])
+        except DatabaseError:
+            payments = _write_rows(payments, result)
+    result.imported += len(payments)
+    for _, payment in payments:
+        if payment.status == "Success":
+            result.first_success = min(filter(None, (result.first_success, payment.created_at)))
+            result.last_success = max(filter(None, (result.last_success, payment.created_at)))
+
+
+def _write_rows(payments, result):
+    """Writes (line number, payment) pairs one savepoint each, rejecting the ones the database refuses. Returns those written."""
+    written = []
+    for line_no, payment in payments:
+        try:
+            with transaction.atomic():
+                Payment.objects.bulk_create([payment])
+        except DatabaseError as e:
+            result.reject(line_no, f"Row not written: {e}")
+        else:
+            written.append((line_no, payment))
+    return written
+
+
+def import_stream(stream, file_format, batch_size=None, on_error=None, refresh_aggregates=True):
+    """
+    Imports every row of a text stream. Returns an ImportResult. Only call this from a management
+    command process: created_at is written as given, which suspends auto_now_add process-wide.
+    """
+    batch_size = batch_size or settings.IMPORT_BATCH_SIZE
+    result = ImportResult(on_error)
+    now = timezone.now()
+    batch = []
+    with explicit_created_at(Payment):
+        for line_no, row in read_rows(stream, file_format):
+            result.rows += 1
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                batch.append((line_no, row_to_payment(row, now)))
+            except RowError as e:
+                result.reject(line_no, e)
+            if len(batch) >= batch_size:
+                write_batch(batch, result)
+                batch = []
+        if batch:
+            write_batch(batch, result)
+
+    # bulk_create skips the search index receivers
+    if result.imported:
+        reset_ngram_index()
+    if refresh_aggregates and result.first_success:
+        refresh_aggregates_for(result.first_success, result.last_success)
+    return result
+
+
+def refresh_aggregates_for(first, last):
+    """Rollup buckets for the imported days are rebuilt; dashboard, trend and admin filter caches start over."""
+    rebuild_rollup(timezone.localdate(first), timezone.localdate(last))
+    invalidate_dashboard_stats()
+    invalidate_analytics()
+    invalidate_filter_choices()
+
+
+def open_text(path):
+    # utf-8-sig: spreadsheets often save CSV with a byte order mark
+    return open(path, newline="", encoding="utf-8-sig")
+
+
+# Staff uploads are queued and imported by the worker (`manage.py import_donations --jobs`)
+
+def upload_dir():
+    return settings.IMPORT_UPLOAD_DIR
+
+
+def queue_upload(uploaded_file, file_format, user=None):
+    """Streams an UploadedFile to IMPORT_UPLOAD_DIR and queues an ImportJob for it."""
+    os.makedirs(upload_dir(), exist_ok=True)
+    path = os.path.join(upload_dir(), f"{uuid.uuid4().hex}.{file_format}")
+    with open(path, "wb") as out:
+        for chunk in uploaded_file.chunks():
+            out.write(chunk)
+    return ImportJob.objects.create(
+        format=file_format, original_name=os.path.basename(uploaded_file.name or "")[:255], file_path=path,
+        requested_by=user if user and user.is_authenticated else None,
+    )
+
+
+def claim_next_job():
+    """Marks the oldest pending import Running and returns it (None when the queue is empty)."""
+    with transaction.atomic():
+        job = (
+            ImportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ImportJob.STATUS_PENDING)
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ImportJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+    return job
+
+
+def run_job(job, batch_size=None):
+    try:
+        with open_text(job.file_path) as stream:
+            result = import_stream(stream, job.format, batch_size)
+    except Exception as e:
+        logger.exception(f"Import job {job.pk} failed")
+        job.status = ImportJob.STATUS_FAILED
+        job.error = str(e)
+    else:
+        job.status = ImportJob.STATUS_DONE
+        job.rows, job.imported, job.rejected, job.errors = result.rows, result.imported, result.rejected, result.errors
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "rows", "imported", "rejected", "errors", "error", "finished_at"])
+    return job
+
+
+def run_pending_jobs(batch_size=None):
+    """Imports queued uploads until none are left. Returns how many were processed."""
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return processed
+        run_job(job, batch_size)
+        processed += 1
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.archive import archive_closed_periods, archive_horizon
+
+
+class Command(BaseCommand):
+    help = "Moves settled payments from closed-out months into PaymentArchive (INSERT ... SELECT per month)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, help="Months kept in the hot table, current one included (default: PAYMENT_ARCHIVE_AFTER_MONTHS)")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        moved = archive_closed_periods(options["months"])
+        for period, rows in moved:
+            self.stdout.write(f"{period:%Y-%m}: {rows} payment(s) archived")
+        total = sum(rows for _, rows in moved)
+        horizon = archive_horizon(options["months"])
+        self.stdout.write(f"Archived {total} payment(s) created before {horizon:%Y-%m-%d} in {time.perf_counter() - started:.1f}s")
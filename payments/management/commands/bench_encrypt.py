@@ -0,0 +1,55 @@
+import base64
+import os
+import time
+import uuid
+
+from Crypto.Cipher import PKCS1_v1_5
+from Crypto.PublicKey import RSA
+from django.core.management.base import BaseCommand
+
+from payments import crypto_utils
+
+
+def _encrypt_uncached(transaction_id, amount):
+    """The old encrypt_payment path: stat + open + parse the PEM on every call."""
+    key_file = crypto_utils.get_key_file()
+    if not os.path.exists(key_file):
+        raise FileNotFoundError(key_file)
+    with open(key_file, "rb") as f:
+        public_key = RSA.import_key(f.read())
+    cipher = PKCS1_v1_5.new(public_key)
+    encrypted = cipher.encrypt(f"{transaction_id}|{amount}".encode("utf-8"))
+    return base64.b64encode(encrypted).decode("ascii")
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark of encrypt_payment with and without the cached public key"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def _run(self, func, iterations):
+        transaction_id = str(uuid.uuid4())
+        func(transaction_id, "1000.00")  # warm-up
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func(transaction_id, "1000.00")
+        return (time.perf_counter() - started) / iterations * 1e6
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        crypto_utils.clear_key_cache()
+        crypto_utils.reset_crypto_stats()
+
+        before = self._run(_encrypt_uncached, iterations)
+        after = self._run(crypto_utils.encrypt_payment, iterations)
+        stats = crypto_utils.get_crypto_stats()
+
+        self.stdout.write(f"iterations:         {iterations}")
+        self.stdout.write(f"uncached (before):  {before:8.1f} us/call")
+        self.stdout.write(f"cached (after):     {after:8.1f} us/call")
+        self.stdout.write(f"speed-up:           {before / after:8.2f}x")
+        self.stdout.write(f"key loads:          {stats['key_loads']}")
+        if stats["encrypts"]:
+            avg = stats["encrypt_seconds"] / stats["encrypts"] * 1e6
+            self.stdout.write(f"avg RSA encrypt:    {avg:8.1f} us")
@@ -0,0 +1,91 @@
+import csv
+import json
+import os
+import resource
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Min
+
+from payments.imports import import_stream, open_text
+from payments.models import Payment
+from payments.synthetic import synthetic_payments
+
+REFERENCE_PREFIX = "bench-import-"
+COLUMNS = ("reference", "first_name", "last_name", "email", "phone", "amount", "currency", "donate_to", "country",
+           "donation_option", "created_at", "status")
+
+
+def bench_rows(count, bad_every):
+    """Import rows shaped like a bank export; every `bad_every`-th row has an unreadable amount."""
+    for i, payment in enumerate(synthetic_payments(count, seed=7)):
+        yield {
+            "reference": f"{REFERENCE_PREFIX}{i}",
+            "first_name": payment.first_name,
+            "last_name": payment.last_name,
+            "email": payment.email,
+            "phone": f"+94 {payment.phone[1:3]} {payment.phone[3:]}",
+            "amount": "n/a" if bad_every and i % bad_every == bad_every - 1 else str(payment.original_amount),
+            "currency": payment.currency,
+            "donate_to": payment.donate_to,
+            "country": payment.country,
+            "donation_option": payment.donation_option,
+            "created_at": payment.created_at.isoformat(),
+            "status": "Success",
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks import_donations on generated CSV and JSON Lines files (rows/s and max RSS). "
+        "Writes (and afterwards deletes) rows in the configured database: use a local or test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--batch-size", type=int, nargs="+", default=[500, 2000, 5000])
+        parser.add_argument("--formats", nargs="+", default=["csv", "jsonl"], choices=["csv", "jsonl"])
+        parser.add_argument("--bad-every", type=int, default=50, help="Every Nth row is invalid (0 for none)")
+
+    def write_file(self, file_format, rows, bad_every):
+        fd, path = tempfile.mkstemp(suffix=f".{file_format}")
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as out:
+            if file_format == "csv":
+                writer = csv.DictWriter(out, COLUMNS)
+                writer.writeheader()
+                writer.writerows(bench_rows(rows, bad_every))
+            else:
+                for row in bench_rows(rows, bad_every):
+                    out.write(json.dumps(row) + "\n")
+        return path
+
+    def cleanup(self):
+        # In id ranges, so the delete (with its cascades) never holds every row in memory
+        imported = Payment.objects.filter(transaction_id__startswith=REFERENCE_PREFIX)
+        while True:
+            first = imported.aggregate(first=Min("id"))["first"]
+            if first is None:
+                return
+            imported.filter(id__lt=first + 5000).delete()
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'format':>7}{'batch':>7}{'rows':>10}{'imported':>10}{'rejected':>10}{'seconds':>9}{'rows/s':>9}{'max RSS MB':>12}")
+        for file_format in options["formats"]:
+            path = self.write_file(file_format, options["rows"], options["bad_every"])
+            try:
+                for batch_size in options["batch_size"]:
+                    self.cleanup()
+                    started = time.perf_counter()
+                    with open_text(path) as stream:
+                        # Aggregates are left alone: the rows are deleted again
+                        result = import_stream(stream, file_format, batch_size, refresh_aggregates=False)
+                    elapsed = time.perf_counter() - started
+                    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+                    self.stdout.write(
+                        f"{file_format:>7}{batch_size:>7}{result.rows:>10}{result.imported:>10}{result.rejected:>10}"
+                        f"{elapsed:>9.1f}{result.rows / elapsed:>9.0f}{max_rss:>12.1f}"
+                    )
+            finally:
+                os.remove(path)
+                self.cleanup()
@@ -0,0 +1,44 @@
+import resource
+import tempfile
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.reports import DonationReport, report_rows
+
+CATEGORIES = ("General", "Zakat", "Orphans", "Water Wells", "Education")
+
+
+def synthetic_rows(count):
+    """Report tuples shaped like report_rows() without touching the database."""
+    now = timezone.now()
+    for i in range(count):
+        yield (now - timedelta(minutes=i), f"Donor{i}", "Test", CATEGORIES[i % len(CATEGORIES)], Decimal(1000 + i % 500))
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the streaming PDF donation report at several row counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+        parser.add_argument("--db", action="store_true", help="Read successful payments from the database instead of synthetic rows")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'rows':>10}{'seconds':>10}{'rows/s':>12}{'pages':>8}{'pdf MB':>9}{'max RSS MB':>12}")
+        for count in options["rows"]:
+            rows = report_rows() if options["db"] else synthetic_rows(count)
+            with tempfile.SpooledTemporaryFile(max_size=5 * 1024 * 1024) as out:
+                started = time.perf_counter()
+                report = DonationReport(out).build(rows)
+                elapsed = time.perf_counter() - started
+                size = out.tell()
+            max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            self.stdout.write(
+                f"{report.count:>10}{elapsed:>10.2f}{report.count / elapsed:>12.0f}"
+                f"{report.page:>8}{size / 1024 / 1024:>9.1f}{max_rss:>12.1f}"
+            )
+            if options["db"]:
+                break
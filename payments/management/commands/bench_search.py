@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from payments import search
+from payments.models import Payment
+from payments.synthetic import bulk_insert, synthetic_payments
+
+
+class Command(BaseCommand):
+    help = "Benchmarks donor search over a synthetic donation table (rolled back afterwards unless --keep)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=500_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--keep", action="store_true", help="Keep the generated rows")
+
+    def timed(self, label, func, repeat):
+        func()  # warm-up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        elapsed = (time.perf_counter() - started) / repeat * 1000
+        self.stdout.write(f"  {label:<28}{elapsed:>10.2f} ms  ({result} rows)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            started = time.perf_counter()
+            bulk_insert(Payment, synthetic_payments(options["rows"]))
+            self.stdout.write(f"Generated {options['rows']} rows in {time.perf_counter() - started:.1f}s")
+
+            search.reset_ngram_index()
+            started = time.perf_counter()
+            search.get_ngram_index()
+            self.stdout.write(f"Built in-process n-gram index in {time.perf_counter() - started:.1f}s")
+
+            repeat = options["repeat"]
+            for term in ("haniffa12", "zainab.careem", "0771", "fathima"):
+                self.stdout.write(f"term {term!r} (backend: {search.search_backend()})")
+                legacy = Q()
+                for field in ("transaction_id", "first_name", "last_name", "email"):
+                    legacy |= Q(**{f"{field}__icontains": term})
+                self.timed("legacy icontains OR", lambda: len(Payment.objects.filter(legacy).values_list("id")[:50]), repeat)
+                self.timed("search_text LIKE", lambda: len(Payment.objects.filter(search_text__contains=term).values_list("id")[:50]), repeat)
+                self.timed("filter_search (page of 50)", lambda: len(search.filter_search(Payment.objects.all(), term).values_list("id")[:50]), repeat)
+                self.timed("ranked_search top 50", lambda: len(search.ranked_search(term, 50)), repeat)
+
+            if not options["keep"]:
+                transaction.set_rollback(True)
+                search.reset_ngram_index()
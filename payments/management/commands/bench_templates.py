@@ -0,0 +1,244 @@
+import time
+import tracemalloc
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+from django.utils import timezone
+
+from payments import rendering
+
+
+def _legacy_thank_you_html(payment, display_amount):
+    """The f-string email body payment_callback used before the template subsystem."""
+    now = timezone.now()
+    date_display = now.strftime('%d/%m/%Y | %H:%M')
+    timestamp = now.strftime('%Y%m%d%H%M')
+    full_name = f"{payment.first_name} {payment.last_name}".strip()
+    ref_no = f"CBF-{payment.first_name.replace(' ', '')}{payment.last_name.replace(' ', '')}-{timestamp}"
+    amount_display = f"LKR {display_amount:.2f}"
+    return f"""
+    <html>
+      <body style="font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; color: #333; line-height: 1.6;">
+        <div style="max-width: 650px; margin: auto; padding: 20px;">
+          <h2 style="color: #2c5e77; font-size: 24px; text-transform: uppercase; border-bottom: 2px solid #92BC13; padding-bottom: 10px;">
+            CEYLON BAITHULMAL FUND
+          </h2>
+          
+          <p>Dear Sir/Madam <strong>{full_name}</strong>,</p>
+          <p>Thank you for your valuable donation. Your support helps us serve better and reach more people.</p>
+          
+          <div style="background: #f9f9f9; padding: 25px; border-radius: 8px; border-left: 5px solid #92BC13; margin: 20px 0;">
+            <h3 style="color: #92BC13; margin-top: 0; text-transform: uppercase; font-size: 18px;">YOUR DONATION DETAILS</h3>
+            
+            <table style="width: 100%; border-collapse: collapse;">
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold; width: 150px;">Ref No:</td>
+                <td style="padding: 8px 0;">{ref_no}</td>
+              </tr>
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold;">Name:</td>
+                <td style="padding: 8px 0;">{full_name}</td>
+              </tr>
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold;">Donation Type:</td>
+                <td style="padding: 8px 0;">{payment.donation_option}</td>
+              </tr>
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold;">Appeal:</td>
+                <td style="padding: 8px 0;">{payment.donate_to}</td>
+              </tr>
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold;">Country:</td>
+                <td style="padding: 8px 0;">{payment.country}</td>
+              </tr>
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold;">Date | Time:</td>
+                <td style="padding: 8px 0;">{date_display}</td>
+              </tr>
+              <tr>
+                <td style="padding: 8px 0; font-weight: bold;">Amount:</td>
+                <td style="padding: 8px 0; color: #92BC13; font-weight: bold; font-size: 1.1em;">{amount_display}</td>
+              </tr>
+            </table>
+          </div>
+          
+          <p style="font-style: italic;">May Allah reward you and your family.</p>
+          
+          <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0 10px 0;">
+          
+          <div style="font-size: 13px; color: #666;">
+            <p><strong>Ceylon Baithulmal Fund</strong><br>
+            <a href="https://baithulmal.lk" style="color: #2c5e77; text-decoration: none;">baithulmal.lk</a> | 
+            <a href="mailto:c.baithulmal@gmail.com" style="color: #2c5e77; text-decoration: none;">c.baithulmal@gmail.com</a><br>
+            (+94) 11 25 99 075</p>
+          </div>
+        </div>
+      </body>
+    </html>
+    """
+
+
+def _legacy_success_html(payment):
+    """The f-string success card payment_callback used before the template subsystem."""
+    return f"""
+    <html>
+    <head>
+        <title>Success | BaithulMal</title>
+        <meta name="viewport" content="width=device-width, initial-scale=1">
+        <style>
+            body {{ 
+                font-family: 'Segoe UI', Roboto, Helvetica, Arial, sans-serif; 
+                display: flex; 
+                justify-content: center; 
+                align-items: center; 
+                height: 100vh; 
+                margin: 0; 
+                background-color: #f0f2f5; 
+            }}
+            .card {{ 
+                background: white; 
+                padding: 50px 40px; 
+                border-radius: 16px; 
+                box-shadow: 0 10px 25px rgba(0,0,0,0.08); 
+                max-width: 480px; 
+                width: 90%; 
+                text-align: center;
+                border-top: 6px solid #92BC13;
+            }}
+            .icon-circle {{
+                width: 80px;
+                height: 80px;
+                background: #f1f8e9;
+                border-radius: 50%;
+                display: flex;
+                justify-content: center;
+                align-items: center;
+                margin: 0 auto 25px;
+            }}
+            .icon-check {{
+                color: #92BC13;
+                font-size: 40px;
+                font-weight: bold;
+            }}
+            h1 {{ 
+                color: #2c5e77; 
+                margin: 0 0 15px 0; 
+                font-size: 28px;
+                font-weight: 700;
+            }}
+            p {{ 
+                color: #555; 
+                font-size: 17px; 
+                line-height: 1.6;
+                margin-bottom: 30px;
+            }}
+            .amount-box {{
+                background: #f9f9f9;
+                padding: 15px;
+                border-radius: 8px;
+                font-weight: bold;
+                color: #92BC13;
+                font-size: 22px;
+                margin-bottom: 30px;
+                border: 1px solid #eee;
+            }}
+            .btn {{ 
+                background: #92BC13; 
+                color: white; 
+                padding: 14px 32px; 
+                text-decoration: none; 
+                border-radius: 8px; 
+                font-weight: bold; 
+                display: inline-block; 
+                transition: background 0.3s ease;
+                font-size: 16px;
+            }}
+            .btn:hover {{
+                background: #7da110;
+            }}
+            .footer-text {{
+                margin-top: 25px;
+                font-size: 14px;
+                color: #888;
+                font-style: italic;
+            }}
+        </style>
+    </head>
+    <body>
+        <div class="card">
+            <div class="icon-circle">
+                <span class="icon-check">✓</span>
+            </div>
+            <h1>Alhamdulillah!</h1>
+            <p>Thank you, <strong>{payment.first_name}</strong>. Your generous contribution has been received.</p>
+            
+            <div class="amount-box">
+                LKR {payment.amount:.2f}
+            </div>
+
+            <a href="https://baithulmal.lk/" class="btn">Return to Home Page</a>
+            
+            <div class="footer-text">
+                May Allah reward you and your family.
+            </div>
+        </div>
+    </body>
+    </html>
+"""
+
+
+def _template_thank_you_html(payment, display_amount):
+    context = rendering.thank_you_email_context(payment, display_amount)
+    return get_template(rendering.THANK_YOU_EMAIL_TEMPLATE).render(context)
+
+
+def _template_success_html(payment):
+    return get_template(rendering.SUCCESS_PAGE_TEMPLATE).render(rendering.success_page_context(payment))
+
+
+def _cached_thank_you_html(payment, display_amount):
+    return rendering.render_thank_you_email(payment, display_amount)[1]
+
+
+class Command(BaseCommand):
+    help = "Compares callback HTML rendering: legacy f-strings, full template render and cached chrome"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=5000)
+
+    def _measure(self, func, payment, iterations):
+        func(payment)  # warm-up
+        started = time.perf_counter()
+        for _ in range(iterations):
+            func(payment)
+        elapsed = (time.perf_counter() - started) / iterations * 1e6
+
+        tracemalloc.start()
+        for _ in range(100):
+            func(payment)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return elapsed, peak
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        payment = SimpleNamespace(
+            first_name="Amina", last_name="Fazil", donation_option="Zakat", donate_to="General",
+            country="Sri Lanka", amount=Decimal("1500.00"),
+        )
+        paths = {
+            "f-string (before)": (_legacy_thank_you_html, _legacy_success_html),
+            "template render": (_template_thank_you_html, _template_success_html),
+            "cached chrome (after)": (_cached_thank_you_html, rendering.render_success_page),
+        }
+
+        rendering.warm_render_cache()
+        self.stdout.write(f"{'path':<24}{'us/callback':>14}{'peak alloc (B)':>18}")
+        for name, (email_func, page_func) in paths.items():
+            def callback(p, email_func=email_func, page_func=page_func):
+                email_func(p, p.amount)
+                page_func(p)
+            elapsed, peak = self._measure(callback, payment, iterations)
+            self.stdout.write(f"{name:<24}{elapsed:>14.1f}{peak:>18}")
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.urls import path
+
+from payments import async_views, views
+from payments.gateway import PaymentGateway
+from payments.management.commands.loadtest import percentile
+from payments.models import Payment, ContactMessage
+
+BENCH_EMAIL = "bench.views@example.com"
+HOST = "bench.invalid"
+ENDPOINTS = {"create_payment": "/create/", "payment_callback": "/callback/", "contact_us_view": "/contact/"}
+
+CREATE_FORM = {
+    "first_name": "Bench", "last_name": "Views", "email": BENCH_EMAIL, "phone": "+94 77 123 4567",
+    "amount": "25", "currency_preference": "USD", "donate_to": "General", "country": "Sri Lanka",
+}
+
+
+class LatencyGateway(PaymentGateway):
+    """Stands in for a gateway whose server-side call takes OPTIONS["LATENCY"] seconds."""
+
+    def get_payment_params(self, payment, formatted_amount):
+        time.sleep(self.options.get("LATENCY", 0))
+        return {"payment_url": "https://gateway.invalid/", "params": {"amount": formatted_amount}}
+
+
+def urlconf(module):
+    """The public views of `module` only, as each PAYMENT_VIEWS_MODE deploys them."""
+    urls = ModuleType(f"{module.__name__}_bench_urls")
+    urls.urlpatterns = [path(url[1:], getattr(module, name)) for name, url in ENDPOINTS.items()]
+    return urls
+
+
+def async_middleware():
+    """MIDDLEWARE as PAYMENT_VIEWS_MODE=async configures it (see core.settings)."""
+    return [name for name in settings.MIDDLEWARE if name != "whitenoise.middleware.WhiteNoiseMiddleware"]
+
+
+def chain_kind(handler):
+    """"native" when every middleware runs on the event loop, "thread hop" when one is sync-only."""
+    return "thread hop" if type(handler._middleware_chain).__name__ == "SyncToAsync" else "native"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the sync and async payment views at the same worker count, through WSGIHandler and "
+        "ASGIHandler with the project MIDDLEWARE: sync workers serve one request at a time, async workers "
+        "run an event loop with --concurrency requests in flight. "
+        "Writes (and afterwards deletes) rows in the configured database: use a local or test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400, help="Requests per endpoint and mode")
+        parser.add_argument("--workers", type=int, default=4, help="Sync worker threads / async event loops")
+        parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests per async worker")
+        parser.add_argument("--io-latency", type=float, default=0.02, help="Seconds of simulated gateway I/O per create_payment")
+        parser.add_argument("--output", help="Write the JSON report to this file as well")
+
+    def requests_for(self, endpoint, total, order_ids):
+        """(method, path, query string, form body) per request."""
+        if endpoint == "create_payment":
+            return [("POST", "/create/", "", urlencode(CREATE_FORM))] * total
+        if endpoint == "payment_callback":
+            # Each payment is notified twice (browser return + server notification); decline codes keep side effects out
+            return [
+                ("GET", "/callback/", urlencode({"order_id": order_ids[i // 2], "status_code": "05"}), "")
+                for i in range(total)
+            ]
+        return [("POST", "/contact/", "", urlencode({"name": "Bench", "email": BENCH_EMAIL, "message": "Hello"}))] * total
+
+    def run_sync(self, requests_, workers):
+        handler = WSGIHandler()
+        factory = RequestFactory(SERVER_NAME=HOST)
+
+        def one(spec):
+            method, path_, query, body = spec
+            request = factory.generic(
+                method, path_ + (f"?{query}" if query else ""), body, "application/x-www-form-urlencoded",
+            )
+            status = []
+            started = time.perf_counter()
+            response = handler(request.environ, lambda code, headers, *exc: status.append(int(code[:3])))
+            try:
+                b"".join(response)
+            finally:
+                # What the WSGI server does: request_finished, which closes obsolete DB connections
+                response.close()
+            return time.perf_counter() - started, status[0] < 400
+
+        with ThreadPoolExecutor(workers) as pool:
+            return list(pool.map(one, requests_))
+
+    def run_async(self, requests_, workers, concurrency):
+        handler = ASGIHandler()
+
+        async def one(spec, slots):
+            method, path_, query, body = spec
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+                "scheme": "http", "path": path_, "raw_path": path_.encode(), "query_string": query.encode(),
+                "root_path": "", "server": (HOST, 80), "client": ("127.0.0.1", 40000),
+                "headers": [
+                    (b"host", HOST.encode()),
+                    (b"content-type", b"application/x-www-form-urlencoded"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+            messages = [{"type": "http.request", "body": body.encode(), "more_body": False}]
+            done = asyncio.Event()
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # The client stays connected until the response is complete
+                await done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    status.append(message["status"])
+                elif not message.get("more_body"):
+                    done.set()
+
+            async with slots:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return time.perf_counter() - started, status[0] < 400
+
+        def worker(batch):
+            async def main():
+                slots = asyncio.Semaphore(concurrency)
+                return await asyncio.gather(*(one(spec, slots) for spec in batch))
+            return asyncio.run(main())
+
+        with ThreadPoolExecutor(workers) as pool:
+            batches = pool.map(worker, [requests_[w::workers] for w in range(workers)])
+            return [result for batch in batches for result in batch]
+
+    def measure(self, run):
+        started = time.perf_counter()
+        results = run()
+        wall = time.perf_counter() - started
+        latencies = sorted(elapsed for elapsed, _ in results)
+        return {
+            "requests": len(results),
+            "errors": sum(1 for _, ok in results if not ok),
+            "rps": round(len(results) / wall, 1) if wall else None,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        }
+
+    def handle(self, *args, **options):
+        total, workers, concurrency = options["requests"], options["workers"], options["concurrency"]
+        gateways = {"default": {
+            "BACKEND": "payments.management.commands.bench_views.LatencyGateway",
+            "OPTIONS": {"LATENCY": options["io_latency"]},
+        }}
+        report = {
+            "config": {
+                "requests": total, "workers": workers, "async_concurrency": concurrency,
+                "io_latency_s": options["io_latency"], "database": connection.vendor,
+            },
+            "endpoints": {},
+        }
+        modes = (
+            ("sync", urlconf(views), settings.MIDDLEWARE, lambda reqs: self.run_sync(reqs, workers)),
+            ("async", urlconf(async_views), async_middleware(), lambda reqs: self.run_async(reqs, workers, concurrency)),
+        )
+        bench_settings = dict(
+            PAYMENT_GATEWAYS=gateways, THROTTLE_ENABLED=False, PAYMENT_COALESCE_SECONDS=0,
+            ALLOWED_HOSTS=[HOST], SECURE_SSL_REDIRECT=False,
+        )
+        try:
+            with override_settings(**bench_settings, MIDDLEWARE=async_middleware()):
+                report["config"]["asgi_middleware_chain"] = chain_kind(ASGIHandler())
+            for endpoint in ENDPOINTS:
+                results = report["endpoints"][endpoint] = {}
+                for mode, mode_urls, middleware, run in modes:
+                    order_ids = []
+                    if endpoint == "payment_callback":
+                        Payment.objects.filter(email=BENCH_EMAIL).update(status="Pending")
+                        order_ids = list(Payment.objects.filter(email=BENCH_EMAIL).values_list("transaction_id", flat=True)[:(total + 1) // 2])
+                        if len(order_ids) * 2 < total:
+                            self.stderr.write("Not enough benchmark payments for the callback run")
+                            continue
+                    requests_ = self.requests_for(endpoint, total, order_ids)
+                    with override_settings(**bench_settings, ROOT_URLCONF=mode_urls, MIDDLEWARE=middleware):
+                        results[mode] = self.measure(lambda: run(requests_))
+                if "sync" in results and "async" in results and results["sync"]["rps"]:
+                    results["async_speedup"] = round(results["async"]["rps"] / results["sync"]["rps"], 2)
+        finally:
+            Payment.objects.filter(email=BENCH_EMAIL).delete()
+            ContactMessage.objects.filter(email=BENCH_EMAIL).delete()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
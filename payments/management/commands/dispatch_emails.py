@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.outbox import dispatch_pending
+
+
+class Command(BaseCommand):
+    help = "Delivers queued outbox emails over one reused SMTP connection"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--loop", action="store_true", help="Keep running and poll the outbox")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = dispatch_pending(batch_size=options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,60 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.imports import format_for, import_stream, open_text, run_pending_jobs
+from payments.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports offline donations from a CSV or JSON Lines file (see payments.imports for the columns), "
+        "or with --jobs the files staff uploaded to /payments/api/imports/"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", help="File to import")
+        parser.add_argument("--format", choices=[f for f, _ in ImportJob.FORMAT_CHOICES], help="Default: from the file extension")
+        parser.add_argument("--batch-size", type=int, help="Rows per bulk_create / transaction (default IMPORT_BATCH_SIZE)")
+        parser.add_argument("--errors", help="Write every rejected row to this JSON Lines file")
+        parser.add_argument("--jobs", action="store_true", help="Import queued uploads instead of a file")
+        parser.add_argument("--loop", action="store_true", help="With --jobs: keep running and poll for new uploads")
+        parser.add_argument("--interval", type=float, default=5.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        if options["jobs"]:
+            while True:
+                processed = run_pending_jobs(options["batch_size"])
+                if processed:
+                    self.stdout.write(f"Processed {processed} import job(s)")
+                if not options["loop"]:
+                    return
+                time.sleep(options["interval"])
+
+        path = options["path"]
+        if not path:
+            raise CommandError("Give a file to import, or --jobs")
+        file_format = options["format"] or format_for(path)
+        if not file_format:
+            raise CommandError("Unknown file type: use --format csv|jsonl")
+
+        errors_out = open(options["errors"], "w", encoding="utf-8") if options["errors"] else None
+        on_error = (lambda entry: errors_out.write(json.dumps(entry) + "\n")) if errors_out else None
+        started = time.perf_counter()
+        try:
+            with open_text(path) as stream:
+                result = import_stream(stream, file_format, options["batch_size"], on_error)
+        finally:
+            if errors_out:
+                errors_out.close()
+        elapsed = time.perf_counter() - started
+
+        for entry in result.errors[:20]:
+            self.stderr.write(f"Line {entry['line']}: {entry['error']}")
+        if result.rejected > 20:
+            self.stderr.write(f"... {result.rejected - 20} more rejected row(s)")
+        rate = result.rows / elapsed if elapsed else 0
+        self.stdout.write(
+            f"{result.rows} row(s): {result.imported} imported, {result.rejected} rejected in {elapsed:.1f}s ({rate:.0f} rows/s)"
+        )
@@ -0,0 +1,88 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# What a gunicorn worker does before it serves: load the WSGI app, then the URLconf on its first request
+BOOT = """
+import os, resource, time
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+from django.core.{handler} import get_{handler}_application
+application = get_{handler}_application()
+if {urls}:
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+print(time.perf_counter() - started, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+# Optional or heavy packages worth calling out by name
+WATCH = ("reportlab", "PIL", "Crypto", "requests", "psycopg2", "whitenoise", "corsheaders")
+
+
+def parse_importtime(stderr):
+    """[(module, depth, self_us, cumulative_us)] from `python -X importtime` output."""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append((module, (len(indent) - 1) // 2, int(self_us), int(cumulative_us)))
+    return imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures worker boot in fresh interpreters (python -X importtime): wall time, max RSS, "
+        "the slowest top-level imports and whether the packages in WATCH were loaded"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5, help="Boots to time (the median is reported)")
+        parser.add_argument("--top", type=int, default=15, help="Top-level imports to list")
+        parser.add_argument("--asgi", action="store_true", help="Boot core.asgi's handler instead of WSGI")
+        parser.add_argument("--no-urls", action="store_true", help="Stop before the URLconf is loaded")
+        parser.add_argument("--output", help="Write the JSON report to this file as well")
+
+    def boot(self, snippet, importtime=False):
+        command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", snippet]
+        done = subprocess.run(command, capture_output=True, text=True, env=os.environ.copy())
+        if done.returncode:
+            raise CommandError(f"Worker boot failed:\n{done.stderr[-2000:]}")
+        seconds, max_rss_kb = done.stdout.split()[-2:]
+        return float(seconds), int(max_rss_kb), done.stderr
+
+    def handle(self, *args, **options):
+        snippet = BOOT.format(handler="asgi" if options["asgi"] else "wsgi", urls=not options["no_urls"])
+        boots = [self.boot(snippet) for _ in range(max(1, options["repeat"]))]
+        # A separate boot for the import tree: -X importtime itself slows the interpreter down
+        _, _, stderr = self.boot(snippet, importtime=True)
+        imports = parse_importtime(stderr)
+
+        top_level = sorted((i for i in imports if i[1] == 0), key=lambda i: -i[3])
+        loaded = {module.split(".")[0] for module, *_ in imports}
+        report = {
+            "handler": "asgi" if options["asgi"] else "wsgi",
+            "urls_loaded": not options["no_urls"],
+            "boot_ms_median": round(statistics.median(b[0] for b in boots) * 1000, 1),
+            "boot_ms_min": round(min(b[0] for b in boots) * 1000, 1),
+            "max_rss_mb": round(statistics.median(b[1] for b in boots) / 1024, 1),
+            "modules_imported": len(imports),
+            "import_ms_total": round(sum(i[2] for i in imports) / 1000, 1),
+            "watched_packages": {name: name in loaded for name in WATCH},
+            "slowest_top_level": [
+                {"module": module, "cumulative_ms": round(cumulative / 1000, 1), "self_ms": round(self_us / 1000, 1)}
+                for module, _, self_us, cumulative in top_level[:options["top"]]
+            ],
+        }
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
@@ -0,0 +1,198 @@
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.core.signals import request_started, request_finished
+from django.db import connection
+from django.test.testcases import LiveServerThread
+
+from payments.models import Payment
+
+ENDPOINTS = {
+    # name: (method, path, needs staff session)
+    "create_payment": ("POST", "/payments/create/", False),
+    "payment_callback": ("GET", "/payments/callback/", False),
+    "dashboard_stats": ("GET", "/payments/api/stats/", True),
+    "donations_list": ("GET", "/payments/api/donations/", True),
+    "donations_search": ("GET", "/payments/api/donations/search/?q=amina", True),
+    "failed_donations_list": ("GET", "/payments/api/donations/failed/", True),
+    "contact_messages_list": ("GET", "/payments/api/messages/", True),
+}
+
+CREATE_FORM = {
+    "first_name": "Load", "last_name": "Test", "email": "load.test@example.com", "phone": "+94 77 123 4567",
+    "amount": "25", "currency_preference": "USD", "donate_to": "General", "country": "Sri Lanka",
+}
+
+
+class QueryCounter:
+    """Counts DB queries per request path when the server runs in this process."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def _wrapper(self, execute, sql, params, many, context):
+        self.local.queries += 1
+        return execute(sql, params, many, context)
+
+    def started(self, sender, environ=None, **kwargs):
+        self.local.queries = 0
+        self.local.path = environ.get("PATH_INFO", "") if environ else ""
+        if self._wrapper not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self._wrapper)
+
+    def finished(self, sender, **kwargs):
+        path = getattr(self.local, "path", None)
+        if path is None:
+            return
+        with self.lock:
+            self.counts.setdefault(path, []).append(self.local.queries)
+        self.local.path = None
+
+    def connect(self):
+        request_started.connect(self.started, dispatch_uid="loadtest_started")
+        request_finished.connect(self.finished, dispatch_uid="loadtest_finished")
+
+    def per_request(self, path):
+        counts = self.counts.get(path.split("?")[0])
+        return round(statistics.mean(counts), 2) if counts else None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drives the payment and dashboard endpoints with a concurrent HTTP client and prints "
+        "p50/p95/p99 latency, requests/s and DB queries per request as JSON. "
+        "Writes rows into the configured database: use a local or test database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="Comma separated subset of: " + ", ".join(ENDPOINTS))
+        parser.add_argument("--url", help="Target an already running server instead of an in-process one (no query counts)")
+        parser.add_argument("--username", default="loadtest", help="Staff user for the dashboard endpoints (created if missing)")
+        parser.add_argument("--output", help="Write the JSON report to this file as well")
+
+    def staff_session(self, username):
+        user, created = get_user_model().objects.get_or_create(username=username, defaults={"is_staff": True})
+        if created:
+            user.set_unusable_password()
+            user.save()
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = "django.contrib.auth.backends.ModelBackend"
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.create()
+        return session.session_key
+
+    def run_endpoint(self, http, base_url, name, total, concurrency, order_ids):
+        method, path, _ = ENDPOINTS[name]
+        latencies, errors = [], 0
+        lock = threading.Lock()
+
+        def one(i):
+            nonlocal errors
+            kwargs = {"timeout": 30}
+            if name == "create_payment":
+                kwargs["data"] = CREATE_FORM
+            elif name == "payment_callback":
+                kwargs["params"] = {"order_id": order_ids[i % len(order_ids)] if order_ids else "missing", "status_code": "00"}
+            started = time.perf_counter()
+            try:
+                response = http.request(method, base_url + path, **kwargs)
+                ok = response.status_code < 400
+                if ok and name == "create_payment":
+                    with lock:
+                        order_ids.append(response.json()["params"]["callback_id"])
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            list(pool.map(one, range(total)))
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            "requests": total,
+            "errors": errors,
+            "rps": round(total / wall, 1) if wall else None,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        }
+
+    def handle(self, *args, **options):
+        names = [n.strip() for n in options["endpoints"].split(",") if n.strip()]
+        unknown = set(names) - set(ENDPOINTS)
+        if unknown:
+            self.stderr.write(f"Unknown endpoint(s): {', '.join(sorted(unknown))}")
+            return
+
+        server = counter = None
+        base_url = options["url"]
+        if not base_url:
+            counter = QueryCounter()
+            counter.connect()
+            # Same threaded WSGI server the Django test runner uses for LiveServerTestCase
+            server = LiveServerThread("localhost", lambda app: app)
+            server.daemon = True
+            server.start()
+            server.is_ready.wait()
+            if server.error:
+                raise server.error
+            base_url = f"http://localhost:{server.port}"
+            settings.ALLOWED_HOSTS = [*settings.ALLOWED_HOSTS, "localhost"]
+            # Every request comes from one IP and email: measure the views, not the throttle
+            settings.THROTTLE_ENABLED = False
+            settings.PAYMENT_COALESCE_SECONDS = 0
+
+        http = requests.Session()
+        # Keep-alive pool at least as large as the worker count
+        http.mount("http://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=options["concurrency"]))
+        http.cookies.set(settings.SESSION_COOKIE_NAME, self.staff_session(options["username"]))
+
+        order_ids = list(Payment.objects.filter(status="Pending").values_list("transaction_id", flat=True)[:1000])
+        report = {
+            "config": {
+                "requests": options["requests"], "concurrency": options["concurrency"], "base_url": base_url,
+                "database": connection.vendor,
+            },
+            "endpoints": {},
+        }
+        try:
+            for name in names:
+                result = self.run_endpoint(http, base_url, name, options["requests"], options["concurrency"], order_ids)
+                result["queries_per_request"] = counter.per_request(ENDPOINTS[name][1]) if counter else None
+                report["endpoints"][name] = result
+        finally:
+            if server:
+                server.terminate()
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
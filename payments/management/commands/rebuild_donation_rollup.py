@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from payments.rollup import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = "Rebuilds DonationDailyRollup from successful payments (all history, or a date range)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start-date", help="YYYY-MM-DD, first day to rebuild")
+        parser.add_argument("--end-date", help="YYYY-MM-DD, last day to rebuild")
+
+    def handle(self, *args, **options):
+        dates = {}
+        for name in ("start_date", "end_date"):
+            value = options[name]
+            dates[name] = parse_date(value) if value else None
+            if value and dates[name] is None:
+                raise CommandError(f"Invalid {name.replace('_', '-')}: {value}")
+        written = rebuild_rollup(**dates)
+        self.stdout.write(f"Wrote {written} rollup bucket(s)")
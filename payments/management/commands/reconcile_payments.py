@@ -0,0 +1,32 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from payments.reconcile import reconcile_pending
+
+
+class Command(BaseCommand):
+    help = "Settles stale Pending payments by asking the gateway for their status (resumes an unfinished pass)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, help="Minutes a payment must have been Pending (default: RECONCILE_PENDING_AFTER_MINUTES)")
+        parser.add_argument("--abandon-after", type=int, help="Hours after which an unknown checkout is abandoned (default: RECONCILE_ABANDON_AFTER_HOURS)")
+        parser.add_argument("--batch-size", type=int, help="Payments per batch (default: RECONCILE_BATCH_SIZE)")
+        parser.add_argument("--workers", type=int, help="Concurrent gateway queries (default: RECONCILE_WORKERS)")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches; the next run resumes")
+        parser.add_argument("--restart", action="store_true", help="Ignore an unfinished checkpoint and start a new pass")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        checkpoint = reconcile_pending(
+            batch_size=options["batch_size"],
+            workers=options["workers"],
+            older_than=timedelta(minutes=options["older_than"]) if options["older_than"] else None,
+            abandon_after=timedelta(hours=options["abandon_after"]) if options["abandon_after"] else None,
+            max_batches=options["max_batches"],
+            restart=options["restart"],
+        )
+        counts = ", ".join(f"{outcome} {n}" for outcome, n in checkpoint.counts.items())
+        state = "finished" if checkpoint.finished_at else "paused (run again to resume)"
+        self.stdout.write(f"Reconciliation {state} in {time.perf_counter() - started:.1f}s: {counts or 'nothing to do'}")
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.report_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Builds queued PDF/CSV report jobs off the request path"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true", help="Keep running and poll for new jobs")
+        parser.add_argument("--interval", type=float, default=2.0, help="Seconds between polls with --loop")
+
+    def handle(self, *args, **options):
+        while True:
+            processed = run_pending_jobs()
+            if processed:
+                self.stdout.write(f"Processed {processed} report job(s)")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
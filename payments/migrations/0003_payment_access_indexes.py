@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:27
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_emailoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contactmessage',
+            index=models.Index(fields=['-created_at', '-id'], name='contactmsg_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='failedpayment',
+            index=models.Index(fields=['-created_at', '-id'], name='failedpayment_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', '-created_at'], name='payment_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'donate_to'], name='payment_status_donate_to_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-created_at', '-id'], name='payment_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(django.db.models.functions.text.Upper('transaction_id'), name='payment_txn_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0005_callbackevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='currency',
+            field=models.CharField(default='LKR', max_length=3),
+        ),
+        migrations.CreateModel(
+            name='DonationDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('donate_to', models.CharField(blank=True, max_length=200)),
+                ('country', models.CharField(blank=True, max_length=50)),
+                ('currency', models.CharField(default='LKR', max_length=3)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'donate_to', 'country', 'currency'), name='rollup_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:33
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# Frozen copy of payments.search.build_search_text as of this migration, so later changes to the live
+# normaliser never change what it writes
+SEARCH_SOURCE_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'transaction_id')
+WHITESPACE = re.compile(r'\s+')
+
+
+def build_search_text(payment):
+    text = unicodedata.normalize('NFKD', ' '.join(str(getattr(payment, field) or '') for field in SEARCH_SOURCE_FIELDS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return WHITESPACE.sub(' ', text).strip().lower()
+
+
+def backfill_search_text(apps, schema_editor):
+    Payment = apps.get_model('payments', 'Payment')
+    batch = []
+    for payment in Payment.objects.only('pk', *SEARCH_SOURCE_FIELDS).iterator(chunk_size=2000):
+        payment.search_text = build_search_text(payment)
+        batch.append(payment)
+        if len(batch) >= 2000:
+            Payment.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        Payment.objects.bulk_update(batch, ['search_text'])
+
+
+def create_trigram_index(apps, schema_editor):
+    # pg_trgm GIN index serving LIKE '%term%' and similarity ranking; other backends use payments.search.NgramIndex
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS payment_search_trgm_idx ON payments_payment USING gin (search_text gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS payment_search_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_donation_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(backfill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+from django.db.models import F
+from django.utils import timezone
+
+# The constant create_payment converted USD with until now
+LEGACY_LKR_PER_USD = Decimal("308.45")
+
+
+def seed_rates(apps, schema_editor):
+    ExchangeRate = apps.get_model('payments', 'ExchangeRate')
+    Payment = apps.get_model('payments', 'Payment')
+    DonationDailyRollup = apps.get_model('payments', 'DonationDailyRollup')
+
+    usd = ExchangeRate.objects.create(
+        currency='USD', rate=LEGACY_LKR_PER_USD, effective_from=datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+    )
+    Payment.objects.filter(currency='LKR').update(original_amount=F('amount'))
+    DonationDailyRollup.objects.filter(currency='LKR').update(original_total=F('total'))
+
+    # USD rows only kept the converted LKR amount; recover the donor amount from the legacy rate
+    batch = []
+    totals = defaultdict(Decimal)
+    for payment in Payment.objects.filter(currency='USD').iterator(chunk_size=2000):
+        payment.original_amount = (payment.amount / LEGACY_LKR_PER_USD).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        payment.exchange_rate = usd
+        batch.append(payment)
+        if payment.status == 'Success':
+            key = (timezone.localdate(payment.created_at), payment.donate_to, payment.country)
+            totals[key] += payment.original_amount
+        if len(batch) >= 2000:
+            Payment.objects.bulk_update(batch, ['original_amount', 'exchange_rate'])
+            batch = []
+    if batch:
+        Payment.objects.bulk_update(batch, ['original_amount', 'exchange_rate'])
+    for (date, donate_to, country), total in totals.items():
+        DonationDailyRollup.objects.filter(
+            date=date, donate_to=donate_to, country=country, currency='USD'
+        ).update(original_total=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0008_reconcilecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donationdailyrollup',
+            name='original_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='original_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3)),
+                ('rate', models.DecimalField(decimal_places=6, max_digits=14)),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('currency', 'effective_from'), name='exchangerate_unique_version')],
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='exchange_rate',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='payments.exchangerate'),
+        ),
+        migrations.RunPython(seed_rates, migrations.RunPython.noop),
+    ]
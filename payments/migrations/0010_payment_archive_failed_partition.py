@@ -0,0 +1,119 @@
+# Generated by Django 5.2.6 on 2026-10-18 17:46
+
+import django.db.models.deletion
+import logging
+import re
+import unicodedata
+import uuid
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+COPIED_FIELDS = (
+    'transaction_id', 'first_name', 'last_name', 'email', 'phone', 'address_line_one', 'amount',
+    'address_line_two', 'city', 'state', 'postal_code', 'country', 'donation_option', 'donate_to', 'created_at',
+)
+
+# search_text as payments.search built it when this migration was written (the live module may change)
+SEARCH_SOURCE_FIELDS = ('first_name', 'last_name', 'email', 'phone', 'transaction_id')
+WHITESPACE = re.compile(r'\s+')
+
+
+def build_search_text(payment):
+    text = unicodedata.normalize('NFKD', ' '.join(str(getattr(payment, field) or '') for field in SEARCH_SOURCE_FIELDS))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return WHITESPACE.sub(' ', text).strip().lower()
+
+
+def fold_failed_payments(apps, schema_editor):
+    """
+    Legacy FailedPayment rows become Payment rows with status Failed. A failure whose transaction id is
+    already a Pending payment marks that payment Failed; repeats of an id (legacy ids were not unique) are
+    logged and skipped.
+    """
+    FailedPayment = apps.get_model('payments', 'FailedPayment')
+    Payment = apps.get_model('payments', 'Payment')
+    created_at = Payment._meta.get_field('created_at')
+    created_at.auto_now_add = False
+    seen = set()
+    try:
+        batch = []
+        for legacy in FailedPayment.objects.order_by('id').iterator(chunk_size=2000):
+            if legacy.transaction_id in seen:
+                logger.warning(f"Skipping legacy failed payment {legacy.id}: transaction id {legacy.transaction_id} repeated")
+                continue
+            seen.add(legacy.transaction_id)
+            existing = Payment.objects.filter(transaction_id=legacy.transaction_id)
+            if existing.exists():
+                existing.filter(status='Pending').update(status='Failed')
+                continue
+            payment = Payment(status='Failed', original_amount=legacy.amount, **{f: getattr(legacy, f) for f in COPIED_FIELDS})
+            payment.search_text = build_search_text(payment)
+            batch.append(payment)
+            if len(batch) >= 2000:
+                Payment.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Payment.objects.bulk_create(batch)
+    finally:
+        created_at.auto_now_add = True
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0009_exchange_rates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.CharField(default=uuid.uuid4, editable=False, max_length=100, unique=True)),
+                ('first_name', models.CharField(max_length=255)),
+                ('last_name', models.CharField(blank=True, max_length=255)),
+                ('email', models.EmailField(max_length=255)),
+                ('phone', models.CharField(max_length=255)),
+                ('address_line_one', models.CharField(max_length=500)),
+                ('address_line_two', models.CharField(blank=True, max_length=500)),
+                ('city', models.CharField(blank=True, max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('message', models.TextField(blank=True)),
+                ('state', models.CharField(blank=True, max_length=100)),
+                ('postal_code', models.CharField(blank=True, max_length=20)),
+                ('country', models.CharField(blank=True, max_length=50)),
+                ('donation_option', models.CharField(blank=True, max_length=100)),
+                ('donate_to', models.CharField(blank=True, max_length=200)),
+                ('currency', models.CharField(default='LKR', max_length=3)),
+                ('original_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('status', models.CharField(default='Pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('search_text', models.TextField(blank=True, default='', editable=False)),
+                ('exchange_rate', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='payments.exchangerate')),
+            ],
+        ),
+        migrations.RunPython(fold_failed_payments, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='FailedPayment',
+        ),
+        migrations.CreateModel(
+            name='FailedPayment',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('payments.payment',),
+        ),
+        migrations.AddIndex(
+            model_name='paymentarchive',
+            index=models.Index(fields=['created_at', 'id'], name='paymentarchive_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentarchive',
+            index=models.Index(fields=['status', 'donate_to'], name='paymentarchive_status_idx'),
+        ),
+    ]
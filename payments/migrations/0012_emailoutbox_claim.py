@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-18 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0011_importjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='emailoutbox',
+            name='claimed_by',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
@@ -1,7 +1,11 @@
+from django.conf import settings
 from django.db import models
+from django.db.models.functions import Upper
+from django.utils import timezone
 import uuid
 
-class Payment(models.Model):
+class PaymentRecord(models.Model):
+    """Columns shared by the hot Payment table and PaymentArchive."""
     transaction_id = models.CharField(max_length=100, default=uuid.uuid4, unique=True, editable=False)
 
     # Standard Plaintext Fields - No more encryption overhead or signature errors
@@ -21,37 +25,154 @@ class Payment(models.Model):
     country = models.CharField(max_length=50, blank=True)
     donation_option = models.CharField(max_length=100, blank=True)
     donate_to = models.CharField(max_length=200, blank=True)
+    # Currency the donor chose; `amount` is always stored in LKR
+    currency = models.CharField(max_length=3, default="LKR")
+    # What the donor entered, in `currency`, and the rate version used to convert it (see payments.fx)
+    original_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    exchange_rate = models.ForeignKey("ExchangeRate", null=True, blank=True, on_delete=models.PROTECT, related_name="+")
     status = models.CharField(max_length=20, default="Pending")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Normalised name/email/phone/transaction id for donor search (see payments.search)
+    search_text = models.TextField(blank=True, default="", editable=False)
+
+    class Meta:
+        abstract = True
+
+
+class Payment(PaymentRecord):
+    class Meta:
+        indexes = [
+            # Dashboard totals / recent activity / PDF export: status="Success" ordered by date
+            models.Index(fields=["status", "-created_at"], name="payment_status_created_idx"),
+            # Category pie chart: status="Success" grouped by donate_to
+            models.Index(fields=["status", "donate_to"], name="payment_status_donate_to_idx"),
+            # Keyset pagination of donations_list
+            models.Index(fields=["-created_at", "-id"], name="payment_created_id_idx"),
+            # Case-insensitive callback lookup (see Payment.by_transaction_id)
+            models.Index(Upper("transaction_id"), name="payment_txn_upper_idx"),
+        ]
+
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.status}"
 
+    def save(self, *args, **kwargs):
+        from .search import SEARCH_SOURCE_FIELDS, build_search_text
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or set(update_fields) & set(SEARCH_SOURCE_FIELDS):
+            self.search_text = build_search_text(self)
+            if update_fields is not None:
+                kwargs["update_fields"] = set(update_fields) | {"search_text"}
+        super().save(*args, **kwargs)
 
-class FailedPayment(models.Model):
-    transaction_id = models.CharField(max_length=100)
+    @classmethod
+    def by_transaction_id(cls, transaction_id):
+        """Case-insensitive lookup that can use the Upper(transaction_id) index on every backend."""
+        return cls.objects.alias(transaction_id_upper=Upper("transaction_id")).filter(
+            transaction_id_upper=(transaction_id or "").upper()
+        )
 
-    # Standard Plaintext Fields
-    first_name = models.CharField(max_length=255)
-    last_name = models.CharField(max_length=255, blank=True)
-    email = models.EmailField(max_length=255)
-    phone = models.CharField(max_length=255)
-    address_line_one = models.CharField(max_length=500, blank=True)
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
 
-    # Additional Data
-    address_line_two = models.CharField(max_length=255, blank=True)
-    city = models.CharField(max_length=100, blank=True)
-    state = models.CharField(max_length=100, blank=True)
-    postal_code = models.CharField(max_length=20, blank=True)
-    country = models.CharField(max_length=50, blank=True)
-    donation_option = models.CharField(max_length=100, blank=True)
-    donate_to = models.CharField(max_length=200, blank=True)
+class CallbackEvent(models.Model):
+    """
+    One row per distinct WebXPay callback (transaction + status code). Duplicate deliveries
+    (browser return and server notification) only bump `deliveries`.
+    """
+    idempotency_key = models.CharField(max_length=150, unique=True)
+    payment = models.ForeignKey(Payment, on_delete=models.CASCADE, related_name="callbacks")
+    status_code = models.CharField(max_length=10, blank=True)
+    # True when this callback moved the payment to a new status (side effects ran)
+    applied = models.BooleanField(default=False)
+    deliveries = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_seen_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Callback {self.idempotency_key} x{self.deliveries}"
+
+
+class ExchangeRate(models.Model):
+    """
+    LKR per unit of `currency`, valid from `effective_from` until the next row for the currency.
+    Rows are versions: payments keep a reference to the one they were converted with.
+    """
+    currency = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=14, decimal_places=6)
+    effective_from = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["currency", "effective_from"], name="exchangerate_unique_version"),
+        ]
+
+    def __str__(self):
+        return f"1 {self.currency} = {self.rate} LKR from {self.effective_from:%Y-%m-%d %H:%M}"
+
+
+class DonationDailyRollup(models.Model):
+    """
+    Successful donations pre-aggregated per day. Maintained by payments.rollup on every
+    Success transition and rebuilt from Payment with `manage.py rebuild_donation_rollup`.
+    """
+    date = models.DateField()
+    donate_to = models.CharField(max_length=200, blank=True)
+    country = models.CharField(max_length=50, blank=True)
+    currency = models.CharField(max_length=3, default="LKR")
+    count = models.PositiveIntegerField(default=0)
+    # Sum of Payment.amount (LKR)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Sum of Payment.original_amount, in `currency`
+    original_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "donate_to", "country", "currency"], name="rollup_unique_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.donate_to} {self.country} {self.currency}: {self.count}"
+
+
+class FailedPaymentManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(status="Failed")
+
+
+class FailedPayment(Payment):
+    """
+    The Failed status partition of Payment. Failures used to be copied into a separate table;
+    they are now plain Payment rows, so this proxy only scopes queries and the admin.
+    """
+    objects = FailedPaymentManager()
+
+    class Meta:
+        proxy = True
+
     def __str__(self):
         return f"Failed: {self.transaction_id}"
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.status = "Failed"
+        super().save(*args, **kwargs)
+
+
+class PaymentArchive(PaymentRecord):
+    """
+    Settled payments from closed-out months, moved out of Payment in bulk by
+    `manage.py archive_payments` (ids are kept). Read together with Payment through payments.archive.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="paymentarchive_created_idx"),
+            models.Index(fields=["status", "donate_to"], name="paymentarchive_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Archived payment {self.transaction_id} - {self.status}"
+
 
 class ContactMessage(models.Model):
     name = models.CharField(max_length=255)
@@ -60,5 +181,137 @@ class ContactMessage(models.Model):
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["-created_at", "-id"], name="contactmsg_created_id_idx")]
+
     def __str__(self):
         return f"Message from {self.name}"
+
+
+class EmailOutbox(models.Model):
+    """Outgoing emails queued by the request path and delivered by `manage.py dispatch_emails`."""
+    STATUS_PENDING = "Pending"
+    # Claimed by a dispatcher, which is sending it outside any transaction
+    STATUS_SENDING = "Sending"
+    STATUS_SENT = "Sent"
+    STATUS_FAILED = "Failed"
+
+    payment = models.ForeignKey(Payment, null=True, blank=True, on_delete=models.SET_NULL, related_name="emails")
+    subject = models.CharField(max_length=255)
+    from_email = models.CharField(max_length=255)
+    to_email = models.EmailField(max_length=255)
+    text_body = models.TextField(blank=True)
+    html_body = models.TextField(blank=True)
+
+    # Delivery tracking
+    status = models.CharField(max_length=20, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # The dispatch run holding a Sending row, and since when (see outbox.claim_batch)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"Email to {self.to_email} - {self.status}"
+
+
+class ReportJob(models.Model):
+    """A PDF/CSV export built off the request path by `manage.py run_report_jobs`."""
+    STATUS_PENDING = "Pending"
+    STATUS_RUNNING = "Running"
+    STATUS_DONE = "Done"
+    STATUS_FAILED = "Failed"
+
+    FORMAT_PDF = "pdf"
+    FORMAT_CSV = "csv"
+    FORMAT_CSV_GZ = "csv.gz"
+    FORMAT_CHOICES = [(FORMAT_PDF, "PDF"), (FORMAT_CSV, "CSV"), (FORMAT_CSV_GZ, "CSV (gzip)")]
+
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_PDF)
+    filters = models.JSONField(default=dict, blank=True)
+    # Hash of format + filters, so identical requests can share an artefact
+    cache_key = models.CharField(max_length=64, db_index=True)
+    # Snapshot of the matching payments when the job was queued (see report_jobs.data_fingerprint)
+    fingerprint = models.CharField(max_length=128, blank=True)
+
+    status = models.CharField(max_length=20, default=STATUS_PENDING)
+    progress = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(default=0)
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"], name="reportjob_status_created_idx")]
+
+    def __str__(self):
+        return f"Report {self.pk} ({self.format}) - {self.status}"
+
+    @property
+    def percent(self):
+        if self.status == self.STATUS_DONE:
+            return 100
+        return int(self.progress * 100 / self.total_rows) if self.total_rows else 0
+
+
+class ImportJob(models.Model):
+    """An uploaded CSV/JSONL file of offline donations, imported by `manage.py import_donations --jobs`."""
+    STATUS_PENDING = "Pending"
+    STATUS_RUNNING = "Running"
+    STATUS_DONE = "Done"
+    STATUS_FAILED = "Failed"
+
+    FORMAT_CSV = "csv"
+    FORMAT_JSONL = "jsonl"
+    FORMAT_CHOICES = [(FORMAT_CSV, "CSV"), (FORMAT_JSONL, "JSON Lines")]
+
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default=FORMAT_CSV)
+    original_name = models.CharField(max_length=255, blank=True)
+    file_path = models.CharField(max_length=500)
+
+    status = models.CharField(max_length=20, default=STATUS_PENDING)
+    rows = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    # The first IMPORT_MAX_REPORTED_ERRORS bad rows as {"line": n, "error": "..."}
+    errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "created_at"], name="importjob_status_created_idx")]
+
+    def __str__(self):
+        return f"Import {self.pk} ({self.original_name}) - {self.status}"
+
+
+class ReconcileCheckpoint(models.Model):
+    """
+    Progress of a `manage.py reconcile_payments` pass over stale Pending payments.
+    An unfinished checkpoint is resumed from (last_created_at, last_id) with the same cutoff.
+    """
+    name = models.CharField(max_length=50, unique=True, default="pending")
+    # Payments created before this are in scope for the pass
+    cutoff = models.DateTimeField()
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_id = models.BigIntegerField(default=0)
+    counts = models.JSONField(default=dict, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        state = "finished" if self.finished_at else "in progress"
+        return f"Reconcile {self.name} ({state})"
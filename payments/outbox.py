@@ -0,0 +1,161 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import EmailOutbox
+from .profiling import span
+from .rendering import render_thank_you_email
+
+logger = logging.getLogger(__name__)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue_email(subject, to_email, html_body="", text_body="", from_email=None, payment=None):
+    """Stores an email in the outbox. Delivery happens later in dispatch_pending()."""
+    return EmailOutbox.objects.create(
+        payment=payment,
+        subject=subject,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to_email=to_email,
+        text_body=text_body,
+        html_body=html_body,
+    )
+
+
+@span("send_thank_you_email")
+def send_thank_you_email(payment, display_amount):
+    """
+    Queues a formatted thank you email to the donor matching the requested UI.
+    Delivery happens off the request path in `manage.py dispatch_emails`.
+    """
+    subject, html_content = render_thank_you_email(payment, display_amount)
+    from_email = settings.EMAIL_HOST_USER
+    return enqueue_email(subject, payment.email, html_body=html_content, from_email=from_email, payment=payment)
+
+
+def _build_message(item, connection):
+    message = EmailMultiAlternatives(item.subject, item.text_body, item.from_email, [item.to_email], connection=connection)
+    if item.html_body:
+        message.attach_alternative(item.html_body, "text/html")
+    return message
+
+
+def _retry_delay(attempts):
+    """Exponential backoff: base, 2*base, 4*base ... capped at EMAIL_OUTBOX_RETRY_MAX_SECONDS."""
+    base = _setting("EMAIL_OUTBOX_RETRY_BASE_SECONDS", 60)
+    cap = _setting("EMAIL_OUTBOX_RETRY_MAX_SECONDS", 3600)
+    return timedelta(seconds=min(base * 2 ** (attempts - 1), cap))
+
+
+def _claimable(now):
+    """Due Pending rows, and Sending rows whose dispatcher has held them past EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS."""
+    stale = now - timedelta(seconds=_setting("EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS", 600))
+    return EmailOutbox.objects.filter(
+        Q(status=EmailOutbox.STATUS_PENDING, next_attempt_at__lte=now)
+        | Q(status=EmailOutbox.STATUS_SENDING, claimed_at__lt=stale)
+    )
+
+
+def claim_batch(owner, batch_size=None):
+    """
+    Marks up to batch_size due emails Sending for `owner` in a short transaction (rows locked with
+    skip_locked, so several dispatchers can run side by side) and returns them.
+    """
+    batch_size = batch_size or _setting("EMAIL_OUTBOX_BATCH_SIZE", 50)
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            _claimable(now).select_for_update(skip_locked=True).order_by("next_attempt_at", "id")[:batch_size]
+        )
+        for item in batch:
+            item.status = EmailOutbox.STATUS_SENDING
+            item.claimed_by = owner
+            item.claimed_at = now
+        if batch:
+            EmailOutbox.objects.bulk_update(batch, ["status", "claimed_by", "claimed_at"])
+    return batch
+
+
+def dispatch_batch(connection, batch_size=None):
+    """
+    Claims one batch of due emails, sends them over an already opened connection with no transaction
+    or row lock held, then records the results. A dispatcher that dies mid-batch leaves its rows Sending
+    until the claim times out and another sends them again (delivery is at least once).
+    Returns (sent, failed) counts for the batch.
+    """
+    max_attempts = _setting("EMAIL_OUTBOX_MAX_ATTEMPTS", 5)
+    owner = uuid.uuid4().hex
+    batch = claim_batch(owner, batch_size)
+    sent = failed = 0
+
+    for item in batch:
+        item.attempts += 1
+        item.status = EmailOutbox.STATUS_PENDING
+        item.claimed_by, item.claimed_at = "", None
+        try:
+            with span("smtp_send"):
+                _build_message(item, connection).send(fail_silently=False)
+        except Exception as e:
+            logger.error(f"Outbox email {item.pk} failed (attempt {item.attempts}): {e}")
+            item.last_error = str(e)
+            if item.attempts >= max_attempts:
+                item.status = EmailOutbox.STATUS_FAILED
+            else:
+                item.next_attempt_at = timezone.now() + _retry_delay(item.attempts)
+            failed += 1
+        else:
+            item.status = EmailOutbox.STATUS_SENT
+            item.sent_at = timezone.now()
+            item.last_error = ""
+            sent += 1
+
+    if batch:
+        with transaction.atomic():
+            # Rows whose claim timed out and were taken by another dispatcher are left to it
+            still_ours = set(
+                EmailOutbox.objects.select_for_update()
+                .filter(pk__in=[item.pk for item in batch], claimed_by=owner)
+                .values_list("pk", flat=True)
+            )
+            EmailOutbox.objects.bulk_update(
+                [item for item in batch if item.pk in still_ours],
+                ["status", "attempts", "last_error", "next_attempt_at", "sent_at", "claimed_by", "claimed_at"],
+            )
+
+    return sent, failed
+
+
+def dispatch_pending(batch_size=None, connection=None):
+    """
+    Drains every due email, reusing a single SMTP connection for all batches.
+    Returns (sent, failed) totals.
+    """
+    total_sent = total_failed = 0
+    if not _claimable(timezone.now()).exists():
+        # Don't open an SMTP session just to find nothing to send
+        return total_sent, total_failed
+
+    connection = connection or get_connection(fail_silently=False)
+
+    connection.open()
+    try:
+        while True:
+            sent, failed = dispatch_batch(connection, batch_size)
+            total_sent += sent
+            total_failed += failed
+            # Failed items are pushed into the future, so an empty batch means drained
+            if sent + failed == 0:
+                break
+    finally:
+        connection.close()
+
+    return total_sent, total_failed
@@ -0,0 +1,119 @@
+import base64
+import heapq
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(created_at, pk):
+    """Opaque cursor for the (created_at, id) position of the last row on a page."""
+    raw = f"{created_at.isoformat()}|{pk}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, pk = raw.rsplit("|", 1)
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(raw)
+        return created_at, int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def get_page_size(request):
+    default = getattr(settings, "DASHBOARD_PAGE_SIZE", 100)
+    maximum = getattr(settings, "DASHBOARD_MAX_PAGE_SIZE", 1000)
+    try:
+        size = int(request.GET.get("page_size", default))
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+def _newest_first(row):
+    return row["created_at"], row["id"]
+
+
+def keyset_page(queryset, fields, cursor=None, page_size=100):
+    """
+    Returns (rows, next_cursor) for newest-first pages ordered by (created_at, id).
+    Each page is a range scan from the cursor, so cost doesn't grow with the page number.
+    `queryset` can also be a tuple of querysets with distinct ids (payments.archive.history), read as one list.
+    """
+    querysets = queryset if isinstance(queryset, tuple) else (queryset,)
+    position = decode_cursor(cursor) if cursor else None
+
+    extra = [f for f in ("id", "created_at") if f not in fields]
+    rows = []
+    for queryset in querysets:
+        queryset = queryset.order_by("-created_at", "-id")
+        if position:
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        rows.extend(queryset.values(*fields, *extra)[:page_size + 1])
+    if len(querysets) > 1:
+        rows = sorted(rows, key=_newest_first, reverse=True)[:page_size + 1]
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+    for row in rows:
+        for f in extra:
+            del row[f]
+    return rows, next_cursor
+
+
+def stream_json_list(queryset, fields, key):
+    """
+    Streams {"<key>": [...]} row by row so memory stays flat for full exports. A tuple of newest-first
+    querysets (payments.archive.history) is merged into one newest-first list.
+    """
+    chunk_size = getattr(settings, "DASHBOARD_STREAM_CHUNK_SIZE", 2000)
+    encoder = DjangoJSONEncoder()
+    # The body is produced after the view returns: fix the read database (see payments.routers) now
+    querysets = [qs.using(qs.db) for qs in (queryset if isinstance(queryset, tuple) else (queryset,))]
+    merged = len(querysets) > 1
+    # Merging needs the ordering columns, dropped again before encoding
+    extra = [f for f in ("id", "created_at") if f not in fields] if merged else []
+
+    def generate():
+        yield f'{{"{key}": ['
+        first = True
+        iterators = [qs.values(*fields, *extra).iterator(chunk_size=chunk_size) for qs in querysets]
+        rows = heapq.merge(*iterators, key=_newest_first, reverse=True) if merged else iterators[0]
+        for row in rows:
+            for f in extra:
+                del row[f]
+            yield ("" if first else ",") + encoder.encode(row)
+            first = False
+        yield "]}"
+
+    return StreamingHttpResponse(generate(), content_type="application/json")
+
+
+def list_response(request, queryset, fields, key):
+    """
+    Shared list endpoint behaviour for the dashboard tables:
+    ?stream=1 streams every row, otherwise a keyset page with ?cursor= and ?page_size=.
+    """
+    if request.GET.get("stream") in ("1", "true"):
+        if isinstance(queryset, tuple):
+            return stream_json_list(tuple(qs.order_by("-created_at", "-id") for qs in queryset), fields, key)
+        return stream_json_list(queryset.order_by("-created_at", "-id"), fields, key)
+
+    try:
+        rows, next_cursor = keyset_page(queryset, fields, request.GET.get("cursor"), get_page_size(request))
+    except InvalidCursor as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({key: rows, "next_cursor": next_cursor})
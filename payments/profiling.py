@@ -0,0 +1,262 @@
+import bisect
+import contextvars
+import cProfile
+import heapq
+import io
+import itertools
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.decorators import sync_and_async_middleware
+
+# Histogram bucket upper bounds
+TIME_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def profiling_enabled():
+    return getattr(settings, "PROFILING_ENABLED", False)
+
+
+class Histogram:
+    def __init__(self, bounds=TIME_BUCKETS_MS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the max for the overflow bucket)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return self.bounds[i] if i < len(self.bounds) else round(self.max, 2)
+        return round(self.max, 2)
+
+    def as_dict(self):
+        labels = [f"<={b}" for b in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 2) if self.count else None,
+            "max": round(self.max, 2),
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": {label: n for label, n in zip(labels, self.buckets) if n},
+        }
+
+
+class Registry:
+    """Per-worker in-memory aggregates, read by the staff profiling endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.views = defaultdict(lambda: {
+                "wall_ms": Histogram(),
+                "db_ms": Histogram(),
+                "queries": Histogram(QUERY_BUCKETS),
+            })
+            self.spans = defaultdict(Histogram)
+            self.slowest = []  # min-heap of (wall_ms, seq, profile dict)
+            self.seq = itertools.count()
+            self.started_at = time.time()
+
+    def record_request(self, view, wall_ms, db_ms, queries, spans):
+        with self.lock:
+            stats = self.views[view]
+            stats["wall_ms"].add(wall_ms)
+            stats["db_ms"].add(db_ms)
+            stats["queries"].add(queries)
+            for name, ms in spans:
+                self.spans[f"{view}:{name}"].add(ms)
+
+    def record_span(self, name, ms):
+        with self.lock:
+            self.spans[name].add(ms)
+
+    def keep_profile(self, wall_ms, profile):
+        keep = getattr(settings, "PROFILING_KEEP_SLOWEST", 10)
+        with self.lock:
+            entry = (wall_ms, next(self.seq), profile)
+            if len(self.slowest) < keep:
+                heapq.heappush(self.slowest, entry)
+            elif wall_ms > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "since": self.started_at,
+                "views": {
+                    view: {name: hist.as_dict() for name, hist in stats.items()}
+                    for view, stats in sorted(self.views.items())
+                },
+                "spans": {name: hist.as_dict() for name, hist in sorted(self.spans.items())},
+                "slowest_profiles": [p for _, _, p in sorted(self.slowest, reverse=True)],
+            }
+
+
+registry = Registry()
+# (name, ms) list of the request being profiled; a context variable so spans in sync_to_async threads count
+_request_spans = contextvars.ContextVar("payments_profiling_spans", default=None)
+
+
+class span:
+    """
+    Times a named block (context manager or decorator). Inside a profiled request the timing is
+    attributed to that view; otherwise it is recorded on its own. No-op unless PROFILING_ENABLED.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter() if profiling_enabled() else None
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is None:
+            return False
+        ms = (time.perf_counter() - self.started) * 1000
+        request_spans = _request_spans.get()
+        if request_spans is not None:
+            request_spans.append((self.name, ms))
+        else:
+            registry.record_span(self.name, ms)
+        return False
+
+    def __call__(self, func):
+        def wrapper(*args, **kwargs):
+            with span(self.name):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+
+class _QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+def _profile_text(profiler):
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(getattr(settings, "PROFILING_TOP_FUNCTIONS", 25))
+    return out.getvalue()
+
+
+class _RequestRun:
+    """One profiled request: query timing on every configured connection from start until finish()."""
+
+    def __init__(self, sample_cprofile):
+        self.timer = _QueryTimer()
+        self.spans = []
+        self.token = _request_spans.set(self.spans)
+        self.profiler = cProfile.Profile() if sample_cprofile and random.random() < getattr(
+            settings, "PROFILING_CPROFILE_SAMPLE_RATE", 0.0) else None
+        self.stack = ExitStack()
+        # Every alias, not only the open ones: a connection first used by this request is timed too
+        for conn in connections.all():
+            self.stack.enter_context(conn.execute_wrapper(self.timer))
+        if self.profiler:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiler is already active in this thread
+                self.profiler = None
+        self.started = time.perf_counter()
+
+    def view_returned(self, request, response):
+        if self.profiler:
+            self.profiler.disable()
+        _request_spans.reset(self.token)
+        if response is not None and response.streaming:
+            response._resource_closers.append(lambda: self.finish(request))
+        else:
+            self.finish(request)
+
+    def finish(self, request):
+        self.stack.close()
+        wall_ms = (time.perf_counter() - self.started) * 1000
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else request.path
+        registry.record_request(view, wall_ms, self.timer.seconds * 1000, self.timer.count, self.spans)
+        if self.profiler:
+            registry.keep_profile(wall_ms, {
+                "view": view,
+                "path": request.get_full_path(),
+                "wall_ms": round(wall_ms, 2),
+                "queries": self.timer.count,
+                "stats": _profile_text(self.profiler),
+            })
+
+
+@sync_and_async_middleware
+class ProfilingMiddleware:
+    """
+    Opt-in (PROFILING_ENABLED) per-request wall time, DB query count/time and named spans,
+    aggregated per view into histograms. A PROFILING_CPROFILE_SAMPLE_RATE fraction of requests
+    also runs under cProfile and the slowest of those keep their stats text (WSGI only: under ASGI
+    the view runs in another thread than the one cProfile would trace).
+
+    A streamed response is recorded when it is closed, so the queries run while its body is
+    consumed are counted and its wall time covers the whole body.
+    """
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        run, response = _RequestRun(sample_cprofile=True), None
+        try:
+            response = self.get_response(request)
+        finally:
+            run.view_returned(request, response)
+        return response
+
+    async def __acall__(self, request):
+        run, response = _RequestRun(sample_cprofile=False), None
+        try:
+            response = await self.get_response(request)
+        finally:
+            run.view_returned(request, response)
+        return response
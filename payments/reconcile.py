@@ -0,0 +1,161 @@
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .callbacks import SUCCESS_STATUS_CODE, on_payment_success
+from .changelist import refresh_filter_choices
+from .gateway import GatewayError, StatusQueryUnsupported, select_gateway
+from .models import Payment, ReconcileCheckpoint
+
+logger = logging.getLogger(__name__)
+
+OUTCOMES = ("checked", "succeeded", "failed", "abandoned", "unknown", "unsupported", "errors")
+
+
+def stale_batches(cutoff, batch_size, after=None):
+    """
+    Yields batches of Pending payments created before `cutoff`, oldest first, keyset paginated
+    on (created_at, id) so the (status, created_at) index serves each page.
+    """
+    base = Payment.objects.filter(status="Pending", created_at__lt=cutoff).order_by("created_at", "id")
+    while True:
+        queryset = base
+        if after:
+            last_created_at, last_id = after
+            queryset = queryset.filter(Q(created_at__gt=last_created_at) | Q(created_at=last_created_at, id__gt=last_id))
+        batch = list(queryset[:batch_size])
+        if not batch:
+            return
+        yield batch
+        after = (batch[-1].created_at, batch[-1].pk)
+
+
+def _query(payment):
+    """(payment, status_code, error) from the gateway the payment would have been sent to."""
+    try:
+        gateway = select_gateway(currency=payment.currency, appeal=payment.donate_to)
+        if not gateway.supports_status_query:
+            return payment, None, StatusQueryUnsupported(f"{gateway.name} has no status API")
+        return payment, gateway.query_status(payment.transaction_id), None
+    except GatewayError as e:
+        return payment, None, e
+
+
+def query_statuses(payments, workers):
+    """Status queries for a batch, at most `workers` in flight over the pooled gateway session."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_query, payments))
+
+
+def apply_batch(results, abandon_before):
+    """
+    Applies one batch of gateway answers in a single transaction with one bulk_update.
+    Rows a callback settled meanwhile are left alone.
+    Returns a dict of outcome counts.
+    """
+    counts = dict.fromkeys(OUTCOMES, 0)
+    counts["checked"] = len(results)
+    new_status = {}
+    abandoned = set()
+    for payment, status_code, error in results:
+        if isinstance(error, StatusQueryUnsupported):
+            # Left Pending for its callback: nothing to ask, and nothing wrong with the gateway
+            counts["unsupported"] += 1
+        elif error is not None:
+            logger.warning(f"Reconcile: status query for {payment.transaction_id} failed: {error}")
+            counts["errors"] += 1
+        elif status_code == SUCCESS_STATUS_CODE:
+            new_status[payment.pk] = "Success"
+        elif status_code:
+            new_status[payment.pk] = "Failed"
+        elif payment.created_at < abandon_before:
+            # The gateway never saw this checkout: the donor left before paying
+            new_status[payment.pk] = "Failed"
+            abandoned.add(payment.pk)
+        else:
+            counts["unknown"] += 1
+
+    if not new_status:
+        return counts
+
+    with transaction.atomic():
+        # Lock what is still Pending; a callback that got there first wins
+        locked = list(
+            Payment.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=new_status, status="Pending")
+            .order_by("pk")
+        )
+        for payment in locked:
+            payment.status = new_status[payment.pk]
+        Payment.objects.bulk_update(locked, ["status"])
+        # bulk_update skips the post_save receiver that keeps the admin status filter current
+        transaction.on_commit(functools.partial(refresh_filter_choices, *locked))
+
+        for payment in locked:
+            if payment.status == "Success":
+                on_payment_success(payment)
+                counts["succeeded"] += 1
+            elif payment.pk in abandoned:
+                counts["abandoned"] += 1
+            else:
+                counts["failed"] += 1
+    return counts
+
+
+def get_checkpoint(older_than, restart=False, name="pending"):
+    """The unfinished checkpoint to resume, or a fresh one with cutoff now - older_than."""
+    checkpoint = ReconcileCheckpoint.objects.filter(name=name).first()
+    if checkpoint and not checkpoint.finished_at and not restart:
+        return checkpoint
+    cutoff = timezone.now() - older_than
+    if checkpoint:
+        checkpoint.cutoff = cutoff
+        checkpoint.last_created_at = None
+        checkpoint.last_id = 0
+        checkpoint.counts = {}
+        checkpoint.started_at = timezone.now()
+        checkpoint.finished_at = None
+        checkpoint.save()
+        return checkpoint
+    return ReconcileCheckpoint.objects.create(name=name, cutoff=cutoff)
+
+
+def reconcile_pending(batch_size=None, workers=None, older_than=None, abandon_after=None,
+                      max_batches=None, restart=False):
+    """
+    Settles Pending payments whose callback never arrived: "00" from the gateway becomes Success
+    (with the usual email / rollup side effects), any other code Failed, and checkouts the gateway
+    has no record of after `abandon_after` are abandoned (Failed, so they list under FailedPayment).
+    Progress is checkpointed after every batch; stopping after `max_batches` leaves it resumable.
+    Returns the checkpoint.
+    """
+    batch_size = batch_size or settings.RECONCILE_BATCH_SIZE
+    workers = workers or settings.RECONCILE_WORKERS
+    older_than = older_than or timedelta(minutes=settings.RECONCILE_PENDING_AFTER_MINUTES)
+    abandon_after = abandon_after or timedelta(hours=settings.RECONCILE_ABANDON_AFTER_HOURS)
+
+    checkpoint = get_checkpoint(older_than, restart)
+    abandon_before = timezone.now() - abandon_after
+    after = (checkpoint.last_created_at, checkpoint.last_id) if checkpoint.last_created_at else None
+    counts = {outcome: checkpoint.counts.get(outcome, 0) for outcome in OUTCOMES}
+
+    for done, batch in enumerate(stale_batches(checkpoint.cutoff, batch_size, after), start=1):
+        batch_counts = apply_batch(query_statuses(batch, workers), abandon_before)
+        for outcome, n in batch_counts.items():
+            counts[outcome] += n
+        checkpoint.last_created_at = batch[-1].created_at
+        checkpoint.last_id = batch[-1].pk
+        checkpoint.counts = counts
+        checkpoint.save(update_fields=["last_created_at", "last_id", "counts", "updated_at"])
+        if max_batches and done >= max_batches:
+            return checkpoint
+
+    checkpoint.finished_at = timezone.now()
+    checkpoint.save(update_fields=["finished_at", "updated_at"])
+    return checkpoint
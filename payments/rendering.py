@@ -0,0 +1,106 @@
+import re
+import threading
+
+from django.dispatch import receiver
+from django.template.loader import get_template
+from django.utils.autoreload import file_changed
+from django.utils.html import conditional_escape
+from django.utils.timezone import now as tz_now
+
+THANK_YOU_EMAIL_TEMPLATE = "payments/emails/thank_you.html"
+SUCCESS_PAGE_TEMPLATE = "payments/payment_success.html"
+
+# Per-donation fields interpolated into each template. Everything else is static chrome.
+TEMPLATE_FIELDS = {
+    THANK_YOU_EMAIL_TEMPLATE: (
+        "full_name", "ref_no", "donation_option", "donate_to", "country", "date_display", "amount_display",
+    ),
+    SUCCESS_PAGE_TEMPLATE: ("first_name", "amount_display"),
+}
+
+_MARKER = "\x00{}\x00"
+_MARKER_RE = re.compile("\x00(\\w+)\x00")
+
+# template name -> list of alternating [static, field, static, field, ..., static]
+_chrome_cache = {}
+_chrome_lock = threading.Lock()
+
+
+def _compile_chrome(template_name):
+    """Renders the template once with markers in place of every field and splits it into static chunks."""
+    markers = {field: _MARKER.format(field) for field in TEMPLATE_FIELDS[template_name]}
+    return _MARKER_RE.split(get_template(template_name).render(markers))
+
+
+def _get_chrome(template_name):
+    parts = _chrome_cache.get(template_name)
+    if parts is None:
+        with _chrome_lock:
+            parts = _chrome_cache.get(template_name)
+            if parts is None:
+                parts = _chrome_cache[template_name] = _compile_chrome(template_name)
+    return parts
+
+
+def render_cached(template_name, context):
+    """
+    Equivalent to get_template(template_name).render(context) for plain {{ field }} templates,
+    but only escapes and joins the per-donation values into the pre-rendered chrome.
+    """
+    parts = _get_chrome(template_name)
+    out = parts[:]
+    for i in range(1, len(out), 2):
+        out[i] = conditional_escape(context[out[i]])
+    return "".join(out)
+
+
+def warm_render_cache():
+    """Compiles (through the cached template loader) and pre-renders every template. Called at startup."""
+    for template_name in TEMPLATE_FIELDS:
+        _get_chrome(template_name)
+
+
+def clear_render_cache():
+    with _chrome_lock:
+        _chrome_cache.clear()
+
+
+@receiver(file_changed, dispatch_uid="payments_render_cache_reset")
+def _template_file_changed(sender, file_path, **kwargs):
+    # runserver keeps the process alive for template edits, so drop stale chrome
+    if file_path.suffix == ".html":
+        clear_render_cache()
+
+
+def thank_you_email_context(payment, display_amount, now=None):
+    now = now or tz_now()
+    return {
+        "full_name": f"{payment.first_name} {payment.last_name}".strip(),
+        "ref_no": f"CBF-{payment.first_name.replace(' ', '')}{payment.last_name.replace(' ', '')}-{now.strftime('%Y%m%d%H%M')}",
+        "donation_option": payment.donation_option,
+        "donate_to": payment.donate_to,
+        "country": payment.country,
+        # Formatting date/time to match the screenshot (DD/MM/YYYY | HH:MM)
+        "date_display": now.strftime('%d/%m/%Y | %H:%M'),
+        # Use LKR as the base currency for display
+        "amount_display": f"LKR {display_amount:.2f}",
+    }
+
+
+def render_thank_you_email(payment, display_amount, now=None):
+    """Returns (subject, html_content) for the donor thank you email."""
+    now = now or tz_now()
+    subject = f"CEYLON BAITHULMAL FUND | YOUR DONATION | {now.strftime('%d/%m/%Y')} | {now.strftime('%H:%M')}"
+    context = thank_you_email_context(payment, display_amount, now)
+    return subject, render_cached(THANK_YOU_EMAIL_TEMPLATE, context)
+
+
+def success_page_context(payment):
+    return {
+        "first_name": payment.first_name,
+        "amount_display": f"LKR {payment.amount:.2f}",
+    }
+
+
+def render_success_page(payment):
+    return render_cached(SUCCESS_PAGE_TEMPLATE, success_page_context(payment))
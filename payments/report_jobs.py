@@ -0,0 +1,253 @@
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .archive import history_count, history_summary
+from .models import Payment, PaymentArchive, ReportJob
+from .reports import DonationReport, report_lookups, report_rows
+from .routers import analytics_reads
+
+logger = logging.getLogger(__name__)
+
+FILTER_NAMES = ("start_date", "end_date", "category")
+REPORT_DATA_VERSION_CACHE_KEY = "payments:report_data_version"
+
+
+def normalise_filters(filters):
+    """Keeps only known, non-empty filters (dates as YYYY-MM-DD strings) so equal requests hash equally."""
+    return {name: str(filters[name]) for name in FILTER_NAMES if filters.get(name)}
+
+
+def job_cache_key(report_format, filters):
+    raw = json.dumps([report_format, filters], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _filter_args(filters):
+    return (
+        parse_date(filters["start_date"]) if filters.get("start_date") else None,
+        parse_date(filters["end_date"]) if filters.get("end_date") else None,
+        filters.get("category"),
+    )
+
+
+def _data_version():
+    version = cache.get(REPORT_DATA_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(REPORT_DATA_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(REPORT_DATA_VERSION_CACHE_KEY)
+    return version
+
+
+def invalidate_report_artefacts():
+    """New data version, so no finished job is reused; called after writes that skip save() (imports, archiving)."""
+    cache.set(REPORT_DATA_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+@receiver(post_save, sender=Payment, dispatch_uid="payments_report_data_save")
+@receiver(post_delete, sender=Payment, dispatch_uid="payments_report_data_delete")
+@receiver(post_save, sender=PaymentArchive, dispatch_uid="payments_report_data_save_archive")
+@receiver(post_delete, sender=PaymentArchive, dispatch_uid="payments_report_data_delete_archive")
+def _report_data_changed(sender, instance, **kwargs):
+    # Only successful donations appear in reports (a status change away from Success changes the count)
+    if instance.status == "Success":
+        invalidate_report_artefacts()
+
+
+def data_fingerprint(filters):
+    """
+    The report rows' count, sum and highest id, plus the data version. The aggregates change when a matching
+    payment is added or succeeds; the version when one is edited, deleted or archived.
+    """
+    count, total, last = history_summary(**report_lookups(*_filter_args(filters)))
+    return f"{count}:{total}:{last}:{_data_version()}"
+
+
+def artefact_dir():
+    return getattr(settings, "REPORT_ARTEFACT_DIR", os.path.join(settings.MEDIA_ROOT, "reports"))
+
+
+def request_report(report_format, filters, user=None):
+    """
+    Returns a ReportJob for the export: a finished job whose artefact is still current,
+    an identical job already queued/running, or a newly queued one.
+    """
+    filters = normalise_filters(filters)
+    cache_key = job_cache_key(report_format, filters)
+    fingerprint = data_fingerprint(filters)
+
+    existing = (
+        ReportJob.objects.filter(cache_key=cache_key, fingerprint=fingerprint)
+        .exclude(status=ReportJob.STATUS_FAILED)
+        .order_by("-created_at")
+        .first()
+    )
+    if existing and (existing.status != ReportJob.STATUS_DONE or os.path.exists(existing.file_path)):
+        return existing
+
+    return ReportJob.objects.create(
+        format=report_format, filters=filters, cache_key=cache_key, fingerprint=fingerprint,
+        requested_by=user if user and user.is_authenticated else None,
+    )
+
+
+def reclaim_stale_jobs(now=None):
+    """
+    Queues again the jobs Running for more than REPORT_JOB_STALE_SECONDS (their worker died or was
+    restarted mid-build). Returns how many were reclaimed.
+    """
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.REPORT_JOB_STALE_SECONDS)
+    stale = ReportJob.objects.filter(status=ReportJob.STATUS_RUNNING, started_at__lt=cutoff)
+    reclaimed = stale.update(status=ReportJob.STATUS_PENDING, started_at=None, progress=0)
+    if reclaimed:
+        logger.warning(f"Re-queued {reclaimed} report job(s) stuck in Running")
+    remove_orphaned_artefacts(cutoff)
+    return reclaimed
+
+
+def remove_orphaned_artefacts(cutoff):
+    """
+    Deletes files in REPORT_ARTEFACT_DIR last written before `cutoff` that no finished job points at:
+    half written .part files of dead workers and artefacts of jobs deleted or superseded meanwhile.
+    Returns how many were removed.
+    """
+    try:
+        names = os.listdir(artefact_dir())
+    except FileNotFoundError:
+        return 0
+    kept = set(
+        ReportJob.objects.filter(status=ReportJob.STATUS_DONE).exclude(file_path="").values_list("file_path", flat=True)
+    )
+    removed = 0
+    for name in names:
+        path = os.path.join(artefact_dir(), name)
+        try:
+            # Recent files may belong to a build that has not recorded its file_path yet
+            if path in kept or os.path.getmtime(path) >= cutoff.timestamp():
+                continue
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed += 1
+    if removed:
+        logger.info(f"Removed {removed} orphaned report artefact(s)")
+    return removed
+
+
+def remove_superseded_artefacts(job):
+    """Deletes the files of earlier finished jobs for the same format and filters, once `job`'s is in place."""
+    earlier = ReportJob.objects.filter(
+        cache_key=job.cache_key, status=ReportJob.STATUS_DONE, pk__lt=job.pk,
+    ).exclude(file_path="")
+    for pk, path in earlier.values_list("pk", "file_path"):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        ReportJob.objects.filter(pk=pk).update(file_path="")
+
+
+def claim_next_job():
+    """Marks the oldest pending job Running and returns it (None when the queue is empty)."""
+    with transaction.atomic():
+        job = (
+            ReportJob.objects.select_for_update(skip_locked=True)
+            .filter(status=ReportJob.STATUS_PENDING)
+            .order_by("created_at", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJob.STATUS_RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+    return job
+
+
+def _track_progress(job, rows):
+    """Passes rows through, saving job.progress every REPORT_PROGRESS_EVERY rows."""
+    every = getattr(settings, "REPORT_PROGRESS_EVERY", 1000)
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % every == 0:
+            ReportJob.objects.filter(pk=job.pk).update(progress=done)
+    job.progress = done
+
+
+def _write_csv(out, rows):
+    writer = csv.writer(out)
+    writer.writerow(["Date", "First Name", "Last Name", "Category", "Amount"])
+    for created_at, first_name, last_name, donate_to, amount in rows:
+        writer.writerow([created_at.isoformat(), first_name, last_name, donate_to, f"{amount:.2f}"])
+
+
+def build_artefact(job):
+    """Writes the export for `job` to REPORT_ARTEFACT_DIR and returns the file path."""
+    start_date, end_date, category = _filter_args(job.filters)
+    rows = _track_progress(job, report_rows(start_date, end_date, category))
+
+    os.makedirs(artefact_dir(), exist_ok=True)
+    path = os.path.join(artefact_dir(), f"{job.cache_key}-{job.pk}.{job.format}")
+    tmp_path = path + ".part"
+
+    if job.format == ReportJob.FORMAT_PDF:
+        with open(tmp_path, "wb") as out:
+            DonationReport(out, subtitle=" | ".join(job.filters.values())).build(rows)
+    elif job.format == ReportJob.FORMAT_CSV_GZ:
+        with gzip.open(tmp_path, "wt", newline="", encoding="utf-8") as out:
+            _write_csv(out, rows)
+    else:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as out:
+            _write_csv(out, rows)
+
+    # Rename only when complete so a download never sees a half written file
+    os.replace(tmp_path, path)
+    return path
+
+
+def run_job(job):
+    # The export's reads run on the analytics database; job bookkeeping is written to default
+    with analytics_reads():
+        job.total_rows = history_count(**report_lookups(*_filter_args(job.filters)))
+    ReportJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+    try:
+        with analytics_reads():
+            job.file_path = build_artefact(job)
+    except Exception as e:
+        logger.exception(f"Report job {job.pk} failed")
+        job.status = ReportJob.STATUS_FAILED
+        job.error = str(e)
+    else:
+        job.status = ReportJob.STATUS_DONE
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "progress", "total_rows", "file_path", "error", "finished_at"])
+    if job.status == ReportJob.STATUS_DONE:
+        remove_superseded_artefacts(job)
+    return job
+
+
+def run_pending_jobs():
+    """Runs queued jobs (and stale ones, see reclaim_stale_jobs) until none are left. Returns how many were processed."""
+    reclaim_stale_jobs()
+    processed = 0
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return processed
+        run_job(job)
+        processed += 1
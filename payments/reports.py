@@ -0,0 +1,145 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .archive import history_values
+from .profiling import span
+from .stats import day_start
+
+REPORT_COLUMNS = ('created_at', 'first_name', 'last_name', 'donate_to', 'amount')
+
+PAGE_TOP = 750
+PAGE_BOTTOM = 50
+ROW_HEIGHT = 20
+
+
+def report_lookups(start_date=None, end_date=None, category=None):
+    """Successful donations for the report, filtered on an index-friendly created_at range."""
+    lookups = {"status": "Success"}
+    if start_date:
+        lookups["created_at__gte"] = day_start(start_date)
+    if end_date:
+        lookups["created_at__lt"] = day_start(end_date + timedelta(days=1))
+    if category:
+        lookups["donate_to"] = category
+    return lookups
+
+
+def report_rows(start_date=None, end_date=None, category=None):
+    """Streams only the report columns as tuples, newest first, chunk by chunk (recent and archived payments)."""
+    chunk_size = getattr(settings, "REPORT_CHUNK_SIZE", 2000)
+    lookups = report_lookups(start_date, end_date, category)
+    return history_values(*REPORT_COLUMNS, order_by='-created_at', **lookups).iterator(chunk_size=chunk_size)
+
+
+class DonationReport:
+    """
+    Draws the donation report one row at a time onto a reportlab canvas.
+    Per-category subtotals are accumulated while drawing and printed after the last row.
+    """
+
+    def __init__(self, out, subtitle=""):
+        # reportlab (and Pillow under it) loads on the first report, not at worker boot
+        from reportlab.lib.pagesizes import letter
+        from reportlab.pdfgen import canvas
+
+        # pageCompression keeps finished pages small while the document is being built
+        self.canvas = canvas.Canvas(out, pagesize=letter, pageCompression=1)
+        self.subtitle = subtitle
+        self.page = 1
+        self.y = PAGE_TOP
+        self.subtotals = {}
+        self.count = 0
+        self.total = Decimal("0")
+
+    def draw_header(self):
+        p = self.canvas
+        p.setFont("Helvetica-Bold", 16)
+        p.drawString(100, 750, "CEYLON BAITHULMAL FUND - DONATION REPORT")
+        p.setFont("Helvetica", 10)
+        p.drawString(100, 735, f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M')}")
+        if self.subtitle:
+            p.drawString(350, 735, self.subtitle)
+        p.line(100, 730, 550, 730)
+        self.y = 700
+
+    def draw_column_titles(self):
+        p = self.canvas
+        p.setFont("Helvetica-Bold", 9)
+        p.drawString(100, self.y, "Date")
+        p.drawString(180, self.y, "Donor Name")
+        p.drawString(350, self.y, "Category")
+        p.drawString(480, self.y, "Amount")
+        p.setFont("Helvetica", 8)
+
+    def new_page(self):
+        p = self.canvas
+        p.setFont("Helvetica", 8)
+        p.drawString(500, 30, f"Page {self.page}")
+        p.showPage()
+        self.page += 1
+        self.y = PAGE_TOP
+        self.draw_column_titles()
+
+    def next_line(self):
+        self.y -= ROW_HEIGHT
+        if self.y < PAGE_BOTTOM:
+            self.new_page()
+            self.y -= ROW_HEIGHT
+
+    def add_row(self, created_at, first_name, last_name, donate_to, amount):
+        self.next_line()
+        p = self.canvas
+        p.drawString(100, self.y, created_at.strftime('%Y-%m-%d'))
+        p.drawString(180, self.y, f"{first_name} {last_name}")
+        p.drawString(350, self.y, donate_to)
+        p.drawString(480, self.y, f"{amount:.2f}")
+
+        count, subtotal = self.subtotals.get(donate_to, (0, Decimal("0")))
+        self.subtotals[donate_to] = (count + 1, subtotal + amount)
+        self.count += 1
+        self.total += amount
+
+    def draw_subtotals(self):
+        p = self.canvas
+        self.next_line()
+        self.next_line()
+        p.setFont("Helvetica-Bold", 9)
+        p.drawString(100, self.y, "Category Subtotals")
+        p.setFont("Helvetica", 8)
+        for donate_to in sorted(self.subtotals):
+            count, subtotal = self.subtotals[donate_to]
+            self.next_line()
+            p.drawString(180, self.y, f"{donate_to or 'Unspecified'} ({count})")
+            p.drawString(480, self.y, f"{subtotal:.2f}")
+        self.next_line()
+        p.setFont("Helvetica-Bold", 9)
+        p.drawString(180, self.y, f"Total ({self.count})")
+        p.drawString(480, self.y, f"{self.total:.2f}")
+
+    def build(self, rows):
+        self.draw_header()
+        self.draw_column_titles()
+        for row in rows:
+            self.add_row(*row)
+        self.draw_subtotals()
+        p = self.canvas
+        p.setFont("Helvetica", 8)
+        p.drawString(500, 30, f"Page {self.page}")
+        p.showPage()
+        p.save()
+        return self
+
+
+def build_donation_report(out, start_date=None, end_date=None, category=None):
+    """Writes the filtered donation report PDF into the file-like `out`. Returns the DonationReport."""
+    parts = []
+    if start_date or end_date:
+        parts.append(f"{start_date or '...'} to {end_date or '...'}")
+    if category:
+        parts.append(category)
+    report = DonationReport(out, subtitle=" | ".join(parts))
+    with span("pdf_report"):
+        return report.build(report_rows(start_date, end_date, category))
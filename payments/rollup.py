@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DonationDailyRollup
+from .stats import day_start
+
+
+# pg_advisory_xact_lock key serialising rebuild_rollup against add_to_rollup
+ROLLUP_LOCK_KEY = 0x524F4C4C  # "ROLL"
+
+
+def _lock_rollup(shared):
+    """
+    Transaction-scoped lock on PostgreSQL: increments share it, a rebuild takes it alone, so a rebuild
+    waits for in-flight successes to commit and later ones wait for the rebuild. SQLite serialises
+    writing transactions on its own.
+    """
+    if connection.vendor == "postgresql":
+        function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT {function}(%s)", [ROLLUP_LOCK_KEY])
+
+
+def rollup_key(payment):
+    return {
+        "date": timezone.localdate(payment.created_at),
+        "donate_to": payment.donate_to,
+        "country": payment.country,
+        "currency": payment.currency,
+    }
+
+
+def add_to_rollup(payment):
+    """
+    Adds one successful payment to its daily bucket (UPDATE, or INSERT on the first of the day).
+    Call it in the transaction that marks the payment Success, so a concurrent rebuild counts it exactly once.
+    """
+    _lock_rollup(shared=True)
+    key = rollup_key(payment)
+    original = payment.amount if payment.original_amount is None else payment.original_amount
+    increments = dict(count=F("count") + 1, total=F("total") + payment.amount, original_total=F("original_total") + original)
+    bucket = DonationDailyRollup.objects.filter(**key)
+    if bucket.update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            DonationDailyRollup.objects.create(count=1, total=payment.amount, original_total=original, **key)
+    except IntegrityError:
+        # Another worker created the bucket between our UPDATE and INSERT
+        bucket.update(**increments)
+
+
+def rebuild_rollup(start_date=None, end_date=None):
+    """
+    Recomputes buckets from successful payments, optionally only for [start_date, end_date].
+    The payments are read and the buckets replaced in one transaction under the rollup lock, so a
+    success committed meanwhile is neither lost nor counted twice; add_to_rollup calls wait for it.
+    Returns the number of buckets written.
+    """
+    from .archive import history
+
+    batch_size = getattr(settings, "ROLLUP_REBUILD_BATCH_SIZE", 1000)
+    lookups = {"status": "Success"}
+    buckets = DonationDailyRollup.objects.all()
+    if start_date:
+        lookups["created_at__gte"] = day_start(start_date)
+        buckets = buckets.filter(date__gte=start_date)
+    if end_date:
+        lookups["created_at__lt"] = day_start(end_date + timedelta(days=1))
+        buckets = buckets.filter(date__lte=end_date)
+
+    written = 0
+    with transaction.atomic():
+        _lock_rollup(shared=False)
+        # Hot and archived payments can share a day (a payment settled after its month was archived)
+        merged = {}
+        for payments in history(**lookups):
+            rows = (
+                payments.annotate(date=TruncDate("created_at"))
+                .values("date", "donate_to", "country", "currency")
+                .annotate(count=Count("id"), total=Sum("amount"), original_total=Sum(Coalesce("original_amount", "amount")))
+                .order_by()
+            )
+            for row in rows.iterator(chunk_size=batch_size):
+                key = (row["date"], row["donate_to"], row["country"], row["currency"])
+                if key in merged:
+                    for field in ("count", "total", "original_total"):
+                        merged[key][field] += row[field]
+                else:
+                    merged[key] = row
+
+        buckets.delete()
+        batch = []
+        for row in merged.values():
+            batch.append(DonationDailyRollup(**row))
+            if len(batch) >= batch_size:
+                DonationDailyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        if batch:
+            DonationDailyRollup.objects.bulk_create(batch)
+            written += len(batch)
+    return written
@@ -0,0 +1,167 @@
+"""
+Database routing: reads made inside `analytics_reads` (the dashboard, exports and admin lists) go to the
+settings.DB_ANALYTICS_ALIAS connection when it is configured; every write and every other read uses default,
+so the payment flow never depends on the analytics database.
+
+The analytics database is usually a replica, so reads fall back to default
+- while it is more than DB_ANALYTICS_MAX_LAG_SECONDS behind (PostgreSQL standbys; checked per worker), and
+- for the rest of a request that wrote, then for DB_ANALYTICS_MAX_LAG_SECONDS through the PIN_COOKIE set by
+  PrimaryPinningMiddleware, so a client reads its own writes.
+"""
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "db_pin"
+
+_read_alias = contextvars.ContextVar("payments_read_alias", default=None)
+# The current request's Pin (set by PrimaryPinningMiddleware)
+_pin = contextvars.ContextVar("payments_db_pin", default=None)
+# alias -> (checked at, lag seconds), per worker
+_lag_checks = {}
+
+LAG_SQL = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+           ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END
+"""
+
+
+class Pin:
+    def __init__(self, pinned=False):
+        # Reads go to default: the client wrote within the last DB_ANALYTICS_MAX_LAG_SECONDS
+        self.pinned = pinned
+        self.wrote = False
+
+
+def analytics_alias():
+    """The analytics connection alias, or None when DATABASES has none."""
+    alias = getattr(settings, "DB_ANALYTICS_ALIAS", None)
+    return alias if alias in connections.settings else None
+
+
+def replica_lag(alias):
+    """
+    Seconds `alias` is behind default, rechecked every DB_ANALYTICS_LAG_CHECK_SECONDS. 0 for anything but
+    a PostgreSQL standby (including a caught up one); infinite when the database cannot be reached.
+    """
+    checked_at, lag = _lag_checks.get(alias, (None, 0.0))
+    now = time.monotonic()
+    if checked_at is not None and now - checked_at < settings.DB_ANALYTICS_LAG_CHECK_SECONDS:
+        return lag
+    conn = connections[alias]
+    lag = 0.0
+    if conn.vendor == "postgresql":
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_is_in_recovery()")
+                if cursor.fetchone()[0]:
+                    cursor.execute(LAG_SQL)
+                    lag = float(cursor.fetchone()[0])
+        except DatabaseError as e:
+            logger.warning(f"Analytics database {alias} unavailable, reading from default: {e}")
+            lag = float("inf")
+    _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def read_alias():
+    """Where reads go right now: the analytics alias, or None for default."""
+    alias = _read_alias.get()
+    pin = _pin.get()
+    if alias is None or (pin and (pin.pinned or pin.wrote)):
+        return None
+    return alias
+
+
+@contextmanager
+def analytics_reads():
+    """Routes reads to the analytics database (when there is one, and it is not lagging) for the block."""
+    alias = analytics_alias()
+    if alias and replica_lag(alias) > settings.DB_ANALYTICS_MAX_LAG_SECONDS:
+        alias = None
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def use_analytics_db(view):
+    """View decorator: the view's reads run on the analytics database. Lazy querysets (streamed bodies) must be pinned with .using()."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        with analytics_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+class AnalyticsRouter:
+    def db_for_read(self, model, **hints):
+        # None falls through to default
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        pin = _pin.get()
+        if pin:
+            pin.wrote = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The analytics database holds the same rows as default
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # It follows default's schema through replication
+        if db == getattr(settings, "DB_ANALYTICS_ALIAS", None):
+            return False
+        return None
+
+
+@sync_and_async_middleware
+class PrimaryPinningMiddleware:
+    """
+    Read-your-writes for the analytics router: a request carrying PIN_COOKIE reads from default, and a
+    request that writes sets the cookie for DB_ANALYTICS_MAX_LAG_SECONDS. Runs natively under WSGI and ASGI.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pin = Pin(pinned=PIN_COOKIE in request.COOKIES)
+        token = _pin.set(pin)
+        try:
+            response = self.get_response(request)
+        finally:
+            _pin.reset(token)
+        return self.process_response(pin, response)
+
+    async def __acall__(self, request):
+        # Sync views downstream run in a copy of this context, so they share the same Pin
+        pin = Pin(pinned=PIN_COOKIE in request.COOKIES)
+        token = _pin.set(pin)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _pin.reset(token)
+        return self.process_response(pin, response)
+
+    def process_response(self, pin, response):
+        if pin.wrote and analytics_alias():
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=settings.DB_ANALYTICS_MAX_LAG_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
@@ -0,0 +1,226 @@
+import heapq
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .archive import history, history_values
+from .models import Payment
+
+SEARCH_SOURCE_FIELDS = ("first_name", "last_name", "email", "phone", "transaction_id")
+NGRAM = 3
+SEARCH_INDEX_VERSION_CACHE_KEY = "payments:search_index_version"
+
+_whitespace = re.compile(r"\s+")
+
+
+def normalise(text):
+    """Lowercase, accents stripped, whitespace collapsed: the form stored in Payment.search_text."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _whitespace.sub(" ", text).strip().lower()
+
+
+def build_search_text(payment):
+    return normalise(" ".join(str(getattr(payment, field) or "") for field in SEARCH_SOURCE_FIELDS))
+
+
+def _ngrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + NGRAM] for i in range(len(padded) - NGRAM + 1)}
+
+
+class NgramIndex:
+    """
+    In-process trigram index over search_text of Payment and PaymentArchive (archived rows keep their
+    ids) for backends without pg_trgm (SQLite and development runs; PostgreSQL deployments use the
+    gin_trgm_ops index instead).
+    Kept current in this process through the post_save / post_delete receivers below; other workers
+    rebuild theirs once they see the new version in the shared cache, or after PAYMENT_SEARCH_INDEX_TTL.
+    """
+
+    def __init__(self, version=None):
+        self.postings = defaultdict(set)
+        self.texts = {}
+        self.sizes = {}
+        self.lock = threading.Lock()
+        self.version = version
+        self.built_at = self.checked_at = time.monotonic()
+
+    def is_stale(self):
+        """True past PAYMENT_SEARCH_INDEX_TTL, or when any worker has published a change since the build."""
+        now = time.monotonic()
+        if now - self.built_at >= settings.PAYMENT_SEARCH_INDEX_TTL:
+            return True
+        if now - self.checked_at >= settings.PAYMENT_SEARCH_INDEX_CHECK_SECONDS:
+            self.checked_at = now
+            return cache.get(SEARCH_INDEX_VERSION_CACHE_KEY) != self.version
+        return False
+
+    def add(self, pk, text):
+        with self.lock:
+            self._remove(pk)
+            self.texts[pk] = text
+            grams = _ngrams(text)
+            self.sizes[pk] = len(grams)
+            for gram in grams:
+                self.postings[gram].add(pk)
+
+    def remove(self, pk):
+        with self.lock:
+            self._remove(pk)
+
+    def _remove(self, pk):
+        old = self.texts.pop(pk, None)
+        if old is not None:
+            del self.sizes[pk]
+            for gram in _ngrams(old):
+                self.postings[gram].discard(pk)
+
+    def search(self, query, limit=None, ranked=True):
+        """
+        Returns [(pk, score)] for rows containing the normalised query, best match first.
+        The score is pg_trgm style similarity: shared / total distinct trigrams.
+        With ranked=False scores are skipped (0.0) and rows come newest id first.
+        """
+        query = normalise(query)
+        if not query:
+            return []
+        # Inner trigrams only: the padded edge grams of the query needn't match inside a longer text
+        grams = {query[i:i + NGRAM] for i in range(len(query) - NGRAM + 1)}
+        with self.lock:
+            if grams:
+                postings = sorted((self.postings.get(g, set()) for g in grams), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+            else:
+                candidates = self.texts.keys()
+            matches = [pk for pk in candidates if query in self.texts[pk]]
+            if not ranked:
+                matches.sort(reverse=True)
+                return [(pk, 0.0) for pk in matches[:limit or None]]
+
+            query_grams = [(g, self.postings.get(g, ())) for g in _ngrams(query)]
+            scored = []
+            for pk in matches:
+                shared = sum(1 for _, posting in query_grams if pk in posting)
+                scored.append((pk, shared / (len(query_grams) + self.sizes[pk] - shared)))
+        if limit:
+            return heapq.nsmallest(limit, scored, key=lambda item: (-item[1], -item[0]))
+        scored.sort(key=lambda item: (-item[1], -item[0]))
+        return scored
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _index_version():
+    version = cache.get(SEARCH_INDEX_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(SEARCH_INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        version = cache.get(SEARCH_INDEX_VERSION_CACHE_KEY)
+    return version
+
+
+def get_ngram_index():
+    """The per-process index, (re)built from the search_text column on first use and when stale."""
+    global _index
+    index = _index
+    if index is None or index.is_stale():
+        with _index_lock:
+            if _index is index:
+                # Version read before the rows, so a change made during the build triggers another
+                rebuilt = NgramIndex(_index_version())
+                for pk, text in history_values("pk", "search_text").iterator(chunk_size=5000):
+                    rebuilt.add(pk, text)
+                _index = rebuilt
+    return _index
+
+
+def invalidate_search_index():
+    """New version for every worker's index; called on commit of a change and after writes that skip save()."""
+    cache.set(SEARCH_INDEX_VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+
+
+def reset_ngram_index():
+    """Drops this process's index and every other worker's (bulk imports, archiving)."""
+    global _index
+    with _index_lock:
+        _index = None
+    invalidate_search_index()
+
+
+@receiver(post_save, sender=Payment, dispatch_uid="payments_search_index_save")
+def _index_saved_payment(sender, instance, **kwargs):
+    if _index is not None:
+        _index.add(instance.pk, instance.search_text)
+    transaction.on_commit(invalidate_search_index)
+
+
+@receiver(post_delete, sender=Payment, dispatch_uid="payments_search_index_delete")
+def _unindex_deleted_payment(sender, instance, **kwargs):
+    if _index is not None:
+        _index.remove(instance.pk)
+    transaction.on_commit(invalidate_search_index)
+
+
+def search_backend():
+    """PAYMENT_SEARCH_BACKEND: "postgres" (pg_trgm), "ngram" (in-process) or "auto" (by DB vendor)."""
+    backend = getattr(settings, "PAYMENT_SEARCH_BACKEND", "auto")
+    if backend == "auto":
+        return "postgres" if connection.vendor == "postgresql" else "ngram"
+    return backend
+
+
+def filter_search(queryset, query):
+    """Restricts a Payment or PaymentArchive queryset to rows whose search_text contains the query (order unchanged)."""
+    term = normalise(query)
+    if not term:
+        return queryset
+    if search_backend() == "ngram":
+        pks = [pk for pk, _ in get_ngram_index().search(term, ranked=False)]
+        # Huge candidate sets are cheaper as a LIKE scan than a giant IN (...)
+        if len(pks) <= getattr(settings, "PAYMENT_SEARCH_MAX_IN", 1000):
+            return queryset.filter(pk__in=pks)
+    # On PostgreSQL the gin_trgm_ops index serves LIKE '%term%'
+    return queryset.filter(search_text__contains=term)
+
+
+def ranked_search(query, limit=50, fields=("id",)):
+    """Best matches first over recent and archived payments, each row gets a `rank` between 0 and 1."""
+    term = normalise(query)
+    if not term:
+        return []
+    columns = dict.fromkeys(("id",) + tuple(fields))
+    if search_backend() == "postgres":
+        from django.contrib.postgres.search import TrigramSimilarity
+        hot, archived = (
+            queryset.annotate(rank=TrigramSimilarity("search_text", term)).values(*columns, "rank").order_by()
+            for queryset in history(search_text__contains=term)
+        )
+        rows = list(hot.union(archived, all=True).order_by("-rank", "-id")[:limit])
+        if "id" not in fields:
+            for row in rows:
+                del row["id"]
+        return rows
+
+    scored = get_ngram_index().search(term, limit)
+    rows = {}
+    for queryset in history(pk__in=[pk for pk, _ in scored]):
+        rows.update((row["id"], row) for row in queryset.values(*columns))
+    results = []
+    for pk, score in scored:
+        if pk in rows:
+            row = rows[pk]
+            if "id" not in fields:
+                del row["id"]
+            row["rank"] = round(score, 4)
+            results.append(row)
+    return results
@@ -0,0 +1,117 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Payment, FailedPayment, ContactMessage, DonationDailyRollup
+
+DASHBOARD_STATS_CACHE_KEY = "payments:dashboard_stats"
+STATS_SOURCES = ("payments", "rollup")
+
+
+def day_start(value):
+    """Aware datetime for 00:00 of a date in the current timezone."""
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def month_start(now=None):
+    """First instant of the current month, so month filters are plain created_at range scans."""
+    local = timezone.localtime(now or timezone.now())
+    return local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def category_totals(source="payments"):
+    """
+    Per-category all-time and month totals in one GROUP BY, either over the hot Payment table
+    plus the cached archive totals, or over the DonationDailyRollup buckets (cost independent
+    of history size). Returns (categories, currencies, failed): the LKR pie chart rows, all-time
+    totals per donor currency and the number of failed payments.
+    """
+    from .archive import archived_totals
+
+    archived = archived_totals()
+    archived_failed = sum(row['count'] for row in archived if row['status'] == "Failed")
+    if source == "rollup":
+        rows = [
+            dict(row, status="Success") for row in DonationDailyRollup.objects.values('donate_to', 'currency').annotate(
+                value=Sum('total'), month=Sum('total', filter=Q(date__gte=month_start().date())),
+                original=Sum('original_total'),
+            ).order_by()
+        ]
+        failed = FailedPayment.objects.count() + archived_failed
+    else:
+        # Failures ride along in the same GROUP BY for their count
+        rows = list(Payment.objects.filter(status__in=("Success", "Failed")).values('status', 'donate_to', 'currency').annotate(
+            count=Count('id'), value=Sum('amount'), month=Sum('amount', filter=Q(created_at__gte=month_start())),
+            original=Sum(Coalesce('original_amount', 'amount')),
+        ).order_by())
+        failed = sum(row['count'] for row in rows if row['status'] == "Failed") + archived_failed
+        # Archived months are closed out, so they only add to the all-time figures
+        rows += archived
+
+    # Grouped by currency as well, so the original-currency totals come from the same query
+    categories = {}
+    currencies = {}
+    for row in rows:
+        if row['status'] != "Success":
+            continue
+        category = categories.setdefault(row['donate_to'], {'donate_to': row['donate_to'], 'value': Decimal("0"), 'month': Decimal("0")})
+        category['value'] += row['value'] or 0
+        category['month'] += row.get('month') or 0
+        currency = currencies.setdefault(row['currency'], {'currency': row['currency'], 'original': Decimal("0"), 'value': Decimal("0")})
+        currency['original'] += row['original'] or 0
+        currency['value'] += row['value'] or 0
+    return list(categories.values()), sorted(currencies.values(), key=lambda c: c['currency']), failed
+
+
+def compute_dashboard_stats(source="payments"):
+    """
+    Builds the dashboard payload in four queries: one GROUP BY for the category, all-time and
+    month totals and the failed count (conditional aggregation), the archive totals (cached
+    indefinitely), the recent list and the message count. Only the hot Payment table is scanned.
+    """
+    # Per-category totals; the all-time and month totals are their sums
+    categories, currencies, failed = category_totals(source)
+    total_collections = sum((c['value'] or 0 for c in categories), Decimal("0"))
+    month_donations = sum((c.pop('month') or 0 for c in categories), Decimal("0"))
+
+    # Recent Activity (Latest 10 successful donations)
+    recent_activity = list(Payment.objects.filter(status="Success").order_by('-created_at')[:10].values(
+        'created_at', 'first_name', 'donate_to', 'amount', 'transaction_id'
+    ))
+
+    return {
+        "summary": {
+            "total": float(total_collections),
+            "month": float(month_donations),
+            "failed_total": failed,
+            "new_messages": ContactMessage.objects.count(),
+        },
+        "pie_chart": categories,
+        # Donations in the currency the donors gave in ("original") next to the LKR value
+        "currencies": currencies,
+        "recent": recent_activity,
+    }
+
+
+def get_dashboard_stats(source=None):
+    """
+    Cached dashboard payload, refreshed at most every DASHBOARD_STATS_CACHE_TTL seconds.
+    `source` is "payments" or "rollup" (default: DASHBOARD_STATS_SOURCE).
+    """
+    source = source or getattr(settings, "DASHBOARD_STATS_SOURCE", "payments")
+    key = f"{DASHBOARD_STATS_CACHE_KEY}:{source}"
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats(source)
+        cache.set(key, stats, getattr(settings, "DASHBOARD_STATS_CACHE_TTL", 30))
+    return stats
+
+
+def invalidate_dashboard_stats():
+    """Called when a payment turns Success so the next dashboard poll sees it."""
+    cache.delete_many([f"{DASHBOARD_STATS_CACHE_KEY}:{source}" for source in STATS_SOURCES])
@@ -0,0 +1,128 @@
+import random
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.utils import timezone
+
+from .models import Payment, FailedPayment, ContactMessage
+from .search import build_search_text
+
+FIRST_NAMES = ("Amina", "Mohamed", "Fathima", "Ahamed", "Zainab", "Rizwan", "Nuha", "Ismail", "Shifa", "Imran")
+LAST_NAMES = ("Fazil", "Rahman", "Careem", "Marikar", "Hassan", "Jaleel", "Saleem", "Nizar", "Haniffa", "Cassim")
+APPEALS = ("General", "Zakat", "Orphans", "Water Wells", "Education", "Ramadan Food Packs")
+COUNTRIES = ("Sri Lanka", "Sri Lanka", "Sri Lanka", "United Kingdom", "Qatar", "Australia", "Canada")
+DONATION_OPTIONS = ("One-off", "Monthly", "Sadaqah", "Zakat")
+AMOUNTS = (500, 1000, 2500, 5000, 10000, 25000)
+USD_AMOUNTS = (5, 10, 25, 50, 100)
+# Fixed so generated data doesn't depend on the ExchangeRate table
+USD_RATE = Decimal("308.45")
+# Roughly what production looks like: most checkouts complete, some are abandoned
+STATUSES = ("Success",) * 17 + ("Pending",) * 2 + ("Failed",)
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """Lets bulk_create keep the generated created_at instead of auto_now_add overwriting it."""
+    fields = [model._meta.get_field("created_at") for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _created_at(rng, days, now):
+    return now - timedelta(seconds=rng.randrange(max(days, 1) * 86400))
+
+
+def _donor(rng, i):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return {
+        "first_name": first,
+        "last_name": f"{last}{i % 997}",
+        "email": f"{first.lower()}.{last.lower()}{i}@example.com",
+        "phone": f"077{rng.randrange(10**7):07d}",
+    }
+
+
+def synthetic_payments(count, seed=42, days=365):
+    rng = random.Random(seed)
+    now = timezone.now()
+    for i in range(count):
+        if rng.random() < 0.2:
+            currency, original = "USD", Decimal(rng.choice(USD_AMOUNTS))
+            amount = (original * USD_RATE).quantize(Decimal("0.01"))
+        else:
+            currency, original = "LKR", Decimal(rng.choice(AMOUNTS))
+            amount = original
+        payment = Payment(
+            transaction_id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            address_line_one="1 Main Street",
+            amount=amount,
+            original_amount=original,
+            country=rng.choice(COUNTRIES),
+            donation_option=rng.choice(DONATION_OPTIONS),
+            donate_to=rng.choice(APPEALS),
+            currency=currency,
+            status=rng.choice(STATUSES),
+            created_at=_created_at(rng, days, now),
+            **_donor(rng, i),
+        )
+        payment.search_text = build_search_text(payment)
+        yield payment
+
+
+def synthetic_failed_payments(count, seed=43, days=365):
+    rng = random.Random(seed)
+    now = timezone.now()
+    for i in range(count):
+        amount = Decimal(rng.choice(AMOUNTS))
+        payment = FailedPayment(
+            transaction_id=str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            address_line_one="1 Main Street",
+            amount=amount,
+            original_amount=amount,
+            country=rng.choice(COUNTRIES),
+            donation_option=rng.choice(DONATION_OPTIONS),
+            donate_to=rng.choice(APPEALS),
+            # bulk_create skips FailedPayment.save()
+            status="Failed",
+            created_at=_created_at(rng, days, now),
+            **_donor(rng, i),
+        )
+        payment.search_text = build_search_text(payment)
+        yield payment
+
+
+def synthetic_messages(count, seed=44, days=365):
+    rng = random.Random(seed)
+    now = timezone.now()
+    for i in range(count):
+        donor = _donor(rng, i)
+        yield ContactMessage(
+            name=f"{donor['first_name']} {donor['last_name']}",
+            email=donor["email"],
+            phone=donor["phone"],
+            message="Please send me details about the current appeals.",
+            created_at=_created_at(rng, days, now),
+        )
+
+
+def bulk_insert(model, objects, batch_size=5000):
+    """bulk_create in fixed size batches so millions of rows never sit in memory. Returns the row count."""
+    written = 0
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+        written += len(batch)
+    return written
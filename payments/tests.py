@@ -1,3 +1,1564 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from Crypto.PublicKey import RSA
+from django.contrib import admin
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template.loader import get_template
+from django.db import connection, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from payments import (
+    analytics, archive, async_views, changelist, crypto_utils, fx, gateway, imports, profiling, reconcile, rendering, routers,
+    search, throttle,
+)
+from payments.admin import PaymentAdmin
+from payments.fake_gateway import FakeGatewayServer
+from payments.dashboard_views import dashboard_stats, donation_analytics, donations_list, contact_messages_list, export_donations_pdf
+from payments.models import (
+    Payment, FailedPayment, ContactMessage, EmailOutbox, ReportJob, CallbackEvent, DonationDailyRollup,
+    ReconcileCheckpoint, ExchangeRate, PaymentArchive, ImportJob,
+)
+from payments.outbox import enqueue_email, dispatch_pending
+from payments.pagination import encode_cursor, decode_cursor
+from payments.report_jobs import claim_next_job, run_pending_jobs
+from payments.reports import build_donation_report
+from payments.rollup import rebuild_rollup
+from payments.stats import month_start, compute_dashboard_stats
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError("SMTP unavailable")
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+class TransactionRecordingEmailBackend(LocmemEmailBackend):
+    """Records how many atomic blocks are open, and each row's status, while a message is sent."""
+    seen = []
+
+    def send_messages(self, email_messages):
+        for message in email_messages:
+            status = EmailOutbox.objects.get(to_email=message.to[0]).status
+            TransactionRecordingEmailBackend.seen.append((len(connection.atomic_blocks), status))
+        return super().send_messages(email_messages)
+
+
+class StubGateway(gateway.PaymentGateway):
+    def get_payment_params(self, payment, formatted_amount):
+        return {"gateway": self.name, "amount": formatted_amount, "params": self.options}
+
+
+def make_payment(**kwargs):
+    fields = dict(
+        first_name="Amina", last_name="Fazil", email="amina@example.com", phone="0771234567",
+        address_line_one="1 Main St", amount="1500.00", donate_to="General", status="Pending",
+    )
+    fields.update(kwargs)
+    return Payment.objects.create(**fields)
+
+
+class CryptoKeyCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.mkdtemp()
+        cls.key_file = os.path.join(cls.tmp_dir, "public_key.pem")
+        with open(cls.key_file, "wb") as f:
+            f.write(RSA.generate(1024).publickey().export_key())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmp_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        crypto_utils.clear_key_cache()
+        crypto_utils.reset_crypto_stats()
+        override = override_settings(WEBXPAY_PUBLIC_KEY_FILE=self.key_file)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(crypto_utils.clear_key_cache)
+
+    def test_key_is_parsed_once(self):
+        for _ in range(5):
+            crypto_utils.encrypt_payment("abc", "100.00")
+        stats = crypto_utils.get_crypto_stats()
+        self.assertEqual(stats["key_loads"], 1)
+        self.assertEqual(stats["encrypts"], 5)
+
+    def test_key_reloaded_when_file_changes(self):
+        crypto_utils.encrypt_payment("abc", "100.00")
+        stat = os.stat(self.key_file)
+        os.utime(self.key_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        crypto_utils.encrypt_payment("abc", "100.00")
+        self.assertEqual(crypto_utils.get_crypto_stats()["key_loads"], 2)
+
+    def test_missing_key_file(self):
+        with override_settings(WEBXPAY_PUBLIC_KEY_FILE=os.path.join(self.tmp_dir, "missing.pem")):
+            with self.assertRaises(FileNotFoundError):
+                crypto_utils.encrypt_payment("abc", "100.00")
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class EmailOutboxTests(TestCase):
+    def test_callback_only_enqueues(self):
+        payment = make_payment()
+        response = self.client.get("/payments/callback/", {"order_id": payment.transaction_id, "status_code": "00"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        queued = EmailOutbox.objects.get(payment=payment)
+        self.assertEqual(queued.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(queued.to_email, "amina@example.com")
+
+        call_command("dispatch_emails")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Amina Fazil", mail.outbox[0].alternatives[0][0])
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, EmailOutbox.STATUS_SENT)
+        self.assertIsNotNone(queued.sent_at)
+
+    @override_settings(EMAIL_BACKEND="payments.tests.CountingEmailBackend", EMAIL_OUTBOX_BATCH_SIZE=2)
+    def test_batches_share_one_connection(self):
+        CountingEmailBackend.opened = 0
+        for i in range(5):
+            enqueue_email("Hello", f"donor{i}@example.com", html_body="<p>Hi</p>")
+
+        self.assertEqual(dispatch_pending(), (5, 0))
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 5)
+
+    @override_settings(EMAIL_BACKEND="payments.tests.TransactionRecordingEmailBackend")
+    def test_sends_outside_the_claim_transaction(self):
+        TransactionRecordingEmailBackend.seen = []
+        enqueue_email("Hello", "donor@example.com", text_body="Hi")
+        # The test case's own transactions are the only ones open
+        depth = len(connection.atomic_blocks)
+
+        self.assertEqual(dispatch_pending(), (1, 0))
+        self.assertEqual(TransactionRecordingEmailBackend.seen, [(depth, EmailOutbox.STATUS_SENDING)])
+        item = EmailOutbox.objects.get()
+        self.assertEqual((item.status, item.claimed_by, item.claimed_at), (EmailOutbox.STATUS_SENT, "", None))
+
+    @override_settings(EMAIL_OUTBOX_CLAIM_TIMEOUT_SECONDS=600)
+    def test_abandoned_claims_are_sent_again(self):
+        held = enqueue_email("Hello", "held@example.com", text_body="Hi")
+        abandoned = enqueue_email("Hello", "abandoned@example.com", text_body="Hi")
+        EmailOutbox.objects.update(status=EmailOutbox.STATUS_SENDING, claimed_by="other")
+        EmailOutbox.objects.filter(pk=abandoned.pk).update(claimed_at=timezone.now() - timedelta(seconds=601))
+        EmailOutbox.objects.filter(pk=held.pk).update(claimed_at=timezone.now())
+
+        self.assertEqual(dispatch_pending(), (1, 0))
+        self.assertEqual([m.to for m in mail.outbox], [["abandoned@example.com"]])
+        held.refresh_from_db()
+        self.assertEqual((held.status, held.claimed_by), (EmailOutbox.STATUS_SENDING, "other"))
+
+    @override_settings(
+        EMAIL_BACKEND="payments.tests.FailingEmailBackend",
+        EMAIL_OUTBOX_MAX_ATTEMPTS=2,
+        EMAIL_OUTBOX_RETRY_BASE_SECONDS=60,
+    )
+    def test_retry_with_backoff_then_fail(self):
+        item = enqueue_email("Hello", "donor@example.com", text_body="Hi")
+
+        self.assertEqual(dispatch_pending(), (0, 1))
+        item.refresh_from_db()
+        self.assertEqual(item.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(item.attempts, 1)
+        self.assertIn("SMTP unavailable", item.last_error)
+        self.assertGreater(item.next_attempt_at, timezone.now())
+
+        # Not due yet, so nothing is attempted
+        self.assertEqual(dispatch_pending(), (0, 0))
+
+        EmailOutbox.objects.filter(pk=item.pk).update(next_attempt_at=timezone.now())
+        dispatch_pending()
+        item.refresh_from_db()
+        self.assertEqual(item.status, EmailOutbox.STATUS_FAILED)
+        self.assertEqual(item.attempts, 2)
+
+
+class RenderCacheTests(TestCase):
+    def test_cached_render_matches_template(self):
+        payment = make_payment(donation_option="Zakat", country="Sri Lanka")
+        payment.refresh_from_db()
+        now = timezone.now()
+        context = rendering.thank_you_email_context(payment, payment.amount, now)
+
+        _, html = rendering.render_thank_you_email(payment, payment.amount, now)
+        self.assertEqual(html, get_template(rendering.THANK_YOU_EMAIL_TEMPLATE).render(context))
+        self.assertEqual(
+            rendering.render_success_page(payment),
+            get_template(rendering.SUCCESS_PAGE_TEMPLATE).render(rendering.success_page_context(payment)),
+        )
+
+    def test_donor_fields_are_escaped(self):
+        payment = make_payment(first_name="<script>alert(1)</script>")
+        payment.refresh_from_db()
+        html = rendering.render_success_page(payment)
+        self.assertNotIn("<script>", html)
+        self.assertIn("&lt;script&gt;", html)
+        self.assertIn("LKR 1500.00", html)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("admin", password="pw")
+        self.factory = RequestFactory()
+
+    def get_stats(self):
+        request = self.factory.get("/payments/api/stats/")
+        request.user = self.user
+        return json.loads(dashboard_stats(request).content)
+
+    def test_summary_values(self):
+        make_payment(amount="100.00", status="Success", donate_to="Orphans")
+        old = make_payment(amount="50.00", status="Success", donate_to="Orphans")
+        make_payment(amount="25.00", status="Success", donate_to="Water")
+        make_payment(amount="999.00", status="Pending")
+        Payment.objects.filter(pk=old.pk).update(created_at=month_start() - timedelta(days=1))
+        FailedPayment.objects.create(transaction_id="x", first_name="A", email="a@example.com", phone="1", amount="1")
+        ContactMessage.objects.create(name="B", email="b@example.com", phone="2", message="Hi")
+
+        data = self.get_stats()
+        self.assertEqual(data["summary"], {"total": 175.0, "month": 125.0, "failed_total": 1, "new_messages": 1})
+        pie = {row["donate_to"]: float(row["value"]) for row in data["pie_chart"]}
+        self.assertEqual(pie, {"Orphans": 150.0, "Water": 25.0})
+        self.assertEqual(len(data["recent"]), 3)
+
+    def test_query_count(self):
+        make_payment(status="Success")
+        with self.assertNumQueries(4):
+            self.get_stats()
+        # Served from cache on the next poll
+        with self.assertNumQueries(0):
+            self.get_stats()
+
+    def test_callback_success_invalidates_cache(self):
+        payment = make_payment()
+        self.assertEqual(self.get_stats()["summary"]["total"], 0.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/payments/callback/", {"order_id": payment.transaction_id, "status_code": "00"})
+        self.assertEqual(self.get_stats()["summary"]["total"], 1500.0)
+
+
+class DonationAnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user("admin", password="pw")
+        self.factory = RequestFactory()
+        self.today = timezone.localdate()
+
+    def get_analytics(self, **params):
+        request = self.factory.get("/payments/api/analytics/", params)
+        request.user = self.user
+        response = donation_analytics(request)
+        return response.status_code, json.loads(response.content)
+
+    def donation(self, days_ago, amount, **kwargs):
+        payment = make_payment(amount=amount, status="Success", **kwargs)
+        Payment.objects.filter(pk=payment.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return payment
+
+    def test_day_week_month_buckets(self):
+        self.donation(0, "100.00")
+        self.donation(0, "50.00", donate_to="Water")
+        self.donation(40, "25.00", donate_to="Water")
+        make_payment(amount="999.00")
+
+        start = (self.today - timedelta(days=45)).isoformat()
+        _, daily = self.get_analytics(start=start)
+        self.assertEqual(len(daily["series"]), 46)
+        self.assertEqual(daily["series"][-1], {"period": self.today.isoformat(), "count": 2, "total": 150.0})
+        self.assertEqual(sum(point["count"] for point in daily["series"]), 3)
+
+        _, weekly = self.get_analytics(start=start, bucket="week", group_by="donate_to")
+        self.assertEqual(weekly["series"][0]["period"], analytics.bucket_start(self.today - timedelta(days=45), "week").isoformat())
+        self.assertEqual(weekly["series"][-1]["groups"], [
+            {"donate_to": "General", "count": 1, "total": 100.0}, {"donate_to": "Water", "count": 1, "total": 50.0},
+        ])
+
+        _, monthly = self.get_analytics(start=start, bucket="month")
+        self.assertEqual(sum(point["total"] for point in monthly["series"]), 175.0)
+        self.assertTrue(all(point["period"].endswith("-01") for point in monthly["series"]))
+
+    @override_settings(ANALYTICS_OPEN_CACHE_TTL=0)
+    def test_closed_buckets_cached_open_ones_expire(self):
+        self.donation(70, "100.00")
+        start = (self.today - timedelta(days=70)).isoformat()
+        self.get_analytics(start=start)
+
+        # Closed months of days keep serving from the cache, only the open month is queried (hot table + archive)
+        self.donation(0, "5.00")
+        self.donation(70, "7.00")
+        with self.assertNumQueries(2):
+            _, data = self.get_analytics(start=start)
+        self.assertEqual((data["series"][0]["total"], data["series"][-1]["total"]), (100.0, 5.0))
+
+        # ...until a late success in a closed period bumps the version
+        late = make_payment(amount="1.00")
+        Payment.objects.filter(pk=late.pk).update(created_at=timezone.now() - timedelta(days=70))
+        late.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/payments/callback/", {"order_id": late.transaction_id, "status_code": "00"})
+        _, data = self.get_analytics(start=start)
+        self.assertEqual(data["series"][0]["total"], 108.0)
+
+    def test_archived_rows_included(self):
+        self.donation(500, "80.00", country="Qatar")
+        archive.archive_closed_periods(months=1)
+        self.assertEqual(Payment.objects.count(), 0)
+        _, data = self.get_analytics(start=(self.today - timedelta(days=600)).isoformat(), bucket="month", group_by="country")
+        self.assertEqual([g for point in data["series"] for g in point["groups"]], [{"country": "Qatar", "count": 1, "total": 80.0}])
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get_analytics(bucket="year")[0], 400)
+        self.assertEqual(self.get_analytics(group_by="email")[0], 400)
+        self.assertEqual(self.get_analytics(start="2026-13-01")[0], 400)
+        self.assertEqual(self.get_analytics(start="2026-02-01", end="2026-01-01")[0], 400)
+        self.assertEqual(self.get_analytics(start="2000-01-01")[0], 400)
+        # Rejected before any bucket is built or a date overflows
+        self.assertEqual(self.get_analytics(start="0001-01-01", end="9999-12-31")[0], 400)
+        self.assertEqual(self.get_analytics(start="9999-12-01", end="9999-12-31")[0], 400)
+        self.assertEqual(self.get_analytics(end="0001-01-05")[0], 400)
+        status, data = self.get_analytics(start="9999-09-01", end="9999-10-15", bucket="month")
+        self.assertEqual((status, len(data["series"])), (200, 2))
+
+    def test_bucket_count_matches_bucket_dates(self):
+        start = date(2024, 1, 31)
+        for days in (0, 1, 6, 7, 30, 365, 800):
+            end = start + timedelta(days=days)
+            for bucket in analytics.BUCKETS:
+                self.assertEqual(analytics.bucket_count(start, end, bucket), len(analytics.bucket_dates(start, end, bucket)))
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("admin", password="pw")
+        self.factory = RequestFactory()
+        self.payments = [make_payment(first_name=f"Donor{i}") for i in range(7)]
+        # Two rows share a timestamp so the id tie-breaker is exercised
+        same = self.payments[3].created_at
+        Payment.objects.filter(pk=self.payments[4].pk).update(created_at=same)
+
+    def call(self, view, **params):
+        request = self.factory.get("/", params)
+        request.user = self.user
+        return view(request)
+
+    def test_cursor_round_trip(self):
+        created_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+    def test_pages_cover_every_row_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {"page_size": 3}
+            if cursor:
+                params["cursor"] = cursor
+            data = json.loads(self.call(donations_list, **params).content)
+            seen += [row["first_name"] for row in data["donations"]]
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(sorted(seen), sorted(p.first_name for p in self.payments))
+        self.assertEqual(len(seen), 7)
+        self.assertNotIn("id", data["donations"][0])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.call(donations_list, cursor="not-a-cursor").status_code, 400)
+
+    def test_streaming_mode(self):
+        ContactMessage.objects.create(name="B", email="b@example.com", phone="2", message="Hi")
+        response = self.call(contact_messages_list, stream="1")
+        self.assertTrue(response.streaming)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([m["name"] for m in data["messages"]], ["B"])
+
+        response = self.call(donations_list, stream="1", name="Donor1")
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual([d["first_name"] for d in data["donations"]], ["Donor1"])
+
+
+class PaymentIndexTests(TestCase):
+    """EXPLAIN checks that the hot queries can use the composite indexes."""
+
+    def setUp(self):
+        for i in range(20):
+            make_payment(status="Success" if i % 2 else "Pending", donate_to=f"Appeal{i % 3}")
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, index_name):
+        self.assertIn(index_name, queryset.explain())
+
+    def test_transaction_lookup(self):
+        payment = Payment.objects.first()
+        self.assertEqual(Payment.by_transaction_id(payment.transaction_id.upper()).get(), payment)
+        self.assertUsesIndex(Payment.by_transaction_id(payment.transaction_id), "payment_txn_upper_idx")
+
+    def test_recent_success(self):
+        queryset = Payment.objects.filter(status="Success").order_by("-created_at")[:10]
+        self.assertUsesIndex(queryset, "payment_status_created_idx")
+
+    def test_donations_keyset_order(self):
+        self.assertUsesIndex(Payment.objects.order_by("-created_at", "-id")[:100], "payment_created_id_idx")
+
+
+class DonationReportTests(TestCase):
+    def setUp(self):
+        make_payment(amount="100.00", status="Success", donate_to="Orphans")
+        make_payment(amount="40.00", status="Success", donate_to="Orphans")
+        make_payment(amount="25.00", status="Success", donate_to="Water")
+        make_payment(amount="999.00", status="Pending", donate_to="Water")
+
+    def test_subtotals_in_same_pass(self):
+        with tempfile.TemporaryFile() as out:
+            with self.assertNumQueries(1):
+                report = build_donation_report(out)
+            out.seek(0)
+            self.assertTrue(out.read(5).startswith(b"%PDF"))
+        self.assertEqual(report.count, 3)
+        self.assertEqual(report.subtotals["Orphans"], (2, 140))
+        self.assertEqual(report.total, 165)
+
+    def test_filters(self):
+        today = timezone.localdate()
+        with tempfile.TemporaryFile() as out:
+            report = build_donation_report(out, start_date=today, end_date=today, category="Water")
+        self.assertEqual(report.count, 1)
+
+        with tempfile.TemporaryFile() as out:
+            report = build_donation_report(out, end_date=today - timedelta(days=1))
+        self.assertEqual(report.count, 0)
+
+    def test_export_view(self):
+        request = RequestFactory().get("/", {"category": "Orphans", "start_date": "2020-01-01"})
+        request.user = get_user_model().objects.create_user("admin", password="pw")
+        response = export_donations_pdf(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+
+        request = RequestFactory().get("/", {"start_date": "yesterday"})
+        request.user = get_user_model().objects.get(username="admin")
+        self.assertEqual(export_donations_pdf(request).status_code, 400)
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        override = override_settings(REPORT_ARTEFACT_DIR=self.tmp_dir, REPORT_PROGRESS_EVERY=1)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = get_user_model().objects.create_user("admin", password="pw")
+        self.client.force_login(self.user)
+        make_payment(amount="100.00", status="Success", donate_to="Orphans")
+        make_payment(amount="25.00", status="Success", donate_to="Water")
+
+    def request_job(self, **data):
+        return self.client.post("/payments/api/reports/", data).json()
+
+    def test_csv_gz_job_end_to_end(self):
+        queued = self.request_job(format="csv.gz", category="Orphans")
+        self.assertEqual(queued["status"], ReportJob.STATUS_PENDING)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        status = self.client.get(f"/payments/api/reports/{queued['job_id']}/").json()
+        self.assertEqual(status["status"], ReportJob.STATUS_DONE)
+        self.assertEqual((status["progress"], status["total_rows"], status["percent"]), (1, 1, 100))
+
+        response = self.client.get(status["download_url"])
+        rows = gzip.decompress(b"".join(response.streaming_content)).decode().splitlines()
+        self.assertEqual(len(rows), 2)
+        self.assertIn("Orphans,100.00", rows[1])
+
+    def test_artefact_reused_until_payments_change(self):
+        first = self.request_job(format="pdf")
+        # Identical request while queued shares the job
+        self.assertEqual(self.request_job(format="pdf")["job_id"], first["job_id"])
+        run_pending_jobs()
+
+        again = self.request_job(format="pdf")
+        self.assertEqual(again["job_id"], first["job_id"])
+        self.assertEqual(again["status"], ReportJob.STATUS_DONE)
+
+        Payment.objects.filter(status="Pending").update(status="Success")
+        make_payment(amount="10.00", status="Success")
+        changed = self.request_job(format="pdf")
+        self.assertNotEqual(changed["job_id"], first["job_id"])
+        self.assertEqual(changed["status"], ReportJob.STATUS_PENDING)
+
+    def test_edits_and_archiving_make_artefacts_stale(self):
+        first = self.request_job(format="csv")
+        run_pending_jobs()
+
+        # Same count, total and ids: only the data version tells the rows changed
+        payment = Payment.objects.get(donate_to="Water")
+        payment.first_name = "Corrected"
+        payment.save()
+        edited = self.request_job(format="csv")
+        self.assertNotEqual(edited["job_id"], first["job_id"])
+        run_pending_jobs()
+
+        Payment.objects.update(created_at=timezone.now() - timedelta(days=400))
+        archive.archive_closed_periods(months=1)
+        self.assertNotEqual(self.request_job(format="csv")["job_id"], edited["job_id"])
+
+    @override_settings(REPORT_JOB_STALE_SECONDS=600)
+    def test_one_artefact_kept_per_cache_key(self):
+        first = self.request_job(format="csv")
+        run_pending_jobs()
+        make_payment(amount="10.00", status="Success")
+        second = self.request_job(format="csv")
+        run_pending_jobs()
+        kept = [os.path.basename(ReportJob.objects.get(pk=second["job_id"]).file_path)]
+        self.assertEqual(os.listdir(self.tmp_dir), kept)
+        self.assertEqual(self.client.get(f"/payments/api/reports/{first['job_id']}/download/").status_code, 404)
+
+        # Left behind by dead workers or deleted jobs: removed once older than REPORT_JOB_STALE_SECONDS
+        old = time.time() - 601
+        for name in ("dead.csv.part", "deleted-1.csv"):
+            path = os.path.join(self.tmp_dir, name)
+            open(path, "w").close()
+            os.utime(path, (old, old))
+        open(os.path.join(self.tmp_dir, "building.csv.part"), "w").close()
+        run_pending_jobs()
+        self.assertEqual(sorted(os.listdir(self.tmp_dir)), sorted(kept + ["building.csv.part"]))
+
+    @override_settings(REPORT_JOB_STALE_SECONDS=600)
+    def test_jobs_stuck_running_are_requeued(self):
+        queued = self.request_job(format="csv")
+        job = claim_next_job()
+        self.assertEqual(job.pk, queued["job_id"])
+        # Still within REPORT_JOB_STALE_SECONDS: left to its worker
+        self.assertEqual(run_pending_jobs(), 0)
+
+        ReportJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(run_pending_jobs(), 1)
+        self.assertEqual(ReportJob.objects.get(pk=job.pk).status, ReportJob.STATUS_DONE)
+
+    def test_invalid_format(self):
+        response = self.client.post("/payments/api/reports/", {"format": "xlsx"})
+        self.assertEqual(response.status_code, 400)
+
+
+IMPORT_CSV = """reference,first_name,last_name,email,phone,amount,currency,donate_to,date,status
+BANK-1,Amina,Fazil,amina@example.com,+94 77 123 4567,5000,LKR,Zakat,2026-01-10,
+BANK-2,Rizwan,Rahman,rizwan@example.com,077-765-4321,25,usd,Orphans,2026-01-11T09:30:00,
+BANK-3,Nuha,Careem,nuha@example.com,0771111111,abc,LKR,Water,2026-01-12,
+BANK-4,Imran,Cassim,not-an-email,0772222222,100,LKR,Water,2026-01-12,
+BANK-5,Shifa,Saleem,shifa@example.com,0773333333,100,EUR,Water,2026-01-12,
+BANK-1,Amina,Fazil,amina@example.com,0771234567,5000,LKR,Zakat,2026-01-10,
+BANK-6,Ismail,Nizar,ismail@example.com,0774444444,750,LKR,General,2026-01-13,pending
+"""
+
+
+class DonationImportTests(TestCase):
+    def import_text(self, text, file_format="csv", batch_size=2):
+        return imports.import_stream(io.StringIO(text), file_format, batch_size)
+
+    def test_csv_rows_normalised_and_bad_rows_reported(self):
+        result = self.import_text(IMPORT_CSV)
+        self.assertEqual((result.rows, result.imported, result.rejected), (7, 2, 5))
+        self.assertEqual([(e["line"], e["error"].split(":")[0]) for e in result.errors], [
+            (4, "Invalid amount"), (5, "Invalid email"), (6, "No exchange rate for EUR"),
+            # Rejected while reading, before the batch holding line 7 is written
+            (8, "Pending rows cannot be imported"), (7, "Reference already imported"),
+        ])
+
+        usd = Payment.objects.get(transaction_id="BANK-2")
+        self.assertEqual((usd.phone, usd.currency, usd.original_amount, usd.amount), ("0777654321", "USD", Decimal("25.00"), Decimal("7711.25")))
+        self.assertEqual((usd.status, usd.created_at.date().isoformat()), ("Success", "2026-01-11"))
+        self.assertIn("rizwan", usd.search_text)
+        # Reconcile would otherwise settle a historical Pending row as an abandoned checkout
+        self.assertFalse(Payment.objects.filter(status="Pending").exists())
+
+        # The rollup now covers the imported successes; importing again adds nothing
+        self.assertEqual(DonationDailyRollup.objects.aggregate(total=Sum("total"))["total"], Decimal("12711.25"))
+        again = self.import_text(IMPORT_CSV, batch_size=100)
+        self.assertEqual((again.imported, again.rejected), (0, 7))
+
+    def test_jsonl_rows(self):
+        text = "\n".join([
+            json.dumps({"first_name": "Zainab", "email": "z@example.com", "amount": 1200, "phone": "077 555 5555"}),
+            "{not json",
+            json.dumps(["a", "list"]),
+            "",
+            json.dumps({"first_name": "Ahamed", "amount": "300", "date": "2999-01-01"}),
+        ])
+        result = self.import_text(text, "jsonl")
+        self.assertEqual((result.rows, result.imported), (4, 1))
+        self.assertEqual([e["line"] for e in result.errors], [2, 3, 5])
+        payment = Payment.objects.get()
+        self.assertEqual((payment.first_name, payment.amount, payment.phone), ("Zainab", Decimal("1200.00"), "0775555555"))
+
+    def test_oversized_values_reject_only_their_row(self):
+        text = "\n".join([
+            "reference,first_name,email,phone,amount,donate_to",
+            "BIG-1,Amina,a@example.com,0771234567,123456789,Zakat",
+            f"{'R' * 101},Rizwan,r@example.com,0771234567,100,Zakat",
+            "BIG-3,Nuha,n@example.com,0771234567,100,Zakat",
+        ])
+        result = self.import_text(text, batch_size=10)
+        self.assertEqual((result.imported, result.rejected), (1, 2))
+        self.assertEqual([(e["line"], e["error"].split(":")[0]) for e in result.errors], [
+            (2, "Invalid amount"), (3, "Invalid transaction_id"),
+        ])
+        self.assertEqual(Payment.objects.get().transaction_id, "BIG-3")
+
+    def test_batch_refused_by_database_is_written_row_by_row(self):
+        taken = make_payment(first_name="Taken")
+        rows = [{"reference": f"OK-{i}", "first_name": "Amina", "email": "a@example.com", "amount": "100"} for i in (1, 2)]
+        first, clashing = [imports.row_to_payment(row) for row in rows]
+        # A unique value the reference check does not look at
+        clashing.pk = taken.pk
+
+        result = imports.ImportResult()
+        imports.write_batch([(2, first), (3, clashing)], result)
+        self.assertEqual((result.imported, result.rejected), (1, 1))
+        self.assertEqual(result.errors[0]["line"], 3)
+        self.assertTrue(Payment.objects.filter(transaction_id="OK-1").exists())
+
+    def test_staff_upload_queued_and_imported(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "admin@example.com", "pw"))
+        upload = io.BytesIO(("\ufeff" + IMPORT_CSV).encode("utf-8"))
+        upload.name = "january.csv"
+        with override_settings(IMPORT_UPLOAD_DIR=tmp_dir):
+            queued = self.client.post("/payments/api/imports/", {"file": upload})
+        self.assertEqual(queued.status_code, 202)
+        self.assertEqual(queued.json()["status"], ImportJob.STATUS_PENDING)
+
+        self.assertEqual(imports.run_pending_jobs(), 1)
+        status = self.client.get(queued.json()["status_url"]).json()
+        self.assertEqual((status["status"], status["rows"], status["imported"], status["rejected"]), (ImportJob.STATUS_DONE, 7, 2, 5))
+        self.assertEqual(len(status["errors"]), 5)
+
+        bad = io.BytesIO(b"x")
+        bad.name = "january.xlsx"
+        self.assertEqual(self.client.post("/payments/api/imports/", {"file": bad}).status_code, 400)
+
+
+class IdempotentCallbackTests(TestCase):
+    def callback(self, payment, status_code):
+        return self.client.get("/payments/callback/", {"order_id": payment.transaction_id, "status_code": status_code})
+
+    def test_duplicate_success_sends_one_email(self):
+        payment = make_payment()
+        for _ in range(3):
+            response = self.callback(payment, "00")
+            self.assertContains(response, "Alhamdulillah")
+
+        self.assertEqual(EmailOutbox.objects.filter(payment=payment).count(), 1)
+        event = CallbackEvent.objects.get(payment=payment)
+        self.assertEqual((event.deliveries, event.applied), (3, True))
+
+    def test_status_update_touches_only_status(self):
+        payment = make_payment()
+        with CaptureQueriesContext(connection) as ctx:
+            self.callback(payment, "00")
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("UPDATE \"payments_payment\"")]
+        self.assertEqual(len(updates), 1)
+        self.assertIn("\"status\" IN", updates[0])
+        self.assertNotIn("first_name", updates[0])
+
+    def test_failure_after_success_is_ignored(self):
+        payment = make_payment()
+        self.callback(payment, "00")
+        self.assertContains(self.callback(payment, "05"), "Payment failed")
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "Success")
+
+    def test_late_success_after_failure(self):
+        payment = make_payment()
+        self.callback(payment, "05")
+        self.callback(payment, "00")
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, "Success")
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+
+class ConcurrentCallbackTests(TransactionTestCase):
+    def test_parallel_callbacks_transition_once(self):
+        if connection.vendor != "postgresql":
+            # SQLite's deferred transactions lock each other out ("database is locked") instead of waiting on row locks
+            self.skipTest("exercises PostgreSQL row locks")
+        payment = make_payment()
+        workers = 8
+        barrier = threading.Barrier(workers)
+
+        def deliver(_):
+            try:
+                barrier.wait()
+                return Client().get("/payments/callback/", {"order_id": payment.transaction_id, "status_code": "00"}).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(workers) as pool:
+            codes = list(pool.map(deliver, range(workers)))
+
+        self.assertEqual(codes.count(200), workers)
+        self.assertEqual(EmailOutbox.objects.filter(payment=payment).count(), 1)
+        self.assertEqual(CallbackEvent.objects.get(payment=payment).deliveries, workers)
+        self.assertEqual(CallbackEvent.objects.filter(applied=True).count(), 1)
+
+
+class DonationRollupTests(TestCase):
+    def succeed(self, payment):
+        self.client.get("/payments/callback/", {"order_id": payment.transaction_id, "status_code": "00"})
+
+    def test_incremental_matches_rebuild(self):
+        for amount, donate_to, currency in [("100.00", "Water", "LKR"), ("50.00", "Water", "LKR"), ("30.85", "Water", "USD")]:
+            self.succeed(make_payment(amount=amount, donate_to=donate_to, currency=currency))
+        self.succeed(make_payment(amount="20.00", donate_to="Orphans"))
+        # Duplicate callback must not double count
+        self.succeed(Payment.objects.filter(donate_to="Orphans").get())
+        make_payment(amount="999.00", donate_to="Water")
+
+        def snapshot():
+            return sorted(DonationDailyRollup.objects.values_list("donate_to", "currency", "count", "total"))
+
+        incremental = snapshot()
+        self.assertEqual(len(incremental), 3)
+        self.assertIn(("Water", "LKR", 2, 150), incremental)
+
+        self.assertEqual(rebuild_rollup(), 3)
+        self.assertEqual(snapshot(), incremental)
+
+    def test_stats_from_rollup(self):
+        self.succeed(make_payment(amount="100.00", donate_to="Water"))
+        old = make_payment(amount="40.00", donate_to="Water", status="Success")
+        Payment.objects.filter(pk=old.pk).update(created_at=month_start() - timedelta(days=3))
+        rebuild_rollup()
+
+        from_payments = compute_dashboard_stats("payments")
+        from_rollup = compute_dashboard_stats("rollup")
+        self.assertEqual(from_rollup["summary"], from_payments["summary"])
+        self.assertEqual(from_rollup["summary"]["month"], 100.0)
+
+
+@override_settings(PAYMENT_SEARCH_BACKEND="ngram")
+class DonorSearchTests(TestCase):
+    def setUp(self):
+        search.reset_ngram_index()
+        self.addCleanup(search.reset_ngram_index)
+        self.amina = make_payment(first_name="Amina", last_name="Fazil", email="amina@example.com", phone="0771234567")
+        self.zoe = make_payment(first_name="Zoë", last_name="Aminah", email="zoe@example.com", phone="0719876543")
+        self.other = make_payment(first_name="Imran", last_name="Cassim", email="imran@example.com", phone="0112223334")
+
+    def test_search_text_is_normalised(self):
+        self.assertEqual(self.zoe.search_text.split()[:2], ["zoe", "aminah"])
+        self.zoe.first_name = "Zainab"
+        self.zoe.save(update_fields=["first_name"])
+        self.zoe.refresh_from_db()
+        self.assertTrue(self.zoe.search_text.startswith("zainab "))
+
+    def test_filter_search_matches_every_column(self):
+        def found(term):
+            return set(search.filter_search(Payment.objects.all(), term).values_list("pk", flat=True))
+
+        self.assertEqual(found("AMINA"), {self.amina.pk, self.zoe.pk})
+        self.assertEqual(found("zoe"), {self.zoe.pk})
+        self.assertEqual(found("98765"), {self.zoe.pk})
+        self.assertEqual(found(str(self.other.transaction_id)[:8]), {self.other.pk})
+        self.assertEqual(found("nobody"), set())
+
+    def test_index_follows_new_payments(self):
+        search.get_ngram_index()
+        make_payment(first_name="Aminath", last_name="Late")
+        results = search.ranked_search("amina", fields=("first_name",))
+        self.assertEqual({r["first_name"] for r in results}, {"Amina", "Zoë", "Aminath"})
+
+    @override_settings(PAYMENT_SEARCH_INDEX_CHECK_SECONDS=0)
+    def test_index_rebuilt_after_another_workers_change(self):
+        index = search.get_ngram_index()
+        # Written by another process: no signal here, only the version it publishes on commit
+        Payment.objects.filter(pk=self.other.pk).update(search_text="aminu cassim")
+        self.assertIs(search.get_ngram_index(), index)
+        search.invalidate_search_index()
+        results = search.ranked_search("aminu")
+        self.assertEqual([r["id"] for r in results], [self.other.pk])
+        self.assertIsNot(search.get_ngram_index(), index)
+
+    def test_ranked_results(self):
+        results = search.ranked_search("amina fazil", fields=("first_name",))
+        self.assertEqual([r["first_name"] for r in results], ["Amina"])
+        results = search.ranked_search("amina")
+        self.assertEqual(results[0]["id"], self.amina.pk)
+        self.assertGreater(results[0]["rank"], results[1]["rank"])
+
+    def test_donations_list_and_admin_use_search(self):
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        request = RequestFactory().get("/", {"name": "fazil"})
+        request.user = user
+        data = json.loads(donations_list(request).content)
+        self.assertEqual([d["first_name"] for d in data["donations"]], ["Amina"])
+
+        self.client.force_login(user)
+        response = self.client.get("/admin/payments/payment/", {"q": "cassim"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.other])
+
+
+class GenerateDonationsTests(TestCase):
+    def test_generates_requested_rows(self):
+        call_command("generate_donations", payments=300, failed=20, messages=10, days=30, batch_size=100, stdout=io.StringIO())
+        # Failed payments are a status partition of Payment
+        self.assertEqual(Payment.objects.count(), 320)
+        self.assertEqual(FailedPayment.objects.count(), Payment.objects.filter(status="Failed").count())
+        self.assertGreaterEqual(FailedPayment.objects.count(), 20)
+        self.assertEqual(ContactMessage.objects.count(), 10)
+        # created_at is spread over the window rather than stamped by auto_now_add
+        oldest = Payment.objects.order_by("created_at").first().created_at
+        self.assertLess(oldest, timezone.now() - timedelta(days=1))
+        self.assertTrue(Payment._meta.get_field("created_at").auto_now_add)
+        self.assertFalse(Payment.objects.filter(search_text="").exists())
+        self.assertEqual(
+            sum(DonationDailyRollup.objects.values_list("count", flat=True)),
+            Payment.objects.filter(status="Success").count(),
+        )
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_CPROFILE_SAMPLE_RATE=1.0, PROFILING_KEEP_SLOWEST=2)
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        profiling.registry.reset()
+        self.staff = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        make_payment()
+
+    def test_records_views_queries_and_spans(self):
+        self.client.force_login(self.staff)
+        self.client.get("/payments/api/stats/")
+        self.client.get("/payments/api/stats/")
+        # A file response is recorded once its body has been sent
+        b"".join(self.client.get("/payments/api/donations/report/").streaming_content)
+
+        report = self.client.get("/payments/api/profiling/").json()
+        stats = report["views"]["dashboard_stats"]
+        self.assertEqual(stats["wall_ms"]["count"], 2)
+        self.assertGreater(stats["queries"]["max"], 0)
+        self.assertEqual(report["spans"]["export_donations_pdf:pdf_report"]["count"], 1)
+        self.assertEqual(len(report["slowest_profiles"]), 2)
+        self.assertIn("function calls", report["slowest_profiles"][0]["stats"])
+
+        self.client.post("/payments/api/profiling/")
+        self.assertEqual(profiling.registry.snapshot()["views"].keys(), {"profiling_report"})
+
+    def test_streamed_body_queries_are_counted(self):
+        self.client.force_login(self.staff)
+        response = self.client.get("/payments/api/donations/", {"stream": "1"})
+        self.assertNotIn("donations_list", profiling.registry.snapshot()["views"])
+        b"".join(response.streaming_content)
+        stats = profiling.registry.snapshot()["views"]["donations_list"]
+        self.assertEqual(stats["wall_ms"]["count"], 1)
+        # Session, user and the streamed page itself
+        self.assertGreaterEqual(stats["queries"]["max"], 3)
+
+    def test_middleware_is_async_capable(self):
+        async def view(request):
+            return HttpResponse()
+
+        middleware = profiling.ProfilingMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(AsyncRequestFactory().get("/async/"))
+        self.assertEqual(profiling.registry.snapshot()["views"]["/async/"]["wall_ms"]["count"], 1)
+
+    def test_endpoint_is_staff_only(self):
+        user = get_user_model().objects.create_user("viewer", "viewer@example.com", "pw")
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/payments/api/profiling/").status_code, 302)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled_is_a_no_op(self):
+        self.client.force_login(self.staff)
+        self.client.get("/payments/api/stats/")
+        with profiling.span("outside"):
+            pass
+        snapshot = profiling.registry.snapshot()
+        self.assertEqual(snapshot["views"], {})
+        self.assertEqual(snapshot["spans"], {})
+
+
+TEST_GATEWAYS = {
+    "default": {"BACKEND": "payments.tests.StubGateway"},
+    "usd": {"BACKEND": "payments.tests.StubGateway", "OPTIONS": {"merchant": "usd-account"}},
+    "zakat": {"BACKEND": "payments.tests.StubGateway"},
+    "webxpay": {"BACKEND": "payments.gateway.WebXPayProvider"},
+}
+
+
+@override_settings(
+    PAYMENT_GATEWAYS=TEST_GATEWAYS,
+    PAYMENT_GATEWAY_BY_CURRENCY={"USD": "usd"},
+    PAYMENT_GATEWAY_BY_APPEAL={"Zakat": "zakat"},
+    WEBXPAY_API_USERNAME="api-user",
+    WEBXPAY_API_PASSWORD="api-pass",
+)
+class GatewayRegistryTests(TestCase):
+    def setUp(self):
+        self.addCleanup(gateway.reset_gateways)
+
+    def test_providers_are_singletons_selected_by_appeal_then_currency(self):
+        self.assertIs(gateway.select_gateway("LKR", "General"), gateway.get_gateway("default"))
+        self.assertIs(gateway.select_gateway("USD", "General"), gateway.get_gateway("usd"))
+        self.assertIs(gateway.select_gateway("USD", "Zakat"), gateway.get_gateway("zakat"))
+        self.assertEqual(gateway.get_gateway("usd").options, {"merchant": "usd-account"})
+        with self.assertRaises(gateway.GatewayError):
+            gateway.get_gateway("missing")
+
+    def test_create_payment_uses_selected_gateway(self):
+        response = self.client.post("/payments/create/", {
+            "currency_preference": "USD", "amount": "10", "donate_to": "General", "email": "a@example.com",
+        })
+        self.assertEqual(response.json()["gateway"], "usd")
+
+    def test_status_queries_share_a_pooled_connection(self):
+        with FakeGatewayServer({"txn-1": "00", "txn-2": "01"}) as fake:
+            with override_settings(WEBXPAY_STATUS_URL=fake.status_url):
+                provider = gateway.get_gateway("webxpay")
+                self.assertEqual(provider.query_status("txn-1"), "00")
+                self.assertEqual(provider.query_status("txn-2"), "01")
+                self.assertIsNone(provider.query_status("unknown"))
+            self.assertEqual(fake.connections, 1)
+            self.assertEqual(fake.requests[0]["form"]["order_id"], "txn-1")
+            self.assertTrue(fake.requests[0]["auth"].startswith("Basic "))
+
+    def test_unreachable_gateway_raises(self):
+        with FakeGatewayServer() as fake:
+            url = fake.status_url
+        with override_settings(WEBXPAY_STATUS_URL=url, PAYMENT_GATEWAY_CONNECT_TIMEOUT=0.5):
+            with self.assertRaises(gateway.GatewayError):
+                gateway.get_gateway("webxpay").query_status("txn-1")
+
+
+class ReconcilePendingTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+
+        def pending(name, age, **kwargs):
+            payment = make_payment(first_name=name, **kwargs)
+            Payment.objects.filter(pk=payment.pk).update(created_at=now - age)
+            return str(payment.transaction_id)
+
+        self.paid = pending("Paid", timedelta(hours=2))
+        self.declined = pending("Declined", timedelta(hours=3))
+        self.abandoned = pending("Abandoned", timedelta(days=3))
+        self.unknown = pending("Unknown", timedelta(hours=1))
+        self.recent = pending("Recent", timedelta(minutes=5))
+        self.settled = pending("Settled", timedelta(hours=4), status="Success")
+
+        self.fake = FakeGatewayServer({self.paid: "00", self.declined: "05", self.recent: "00", self.settled: "05"}).start()
+        self.addCleanup(self.fake.stop)
+        override = override_settings(PAYMENT_GATEWAYS={"default": {
+            "BACKEND": "payments.gateway.WebXPayProvider", "OPTIONS": {"STATUS_URL": self.fake.status_url},
+        }})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def statuses(self):
+        return dict(Payment.objects.values_list("first_name", "status"))
+
+    def test_settles_stale_pending_payments(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("reconcile_payments", workers=3, stdout=io.StringIO())
+
+        self.assertEqual(self.statuses(), {
+            "Paid": "Success", "Declined": "Failed", "Abandoned": "Failed",
+            "Unknown": "Pending", "Recent": "Pending", "Settled": "Success",
+        })
+        self.assertEqual(set(FailedPayment.objects.values_list("transaction_id", flat=True)), {self.declined, self.abandoned})
+        self.assertEqual(EmailOutbox.objects.get().to_email, "amina@example.com")
+        self.assertEqual(DonationDailyRollup.objects.get().count, 1)
+        checkpoint = ReconcileCheckpoint.objects.get()
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertEqual(checkpoint.counts, {
+            "checked": 4, "succeeded": 1, "failed": 1, "abandoned": 1, "unknown": 1, "unsupported": 0, "errors": 0,
+        })
+        # Only payments past the threshold were asked about
+        self.assertEqual(len(self.fake.requests), 4)
+
+    def test_gateways_without_status_api_are_skipped(self):
+        with override_settings(PAYMENT_GATEWAYS={"default": {"BACKEND": "payments.tests.StubGateway"}}):
+            with self.assertRaises(gateway.StatusQueryUnsupported):
+                gateway.get_gateway("default").query_status(self.paid)
+            checkpoint = reconcile.reconcile_pending()
+
+        self.assertEqual((checkpoint.counts["unsupported"], checkpoint.counts["errors"]), (4, 0))
+        self.assertEqual(self.statuses()["Paid"], "Pending")
+        self.assertEqual(self.fake.requests, [])
+
+    def test_resumes_from_checkpoint(self):
+        call_command("reconcile_payments", batch_size=2, max_batches=1, stdout=io.StringIO())
+        checkpoint = ReconcileCheckpoint.objects.get()
+        self.assertIsNone(checkpoint.finished_at)
+        # Oldest first: the abandoned checkout and the declined one
+        self.assertEqual(self.statuses()["Paid"], "Pending")
+        self.assertEqual(self.statuses()["Declined"], "Failed")
+
+        call_command("reconcile_payments", batch_size=2, stdout=io.StringIO())
+        checkpoint.refresh_from_db()
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertEqual(checkpoint.counts["checked"], 4)
+        self.assertEqual(self.statuses()["Paid"], "Success")
+        self.assertEqual(len(self.fake.requests), 4)
+
+    def test_gateway_errors_leave_payments_pending(self):
+        self.fake.stop()
+        with override_settings(PAYMENT_GATEWAY_CONNECT_TIMEOUT=0.5):
+            call_command("reconcile_payments", stdout=io.StringIO())
+        self.assertEqual(ReconcileCheckpoint.objects.get().counts["errors"], 4)
+        self.assertEqual(Payment.objects.filter(status="Pending").count(), 5)
+
+
+class WorkerStartupTests(TestCase):
+    def test_boot_leaves_pdf_and_http_libraries_unloaded(self):
+        code = (
+            "import sys, django; django.setup(); "
+            "from django.urls import get_resolver; get_resolver().url_patterns; "
+            "print(sorted(m for m in ('reportlab', 'PIL', 'requests') if m in sys.modules))"
+        )
+        done = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=os.environ.copy())
+        self.assertEqual(done.stdout.strip(), "[]", done.stderr[-2000:])
+
+    def test_parse_importtime(self):
+        from payments.management.commands.importtime import parse_importtime
+
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       120 |        120 |     _json\n"
+            "import time:       900 |       1020 |   json\n"
+            "import time:        50 |       1070 | payments.views\n"
+        )
+        self.assertEqual(parse_importtime(stderr), [
+            ("_json", 2, 120, 120), ("json", 1, 900, 1020), ("payments.views", 0, 50, 1070),
+        ])
+
+
+@override_settings(PAYMENT_GATEWAYS={"default": {"BACKEND": "payments.tests.StubGateway"}}, FX_RATE_VERSION_CHECK_SECONDS=0)
+class ExchangeRateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        fx.rates.clear()
+        self.addCleanup(fx.rates.clear)
+        self.addCleanup(gateway.reset_gateways)
+        self.usd = ExchangeRate.objects.get(currency="USD")
+
+    def add_rate(self, currency, rate, effective_from=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ExchangeRate.objects.create(currency=currency, rate=rate, effective_from=effective_from or timezone.now())
+
+    def test_seeded_legacy_rate_and_exact_conversion(self):
+        self.assertEqual(self.usd.rate, Decimal("308.45"))
+        self.assertEqual(fx.convert_to_lkr("10", "usd"), (Decimal("3084.50"), fx.rates.rate_for("USD")))
+        # Donor amount is rounded to cents before converting, the product once, half up
+        self.assertEqual(fx.convert_to_lkr("0.333", "USD")[0], Decimal("101.79"))
+        self.assertEqual(fx.convert_to_lkr("1500", "LKR"), (Decimal("1500.00"), fx.Rate(None, "LKR", 1, None)))
+        with self.assertRaises(fx.UnknownCurrency):
+            fx.convert_to_lkr("1", "XYZ")
+
+    def test_effective_dates_pick_the_version_in_force(self):
+        later = self.add_rate("USD", "300.00", timezone.now() + timedelta(days=1))
+        self.assertEqual(fx.rates.rate_for("USD").id, self.usd.pk)
+        self.assertEqual(fx.rates.rate_for("USD", timezone.now() + timedelta(days=2)).id, later.pk)
+
+    def test_warm_lookups_skip_the_database(self):
+        fx.convert_to_lkr("10", "USD")
+        loads = fx.rates.loads
+        with self.assertNumQueries(0):
+            for _ in range(100):
+                fx.convert_to_lkr("10", "USD")
+        self.assertEqual(fx.rates.loads, loads)
+
+    def test_new_rate_reaches_other_workers_through_the_cache(self):
+        other_worker = fx.RateTable()
+        self.assertEqual(other_worker.rate_for("USD").rate, Decimal("308.45"))
+        self.add_rate("USD", "299.10")
+        self.assertEqual(other_worker.rate_for("USD").rate, Decimal("299.10"))
+        self.assertEqual(other_worker.loads, 2)
+
+    def test_create_payment_records_rate_version(self):
+        eur = self.add_rate("EUR", "345.123456")
+        self.client.post("/payments/create/", {"currency_preference": "EUR", "amount": "20", "email": "a@example.com"})
+        self.client.post("/payments/create/", {"currency_preference": "XYZ", "amount": "500", "email": "b@example.com"})
+        euro, unknown = Payment.objects.order_by("id")
+        self.assertEqual((euro.currency, euro.original_amount, euro.amount, euro.exchange_rate_id), ("EUR", Decimal("20.00"), Decimal("6902.47"), eur.pk))
+        self.assertEqual((unknown.currency, unknown.original_amount, unknown.amount, unknown.exchange_rate_id), ("LKR", Decimal("500.00"), Decimal("500.00"), None))
+
+    def test_currency_with_only_future_rates_falls_back_to_lkr(self):
+        self.add_rate("GBP", "400.00", timezone.now() + timedelta(days=1))
+        self.assertFalse(fx.supports("GBP"))
+        self.assertTrue(fx.supports("GBP", at=timezone.now() + timedelta(days=2)))
+        response = self.client.post("/payments/create/", {"currency_preference": "GBP", "amount": "50", "email": "a@example.com"})
+        self.assertLess(response.status_code, 500)
+        payment = Payment.objects.get()
+        self.assertEqual((payment.currency, payment.amount, payment.exchange_rate_id), ("LKR", Decimal("50.00"), None))
+
+    def test_dashboard_reports_original_currency_totals(self):
+        make_payment(status="Success", currency="USD", original_amount="10.00", amount="3084.50")
+        make_payment(status="Success", currency="USD", original_amount="5.00", amount="1542.25")
+        make_payment(status="Success", amount="1000.00")
+        rebuild_rollup()
+        for source in ("payments", "rollup"):
+            currencies = {c["currency"]: (float(c["original"]), float(c["value"])) for c in compute_dashboard_stats(source)["currencies"]}
+            self.assertEqual(currencies, {"LKR": (1000.0, 1000.0), "USD": (15.0, 4626.75)})
+
+
+@override_settings(PAYMENT_GATEWAYS={"default": {"BACKEND": "payments.tests.StubGateway"}})
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        fx.rates.clear()
+        self.addCleanup(fx.rates.clear)
+        self.addCleanup(gateway.reset_gateways)
+        self.factory = AsyncRequestFactory()
+
+    async def test_create_payment(self):
+        request = self.factory.post("/payments/create/", {"currency_preference": "USD", "amount": "10", "email": "a@example.com"})
+        response = await async_views.create_payment(request)
+        self.assertEqual(json.loads(response.content)["amount"], "3084.50")
+        payment = await Payment.objects.aget(email="a@example.com")
+        self.assertEqual((payment.currency, payment.original_amount, payment.status), ("USD", Decimal("10.00"), "Pending"))
+
+    async def test_duplicate_callbacks_are_counted(self):
+        payment = await Payment.objects.acreate(email="a@example.com", amount="1500.00", status="Pending")
+        for _ in range(3):
+            request = self.factory.get("/payments/callback/", {"order_id": payment.transaction_id, "status_code": "00"})
+            response = await async_views.payment_callback(request)
+            self.assertContains(response, "Alhamdulillah")
+        event = await CallbackEvent.objects.aget(payment=payment)
+        self.assertEqual((event.deliveries, event.applied), (3, True))
+        self.assertEqual(await EmailOutbox.objects.filter(payment=payment).acount(), 1)
+
+        request = self.factory.get("/payments/callback/", {"order_id": "missing", "status_code": "00"})
+        self.assertEqual((await async_views.payment_callback(request)).status_code, 404)
+
+    async def test_contact_message(self):
+        request = self.factory.post("/payments/contact/", {"name": " Amina ", "email": "a@example.com", "message": "Hi"})
+        response = await async_views.contact_us_view(request)
+        self.assertEqual(json.loads(response.content), {"status": "success"})
+        message = await ContactMessage.objects.aget(email="a@example.com")
+        self.assertEqual(message.name, "Amina")
+
+
+@override_settings(
+    PAYMENT_GATEWAYS={"default": {"BACKEND": "payments.tests.StubGateway"}},
+    THROTTLE_RATES={"create_payment": {"CAPACITY": 3, "PER_MINUTE": 60}, "contact": {"CAPACITY": 2, "PER_MINUTE": 1}},
+)
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        throttle.counters.reset()
+        self.addCleanup(gateway.reset_gateways)
+
+    def checkout(self, **fields):
+        form = {"currency_preference": "USD", "amount": "10", "email": "a@example.com", "donate_to": "Zakat"}
+        form.update(fields)
+        return self.client.post("/payments/create/", form)
+
+    def test_token_bucket_refills(self):
+        key = "payments:throttle:test"
+        self.assertEqual([throttle.take_token(key, 2, 30, now=100)[0] for _ in range(3)], [True, True, False])
+        self.assertEqual(throttle.take_token(key, 2, 30, now=100), (False, 2))
+        self.assertEqual(throttle.take_token(key, 2, 30, now=102), (True, 0))
+
+    @override_settings(THROTTLE_ENABLED=False)
+    def test_duplicate_checkout_reuses_pending_payment(self):
+        first = self.checkout().json()
+        self.assertEqual(self.checkout().json(), first)
+        self.assertEqual(Payment.objects.count(), 1)
+        self.checkout(amount="20")
+        self.assertEqual(Payment.objects.count(), 2)
+
+        # Another donor's details are never handed out for the same email and amount
+        self.checkout(first_name="Other", phone="0719999999")
+        self.assertEqual(Payment.objects.count(), 3)
+        Payment.objects.filter(first_name="Other").delete()
+
+        # Once the first attempt is settled a new checkout is a new payment
+        Payment.objects.filter(original_amount="10.00").update(status="Failed")
+        self.checkout(email="b@example.com")
+        self.checkout()
+        self.assertEqual(Payment.objects.count(), 4)
+        self.assertEqual(throttle.counters.snapshot()["counts"]["create_payment:coalesced"], 1)
+
+    def test_throttled_by_ip_and_by_email(self):
+        for i in range(3):
+            self.assertEqual(self.checkout(amount=str(i + 1)).status_code, 200)
+        response = self.checkout(amount="99")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(Payment.objects.count(), 3)
+
+        # Same email from fresh addresses still runs out of its own bucket
+        for i in range(2):
+            self.client.post("/payments/contact/", {"email": "C@example.com", "message": "Hi"}, REMOTE_ADDR=f"10.0.1.{i}")
+        response = self.client.post("/payments/contact/", {"email": "c@example.com", "message": "Hi"}, REMOTE_ADDR="10.0.1.9")
+        self.assertEqual((response.status_code, response["Retry-After"]), (429, "60"))
+        self.assertEqual(ContactMessage.objects.count(), 2)
+
+        counts = throttle.counters.snapshot()["counts"]
+        self.assertEqual(counts, {
+            "contact:allowed": 2, "contact:throttled_email": 1,
+            "create_payment:allowed": 3, "create_payment:throttled_ip": 1,
+        })
+
+
+@contextmanager
+def extra_database(alias, name=None):
+    """Registers a second SQLite connection as `alias` (on the test database file unless `name` is given)."""
+    connections.settings[alias] = dict(connections.settings["default"], NAME=name or connections.settings["default"]["NAME"])
+    # Connected up front: the test case only lets its declared databases open connections lazily
+    connections[alias].connect()
+    try:
+        yield connections[alias]
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+class AnalyticsRouterTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor != "sqlite" or connection.is_in_memory_db():
+            self.skipTest("uses SQLite database files as the analytics database")
+        cache.clear()
+        routers._lag_checks.clear()
+        self.addCleanup(routers._lag_checks.clear)
+        self.user = get_user_model().objects.create_superuser("admin", password="pw")
+        self.router = routers.AnalyticsRouter()
+
+    @contextmanager
+    def snapshot_database(self):
+        """The analytics database as a copy of default taken now: later writes are "replication lag"."""
+        fd, path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        shutil.copyfile(connections.settings["default"]["NAME"], path)
+        with extra_database("analytics", path) as analytics:
+            yield analytics
+
+    def donations(self, client):
+        return json.loads(client.get("/payments/api/donations/").content)["donations"]
+
+    def test_without_analytics_db_reads_use_default(self):
+        with routers.analytics_reads():
+            self.assertIsNone(self.router.db_for_read(Payment))
+        self.assertEqual(self.router.db_for_write(Payment), "default")
+
+    def test_analytics_scope(self):
+        with extra_database("analytics"):
+            self.assertIsNone(self.router.db_for_read(Payment))
+            with routers.analytics_reads():
+                self.assertEqual(self.router.db_for_read(Payment), "analytics")
+                self.assertEqual(self.router.db_for_write(Payment), "default")
+            self.assertIsNone(self.router.db_for_read(Payment))
+            self.assertFalse(self.router.allow_migrate("analytics", "payments"))
+            self.assertIsNone(self.router.allow_migrate("default", "payments"))
+
+    def test_streamed_list_reads_from_analytics(self):
+        make_payment(status="Success")
+        request = RequestFactory().get("/payments/api/donations/", {"stream": "1"})
+        request.user = self.user
+        with extra_database("analytics") as analytics:
+            with CaptureQueriesContext(analytics) as on_analytics, CaptureQueriesContext(connection) as on_default:
+                response = donations_list(request)
+                body = b"".join(response.streaming_content)
+        self.assertEqual(len(json.loads(body)["donations"]), 1)
+        self.assertTrue(any("payments_payment" in q["sql"] for q in on_analytics.captured_queries))
+        self.assertFalse(any("payments_payment" in q["sql"] for q in on_default.captured_queries))
+
+    def test_dashboard_and_admin_read_analytics_writes_go_to_default(self):
+        make_payment(transaction_id="replicated")
+        client = Client()
+        client.force_login(self.user)
+        with self.snapshot_database() as analytics:
+            make_payment(transaction_id="not-replicated-yet")
+            self.assertEqual([row["transaction_id"] for row in self.donations(client)], ["replicated"])
+            changelist = client.get("/admin/payments/payment/")
+            self.assertEqual(changelist.context["cl"].result_count, 1)
+
+            # A client that writes reads default until the analytics database has caught up
+            response = client.post("/payments/api/reports/", {"format": "csv"})
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.cookies[routers.PIN_COOKIE]["max-age"], 10)
+            with analytics.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM payments_reportjob")
+                self.assertEqual(cursor.fetchone()[0], 0)
+            self.assertEqual(ReportJob.objects.count(), 1)
+            self.assertEqual(len(self.donations(client)), 2)
+
+            del client.cookies[routers.PIN_COOKIE]
+            self.assertEqual(len(self.donations(client)), 1)
+
+    @override_settings(ANALYTICS_REPLICA_CACHE_TTL=0)
+    def test_unexpiring_caches_are_not_filled_from_analytics(self):
+        start = timezone.localdate() - timedelta(days=90)
+        with extra_database("analytics") as analytics_db:
+            for _ in range(2):
+                with routers.analytics_reads(), CaptureQueriesContext(analytics_db) as on_analytics:
+                    analytics.bucket_series(start, start + timedelta(days=6))
+                    archive.archived_totals()
+                # Closed buckets read there expire (one query per table each time); archive totals come from default
+                self.assertEqual(len(on_analytics.captured_queries), 2)
+            analytics.bucket_series(start, start + timedelta(days=6))
+            with self.assertNumQueries(0):
+                analytics.bucket_series(start, start + timedelta(days=6))
+
+    def test_pinning_middleware_runs_natively_under_asgi(self):
+        async def view(request):
+            routers.AnalyticsRouter().db_for_write(Payment)
+            return HttpResponse()
+
+        middleware = routers.PrimaryPinningMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        with extra_database("analytics"):
+            response = async_to_sync(middleware)(AsyncRequestFactory().post("/"))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+
+    def test_lagging_analytics_db_falls_back_to_default(self):
+        make_payment()
+        client = Client()
+        client.force_login(self.user)
+        with self.snapshot_database():
+            make_payment()
+            self.assertEqual(len(self.donations(client)), 1)
+            routers._lag_checks["analytics"] = (time.monotonic(), 3600.0)
+            self.assertEqual(len(self.donations(client)), 2)
+
+
+class AdminChangelistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_superuser("admin", password="pw"))
+        model_admin = admin.site._registry[Payment]
+        model_admin.list_per_page = 2
+        self.addCleanup(setattr, model_admin, "list_per_page", PaymentAdmin.list_per_page)
+        now = timezone.now()
+        for i in range(5):
+            payment = make_payment(transaction_id=f"t{i}", donate_to="Orphans" if i % 2 else "Water")
+            Payment.objects.filter(pk=payment.pk).update(created_at=now - timedelta(hours=i))
+
+    def changelist(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/payments/payment/", params)
+        self.assertEqual(response.status_code, 200)
+        page = [payment.transaction_id for payment in response.context["cl"].result_list]
+        return response, page, [q["sql"] for q in queries.captured_queries]
+
+    def test_pages_follow_the_previous_page(self):
+        response, first, _ = self.changelist()
+        self.assertEqual(first, ["t0", "t1"])
+        self.assertEqual(response.context["cl"].result_count, 5)
+        self.assertIsNone(response.context["cl"].full_result_count)
+
+        _, second, sql = self.changelist(p=2)
+        self.assertEqual(second, ["t2", "t3"])
+        page_query = [q for q in sql if "LIMIT" in q]
+        self.assertTrue(page_query and not any("OFFSET" in q for q in page_query))
+        # Only the displayed columns are loaded
+        self.assertNotIn('"message"', page_query[0])
+
+        # A page opened directly falls back to OFFSET
+        cache.clear()
+        _, third, sql = self.changelist(p=3)
+        self.assertEqual(third, ["t4"])
+        self.assertTrue(any("OFFSET" in q for q in sql))
+
+    def test_filter_choices_are_cached_and_refreshed_on_save(self):
+        response, _, sql = self.changelist()
+        self.assertTrue(any("DISTINCT" in q for q in sql))
+        _, _, sql = self.changelist()
+        self.assertFalse(any("DISTINCT" in q for q in sql))
+
+        make_payment(transaction_id="t5", donate_to="Education")
+        response, _, sql = self.changelist()
+        self.assertEqual(sum("DISTINCT" in q for q in sql), 1)
+        self.assertIn("Education", response.content.decode())
+
+    def test_status_choices_follow_callback_transitions(self):
+        key = changelist._choices_key(Payment, "status")
+        self.changelist()
+        self.assertEqual(cache.get(key), ["Pending"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get("/payments/callback/", {"order_id": "t0", "status_code": "00"})
+        self.assertIsNone(cache.get(key))
+        self.changelist()
+        self.assertEqual(sorted(cache.get(key)), ["Pending", "Success"])
+
+    @override_settings(ADMIN_PERFORMANCE_MODE=False)
+    def test_mode_off_uses_django_defaults(self):
+        response, _, sql = self.changelist(p=2)
+        self.assertEqual(response.context["cl"].full_result_count, 5)
+        self.assertTrue(any("OFFSET" in q for q in sql))
+
+    def test_failed_payment_and_message_changelists(self):
+        FailedPayment.objects.create(transaction_id="f1", first_name="A", email="a@example.com", phone="1", amount="1")
+        ContactMessage.objects.create(name="B", email="b@example.com", phone="2", message="Hi")
+        for url in ("/admin/payments/failedpayment/", "/admin/payments/contactmessage/"):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context["cl"].result_count, 1)
+            self.assertIsNone(response.context["cl"].full_result_count)
+
+    def test_estimated_count_only_on_postgresql(self):
+        self.assertIsNone(changelist.estimated_count(Payment.objects.all()))
+
+
+class FoldFailedPaymentsMigrationTests(TransactionTestCase):
+    before = [("payments", "0009_exchange_rates")]
+    after = [("payments", "0010_payment_archive_failed_partition")]
+
+    def tearDown(self):
+        call_command("migrate", "payments", verbosity=0)
+
+    def test_repeated_ids_and_pending_payments(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        legacy = old_apps.get_model("payments", "FailedPayment")
+        old_payment = old_apps.get_model("payments", "Payment")
+        old_payment.objects.create(transaction_id="pending", first_name="A", email="a@example.com", phone="1",
+                                   address_line_one="x", amount="5")
+        for transaction_id in ("dup", "dup", "pending", "new"):
+            legacy.objects.create(transaction_id=transaction_id, first_name="A", email="a@example.com", phone="1",
+                                  address_line_one="x", amount="5")
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(self.after)
+        new_payment = executor.loader.project_state(self.after).apps.get_model("payments", "Payment")
+        self.assertEqual(
+            dict(new_payment.objects.values_list("transaction_id", "status")),
+            {"pending": "Failed", "dup": "Failed", "new": "Failed"},
+        )
+
+
+class PaymentArchiveTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        old = timezone.now() - timedelta(days=430)
+
+        def payment(age, **kwargs):
+            payment = make_payment(**kwargs)
+            Payment.objects.filter(pk=payment.pk).update(created_at=timezone.now() - age)
+            payment.refresh_from_db()
+            return payment
+
+        self.old_success = payment(timedelta(days=430), status="Success", amount="100.00", donate_to="Orphans")
+        self.old_failed = payment(timedelta(days=400), status="Failed", amount="40.00")
+        self.old_pending = payment(timedelta(days=400), amount="10.00")
+        self.recent = payment(timedelta(days=1), status="Success", amount="25.00", currency="USD", original_amount="0.08")
+        CallbackEvent.objects.create(idempotency_key=f"{self.old_success.transaction_id}:00", payment=self.old_success, status_code="00")
+        enqueue_email("Thanks", "amina@example.com", payment=self.old_success)
+        rebuild_rollup()
+        self.assertLess(old, archive.archive_horizon(12))
+
+    def test_moves_settled_rows_of_closed_months(self):
+        before = compute_dashboard_stats()
+        out = io.StringIO()
+        call_command("archive_payments", months=12, stdout=out)
+        self.assertIn("Archived 2 payment(s)", out.getvalue())
+
+        self.assertEqual(set(Payment.objects.values_list("pk", flat=True)), {self.old_pending.pk, self.recent.pk})
+        archived = PaymentArchive.objects.get(pk=self.old_success.pk)
+        self.assertEqual((archived.transaction_id, archived.amount, archived.created_at), (
+            self.old_success.transaction_id, self.old_success.amount, self.old_success.created_at,
+        ))
+        self.assertEqual(PaymentArchive.objects.count(), 2)
+        self.assertFalse(CallbackEvent.objects.exists())
+        self.assertIsNone(EmailOutbox.objects.get().payment_id)
+
+        # Totals still cover the archived history
+        cache.clear()
+        after = compute_dashboard_stats()
+        self.assertEqual(after["summary"], before["summary"])
+        self.assertEqual(after["currencies"], before["currencies"])
+
+        # Nothing left to move on a second run
+        self.assertEqual(archive.archive_closed_periods(12), [])
+
+    def test_dashboard_only_scans_recent_rows_once_archive_totals_are_cached(self):
+        archive.archive_closed_periods(12)
+        archive.archived_totals()
+        with CaptureQueriesContext(connection) as queries:
+            stats = compute_dashboard_stats()
+        self.assertEqual(len(queries), 3)
+        self.assertFalse(any("paymentarchive" in q["sql"] for q in queries.captured_queries))
+        self.assertEqual(stats["summary"]["total"], 125.0)
+        self.assertEqual(stats["summary"]["failed_total"], 1)
+
+    def test_archived_rows_still_listed_and_searchable(self):
+        search.reset_ngram_index()
+        self.addCleanup(search.reset_ngram_index)
+        archive.archive_closed_periods(12)
+        reference = self.old_success.transaction_id
+        user = get_user_model().objects.create_superuser("admin", "admin@example.com", "pw")
+        self.client.force_login(user)
+
+        response = self.client.get("/admin/payments/paymentarchive/", {"q": reference[:8]})
+        self.assertEqual([p.pk for p in response.context["cl"].result_list], [self.old_success.pk])
+        self.assertEqual(self.client.get(f"/admin/payments/paymentarchive/{self.old_success.pk}/change/").status_code, 200)
+        response = self.client.get("/admin/payments/payment/", {"q": reference[:8]})
+        self.assertEqual(list(response.context["cl"].result_list), [])
+
+        def donations(**params):
+            request = RequestFactory().get("/", params)
+            request.user = user
+            response = donations_list(request)
+            data = json.loads(b"".join(response.streaming_content) if response.streaming else response.content)
+            return [d["transaction_id"] for d in data["donations"]], data.get("next_cursor")
+
+        newest_first = [p.transaction_id for p in (self.recent, self.old_pending, self.old_failed, self.old_success)]
+        self.assertEqual(donations(name=reference[:8])[0], [reference])
+        first, cursor = donations(page_size=2)
+        second, cursor = donations(page_size=2, cursor=cursor)
+        self.assertEqual((first + second, cursor), (newest_first, None))
+        self.assertEqual(donations(stream=1)[0], newest_first)
+        results = self.client.get("/payments/api/donations/search/", {"q": reference}).json()["results"]
+        self.assertEqual([r["transaction_id"] for r in results], [reference])
+
+    def test_reports_and_rollup_read_both_tables(self):
+        buckets = sorted(DonationDailyRollup.objects.values_list("date", "count", "total"))
+        archive.archive_closed_periods(12)
+
+        rows = list(archive.history_values("transaction_id", "created_at", order_by="-created_at", status="Success"))
+        self.assertEqual([r[0] for r in rows], [self.recent.transaction_id, self.old_success.transaction_id])
+        self.assertEqual(archive.history_count(status="Success"), 2)
+        rebuild_rollup()
+        self.assertEqual(sorted(DonationDailyRollup.objects.values_list("date", "count", "total")), buckets)
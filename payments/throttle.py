@@ -0,0 +1,157 @@
+import functools
+import hashlib
+import math
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .models import Payment
+
+THROTTLE_CACHE_PREFIX = "payments:throttle"
+COALESCE_CACHE_PREFIX = "payments:coalesce"
+
+
+class Counters:
+    """Per-worker throttle / coalescing counts, read by the staff throttle endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counts = Counter()
+            self.started_at = time.time()
+
+    def incr(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {"since": self.started_at, "counts": dict(sorted(self.counts.items()))}
+
+
+counters = Counters()
+
+
+def client_ip(request):
+    if getattr(settings, "THROTTLE_TRUST_X_FORWARDED_FOR", False):
+        forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def take_token(key, capacity, per_minute, now=None):
+    """
+    Token bucket in the Django cache: starts full with `capacity` tokens and refills at `per_minute`.
+    Returns (allowed, retry_after_seconds). The read-modify-write is not atomic, so concurrent
+    requests from one client can overspend by a token or two; that is fine for a throttle.
+    """
+    now = time.time() if now is None else now
+    rate = per_minute / 60.0
+    tokens, updated_at = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    if tokens < 1:
+        return False, math.ceil((1 - tokens) / rate)
+    # Expires once it would have refilled completely, which is the same as a missing key
+    cache.set(key, (tokens - 1, now), math.ceil(capacity / rate) + 1)
+    return True, 0
+
+
+def check(scope, request):
+    """
+    Spends one token from the client's IP bucket and one from the submitted email's bucket.
+    Returns None when allowed, otherwise the seconds until the next token.
+    """
+    rule = settings.THROTTLE_RATES[scope]
+    idents = [("ip", client_ip(request))]
+    email = request.POST.get("email", "").strip().lower()
+    if email:
+        idents.append(("email", hashlib.sha256(email.encode()).hexdigest()))
+
+    for kind, ident in idents:
+        allowed, retry_after = take_token(
+            f"{THROTTLE_CACHE_PREFIX}:{scope}:{kind}:{ident}", rule["CAPACITY"], rule["PER_MINUTE"]
+        )
+        if not allowed:
+            counters.incr(f"{scope}:throttled_{kind}")
+            return retry_after
+    counters.incr(f"{scope}:allowed")
+    return None
+
+
+def _too_many(retry_after):
+    response = JsonResponse({"error": "Too many requests, please try again shortly."}, status=429)
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def throttle(scope):
+    """
+    View decorator applying THROTTLE_RATES[scope] to POSTs (sync or async views).
+    Over the limit the view is not called and the client gets a 429 with Retry-After.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if settings.THROTTLE_ENABLED and request.method == "POST":
+                    retry_after = await sync_to_async(check, thread_sensitive=False)(scope, request)
+                    if retry_after is not None:
+                        return _too_many(retry_after)
+                return await view(request, *args, **kwargs)
+        else:
+            @functools.wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if settings.THROTTLE_ENABLED and request.method == "POST":
+                    retry_after = check(scope, request)
+                    if retry_after is not None:
+                        return _too_many(retry_after)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Duplicate checkout coalescing
+
+def _identity(fields):
+    """Every column of the checkout, normalised: only an identical resubmission is a repeat."""
+    return "|".join(f"{name}={str(fields[name]).strip().lower()}" for name in sorted(fields))
+
+
+def coalesce_key(fields):
+    """Same donor details, amount, currency and appeal: a double-click or a resubmitted form."""
+    if not fields["email"] or not settings.PAYMENT_COALESCE_SECONDS:
+        return None
+    return f"{COALESCE_CACHE_PREFIX}:{hashlib.sha256(_identity(fields).encode()).hexdigest()}"
+
+
+def coalesced_params(key, fields):
+    """
+    The gateway params handed out for the same checkout in the last PAYMENT_COALESCE_SECONDS, if it is still
+    Pending and was made from exactly these fields (the params carry the donor's name, email and phone).
+    """
+    if key is None:
+        return None
+    cached = cache.get(key)
+    if not cached or cached.get("identity") != _identity(fields):
+        return None
+    if Payment.objects.filter(pk=cached["payment_id"], status="Pending").exists():
+        counters.incr("create_payment:coalesced")
+        return cached["params"]
+    return None
+
+
+def remember_params(key, payment, params, fields):
+    if key is not None:
+        cache.set(
+            key, {"payment_id": payment.pk, "identity": _identity(fields), "params": params},
+            settings.PAYMENT_COALESCE_SECONDS,
+        )
@@ -1,11 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
 from payments import dashboard_views
-from . import views
+from . import views, async_views
+
+# PAYMENT_VIEWS_MODE picks the sync (WSGI) or async (ASGI) variants of the public views
+public_views = async_views if settings.PAYMENT_VIEWS_MODE == "async" else views
 
 urlpatterns = [
-    path('create/', views.create_payment, name="create_payment"),
-    path('callback/', views.payment_callback, name="payment_callback"),
+    path('create/', public_views.create_payment, name="create_payment"),
+    path('callback/', public_views.payment_callback, name="payment_callback"),
+    path('contact/', public_views.contact_us_view, name="contact_us"),
+    path('api/stats/', dashboard_views.dashboard_stats, name="dashboard_stats"),
+    path('api/analytics/', dashboard_views.donation_analytics, name="donation_analytics"),
+    path('api/donations/', dashboard_views.donations_list, name="donations_list"),
+    path('api/donations/search/', dashboard_views.search_donations, name="search_donations"),
+    path('api/donations/failed/', dashboard_views.failed_donations_list, name="failed_donations_list"),
+    path('api/messages/', dashboard_views.contact_messages_list, name="contact_messages_list"),
+    path('api/donations/report/', dashboard_views.export_donations_pdf, name="export_donations_pdf"),
+    path('api/reports/', dashboard_views.request_report_job, name="request_report_job"),
+    path('api/reports/<int:job_id>/', dashboard_views.report_job_status, name="report_job_status"),
+    path('api/reports/<int:job_id>/download/', dashboard_views.download_report_job, name="download_report_job"),
+    path('api/imports/', dashboard_views.upload_donations, name="upload_donations"),
+    path('api/imports/<int:job_id>/', dashboard_views.import_job_status, name="import_job_status"),
+    path('api/profiling/', dashboard_views.profiling_report, name="profiling_report"),
+    path('api/throttle/', dashboard_views.throttle_report, name="throttle_report"),
     
     
 